@@ -0,0 +1,111 @@
+import asyncio
+import os
+from datetime import datetime, timezone
+from fastapi import HTTPException
+from typing import Any, Dict, List, Optional, Tuple
+from .db.database import async_session
+from .db import db_attempt
+
+# この件数が溜まるか，前回の書き込みからこの秒数が過ぎたら，回答をまとめて保存する
+ATTEMPT_FLUSH_SIZE = int(os.getenv("ATTEMPT_FLUSH_SIZE", "200"))
+ATTEMPT_FLUSH_INTERVAL = float(os.getenv("ATTEMPT_FLUSH_INTERVAL", "2.0"))
+# DBに書き込めない間に保持する上限 (超えた回答は 503 で受け付けない)
+ATTEMPT_BUFFER_MAX = int(os.getenv("ATTEMPT_BUFFER_MAX", "10000"))
+
+
+class AttemptBuffer:
+    """
+    クイズの回答をメモリに溜めてまとめて保存する (write-behind)．
+    件数・時間のいずれかで書き込み，停止時には残りを全て書き込む．
+    未保存の回答の件数はクイズごとに数えておき，集計の取得時に加える
+    """
+
+    def __init__(
+        self,
+        flush_size: int = ATTEMPT_FLUSH_SIZE,
+        flush_interval: float = ATTEMPT_FLUSH_INTERVAL,
+        max_size: int = ATTEMPT_BUFFER_MAX,
+    ):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self.flushed = 0
+        self.failures = 0
+        self._buffer: List[Dict[str, Any]] = []
+        self._pending: Dict[int, List[int]] = {}
+        self._full = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """書き込みのタスクを止めて，残っている回答を保存する"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def record(self, quiz_id: int, answer: str, is_correct: bool, session_id: Optional[str] = None) -> None:
+        if len(self._buffer) >= self.max_size:
+            raise HTTPException(status_code=503, detail="Too many unsaved attempts, try again later")
+        self._buffer.append({
+            "quiz_id": quiz_id,
+            "session_id": session_id,
+            "answer": answer,
+            "is_correct": is_correct,
+            "answered_at": datetime.now(timezone.utc),
+        })
+        self._count(quiz_id, 1, int(is_correct))
+        if len(self._buffer) >= self.flush_size:
+            self._full.set()
+
+    def pending(self, quiz_id: int) -> Tuple[int, int]:
+        """未保存の (回答数, 正解数)"""
+        attempts, correct = self._pending.get(quiz_id, (0, 0))
+        return attempts, correct
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            while self._buffer:
+                batch = self._buffer[:self.flush_size]
+                try:
+                    async with async_session() as db:
+                        await db_attempt.record_attempts(db, batch)
+                        await db.commit()
+                except Exception as e:
+                    # 次の書き込みで再試行する (その間に届いた回答は上限まで受け付ける)
+                    self.failures += 1
+                    print(f"Warning: Failed to save {len(batch)} quiz attempts: {str(e)}")
+                    return
+                del self._buffer[:len(batch)]
+                for row in batch:
+                    self._count(row["quiz_id"], -1, -int(row["is_correct"]))
+                self.flushed += len(batch)
+
+    def stats(self) -> Dict[str, int]:
+        return {"buffered": len(self._buffer), "flushed": self.flushed, "failures": self.failures}
+
+    def _count(self, quiz_id: int, attempts: int, correct: int) -> None:
+        count = self._pending.setdefault(quiz_id, [0, 0])
+        count[0] += attempts
+        count[1] += correct
+        if count[0] == 0:
+            del self._pending[quiz_id]
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            await self.flush()
+
+
+attempt_buffer = AttemptBuffer()
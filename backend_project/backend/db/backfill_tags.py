@@ -0,0 +1,23 @@
+from .database import async_engine, async_session
+from .db_tag import backfill_heritage_tags, BACKFILL_BATCH_SIZE
+from .models import HeritageTagModel
+import argparse
+import asyncio
+
+
+async def backfill(batch_size: int) -> None:
+    async with async_engine.begin() as conn:
+        await conn.run_sync(HeritageTagModel.__table__.create, checkfirst=True)
+    async with async_session() as db:
+        processed = await backfill_heritage_tags(db, batch_size)
+    await async_engine.dispose()
+    print(f"heritage_tags: {processed} heritages")
+    # サーバーの出題用の索引は TTL が過ぎるか再起動するまで古いタグで絞り込む
+    print("Note: running servers pick up the new tags for quiz sessions after QUIZ_SAMPLER_TTL or a restart")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="既存の世界遺産から絞り込み用のタグ表 (heritage_tags) を作る")
+    parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE)
+    args = parser.parse_args()
+    asyncio.run(backfill(args.batch_size))
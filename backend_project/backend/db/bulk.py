@@ -0,0 +1,54 @@
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from typing import Any, Dict, List, Type, TypeVar
+
+ModelT = TypeVar("ModelT")
+
+# MySQL で1文の複数行 INSERT にまとめる行数 (max_allowed_packet を超えないように分ける)
+BULK_INSERT_CHUNK_SIZE = 1000
+
+
+def supports_bulk_returning(db: AsyncSession) -> bool:
+    """複数行の INSERT ... RETURNING で，採番されたIDを入力の順に受け取れるか"""
+    return bool(db.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order)
+
+async def insert_rows(db: AsyncSession, model: Type[ModelT], rows: List[Dict[str, Any]]) -> List[ModelT]:
+    """
+    複数行をまとめて INSERT し，IDが設定されたモデルを入力の順に返す (コミットは呼び出し側で行う)．
+    RETURNING に対応するDBでは数行ずつの複数行 INSERT ... RETURNING で保存し，
+    MySQL では1文の複数行 INSERT で保存して，LAST_INSERT_ID() から採番されたIDを求める．
+    どちらの場合も1行ごとの INSERT や refresh は行わない (MySQL では保存した行を1回の SELECT で読み直す)
+    """
+    if not rows:
+        return []
+    if supports_bulk_returning(db):
+        stmt = insert(model).returning(model, sort_by_parameter_order=True)
+        result = await db.scalars(stmt, rows)
+        return list(result.all())
+    if db.get_bind().dialect.name == "mysql":
+        return await _insert_rows_mysql(db, model, rows)
+    objects = [model(**row) for row in rows]
+    db.add_all(objects)
+    await db.flush()
+    return objects
+
+async def _insert_rows_mysql(db: AsyncSession, model: Type[ModelT], rows: List[Dict[str, Any]]) -> List[ModelT]:
+    """
+    行数の決まった複数行 INSERT (simple insert) では，InnoDB は innodb_autoinc_lock_mode によらず
+    1文の中で連続したIDを採番し，LAST_INSERT_ID() はその最初のIDになる．
+    採番の間隔 (auto_increment_increment) を考慮してIDを求め，保存した行をまとめて読み直す
+    """
+    step = (await db.execute(text("SELECT @@auto_increment_increment"))).scalar_one()
+    objects: List[ModelT] = []
+    for start in range(0, len(rows), BULK_INSERT_CHUNK_SIZE):
+        chunk = rows[start:start + BULK_INSERT_CHUNK_SIZE]
+        result = await db.execute(insert(model).values(chunk))
+        if result.rowcount != len(chunk):
+            raise RuntimeError(f"Inserted {result.rowcount} rows into {model.__tablename__}, expected {len(chunk)}")
+        row_ids = [result.lastrowid + i * step for i in range(len(chunk))]
+        loaded = {obj.id: obj for obj in (await db.scalars(select(model).where(model.id.in_(row_ids)))).all()}
+        if len(loaded) != len(row_ids):
+            raise RuntimeError(f"Could not resolve ids of rows inserted into {model.__tablename__}")
+        objects.extend(loaded[row_id] for row_id in row_ids)
+    return objects
@@ -0,0 +1,50 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Dict, List, Optional
+from . import db_heritage, db_image, db_quiz
+from .read_cache import read_cache, to_dict, heritage_tag, image_tag, quizzes_tag, quiz_tag, HERITAGE_LIST_TAG
+
+# 読み取りの多いエンドポイント用に，db_heritage / db_quiz の読み取りをキャッシュ越しに行う．
+# キャッシュにある場合はセッションでSQLを実行しないため，コネクションプールから接続を取得しない
+
+
+async def get_heritage_by_id(db: AsyncSession, heritage_id: int) -> Dict[str, Any]:
+    async def load():
+        return to_dict(await db_heritage.get_heritage_by_id(db, heritage_id))
+    return await read_cache.get_or_load(f"heritage:detail:{heritage_id}", [heritage_tag(heritage_id)], load)
+
+async def get_heritages_by_image_id(db: AsyncSession, image_id: int) -> List[Dict[str, Any]]:
+    """画像に紐づく世界遺産 (画像がなければ 404)"""
+    async def load():
+        await db_image.get_by_id(db, image_id)
+        return [to_dict(h) for h in await db_heritage.get_heritages_by_image_id(db, image_id)]
+    return await read_cache.get_or_load(f"heritage:image:{image_id}", [image_tag(image_id)], load)
+
+async def get_all_heritages(db: AsyncSession) -> List[Dict[str, Any]]:
+    async def load():
+        return [to_dict(h) for h in await db_heritage.get_all_heritages(db)]
+    return await read_cache.get_or_load("heritage:all", [HERITAGE_LIST_TAG], load)
+
+async def get_heritages_page(
+    db: AsyncSession,
+    limit: int,
+    cursor: Optional[str] = None,
+    image_id: Optional[int] = None,
+    unesco_tag: Optional[str] = None,
+) -> Dict[str, Any]:
+    async def load():
+        heritages, next_cursor = await db_heritage.get_heritages_page(db, limit, cursor, image_id, unesco_tag)
+        return {"content": [to_dict(h) for h in heritages], "next": next_cursor}
+    key = f"heritage:page:{limit}:{cursor}:{image_id}:{unesco_tag}"
+    return await read_cache.get_or_load(key, [HERITAGE_LIST_TAG], load)
+
+async def get_quizzes_by_heritage_id(db: AsyncSession, heritage_id: int) -> List[Dict[str, Any]]:
+    async def load():
+        return [to_dict(q) for q in await db_quiz.get_quizzes_by_heritage_id(db, heritage_id)]
+    return await read_cache.get_or_load(
+        f"quiz:heritage:{heritage_id}", [quizzes_tag(heritage_id), heritage_tag(heritage_id)], load)
+
+async def get_quiz_by_id(db: AsyncSession, quiz_id: int) -> Dict[str, Any]:
+    """回答の採点に使うクイズ (なければ 404)"""
+    async def load():
+        return to_dict(await db_quiz.get_quiz_by_id(db, quiz_id))
+    return await read_cache.get_or_load(f"quiz:detail:{quiz_id}", [quiz_tag(quiz_id)], load)
@@ -1,21 +1,167 @@
-from sqlalchemy.engine.url import URL
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.engine.url import URL, make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from dataclasses import dataclass, replace
 from os import environ
+from typing import Any, Dict, Optional, Union
+import greenlet
+import time
 
-url = URL.create(
-    drivername="mysql+aiomysql",
-    username=environ["MYSQL_USER"],
-    password=environ["MYSQL_PASSWORD"],
-    host="db",
-    database=environ["MYSQL_DATABASE"],
-    query={"charset": "utf8"}
-)
 
-async_engine = create_async_engine(
-    url,
-    echo=True
-)
+@dataclass(frozen=True)
+class DatabaseSettings:
+    """DB接続とコネクションプールの設定"""
+    echo: bool
+    pool_size: int
+    max_overflow: int
+    pool_timeout: float
+    # MySQL の wait_timeout (既定 8時間) より短くし，切断済みの接続を使わないようにする
+    pool_recycle: int
+    pool_pre_ping: bool
+
+
+# dev: SQLをログに出す．prod: ログを出さず，ワーカー数に合わせてプールを大きくする
+DB_PROFILES = {
+    "dev": DatabaseSettings(echo=True, pool_size=5, max_overflow=5, pool_timeout=30, pool_recycle=3600, pool_pre_ping=True),
+    "prod": DatabaseSettings(echo=False, pool_size=10, max_overflow=20, pool_timeout=10, pool_recycle=1800, pool_pre_ping=True),
+}
+DB_PROFILE = environ.get("DB_PROFILE", "dev")
+
+
+def load_settings(profile: str = DB_PROFILE) -> DatabaseSettings:
+    """プロファイルの設定に，環境変数 (DB_ECHO, DB_POOL_SIZE など) で指定した値を上書きする"""
+    if profile not in DB_PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE: {profile} (choose from {', '.join(DB_PROFILES)})")
+    overrides: Dict[str, Any] = {}
+    for field, env_name, cast in (
+        ("echo", "DB_ECHO", lambda v: v == "1"),
+        ("pool_size", "DB_POOL_SIZE", int),
+        ("max_overflow", "DB_MAX_OVERFLOW", int),
+        ("pool_timeout", "DB_POOL_TIMEOUT", float),
+        ("pool_recycle", "DB_POOL_RECYCLE", int),
+        ("pool_pre_ping", "DB_POOL_PRE_PING", lambda v: v == "1"),
+    ):
+        if env_name in environ:
+            overrides[field] = cast(environ[env_name])
+    return replace(DB_PROFILES[profile], **overrides)
+
+def build_url(drivername: str = "mysql+aiomysql") -> Union[URL, str]:
+    """
+    接続先のURLを作る．DATABASE_URL があればそれを使い (ドライバーのみ drivername に合わせる)，
+    なければ MYSQL_* の環境変数から作る
+    """
+    if environ.get("DATABASE_URL"):
+        url = make_url(environ["DATABASE_URL"])
+        if url.get_backend_name() == "mysql":
+            url = url.set(drivername=drivername)
+        return url
+    return URL.create(
+        drivername=drivername,
+        username=environ["MYSQL_USER"],
+        password=environ["MYSQL_PASSWORD"],
+        host=environ.get("MYSQL_HOST", "db"),
+        port=int(environ["MYSQL_PORT"]) if environ.get("MYSQL_PORT") else None,
+        database=environ["MYSQL_DATABASE"],
+        query={"charset": "utf8"}
+    )
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """
+    接続の取得にかかった時間を記録するコネクションプール．
+    空きを待った時間と，新しい接続を作った (DBに接続した) 時間は分けて記録する
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.acquisitions = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.timeouts = 0
+        self.connects = 0
+        self.connect_seconds_total = 0.0
+        self.connect_seconds_max = 0.0
+        # 取得中の呼び出し (greenlet) ごとの接続にかかった時間．_do_get は内部で再帰するため，一番外側の呼び出しだけを数える
+        self._connecting: Dict[Any, float] = {}
+
+    def _do_get(self):
+        current = greenlet.getcurrent()
+        if current in self._connecting:
+            return super()._do_get()
+        self._connecting[current] = 0.0
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start - self._connecting.pop(current)
+            self.acquisitions += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def _create_connection(self):
+        start = time.perf_counter()
+        try:
+            return super()._create_connection()
+        finally:
+            elapsed = time.perf_counter() - start
+            self.connects += 1
+            self.connect_seconds_total += elapsed
+            self.connect_seconds_max = max(self.connect_seconds_max, elapsed)
+            current = greenlet.getcurrent()
+            if current in self._connecting:
+                self._connecting[current] += elapsed
+
+
+def create_engine_from_settings(url: Union[URL, str], settings: DatabaseSettings) -> AsyncEngine:
+    if make_url(url).get_backend_name() == "sqlite" and make_url(url).database in (None, "", ":memory:"):
+        # インメモリのSQLiteは接続ごとに別のDBになるため，プールの設定は使わない
+        return create_async_engine(url, echo=settings.echo)
+    return create_async_engine(
+        url,
+        echo=settings.echo,
+        poolclass=InstrumentedPool,
+        pool_size=settings.pool_size,
+        max_overflow=settings.max_overflow,
+        pool_timeout=settings.pool_timeout,
+        pool_recycle=settings.pool_recycle,
+        pool_pre_ping=settings.pool_pre_ping,
+    )
+
+def pool_stats(engine: Optional[AsyncEngine] = None) -> Dict[str, Any]:
+    """コネクションプールの使用状況 (貸出中・オーバーフロー数・取得の待ち時間・接続の時間)"""
+    pool = (engine or async_engine).sync_engine.pool
+    stats: Dict[str, Any] = {"profile": DB_PROFILE, "pool_class": type(pool).__name__}
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=pool._max_overflow,
+        )
+    if isinstance(pool, InstrumentedPool):
+        stats.update(
+            acquisitions=pool.acquisitions,
+            timeouts=pool.timeouts,
+            wait_seconds_total=round(pool.wait_seconds_total, 6),
+            wait_seconds_max=round(pool.wait_seconds_max, 6),
+            wait_seconds_avg=round(pool.wait_seconds_total / pool.acquisitions, 6) if pool.acquisitions else 0.0,
+            connects=pool.connects,
+            connect_seconds_total=round(pool.connect_seconds_total, 6),
+            connect_seconds_max=round(pool.connect_seconds_max, 6),
+        )
+    return stats
+
+
+settings = load_settings()
+url = build_url()
+
+async_engine = create_engine_from_settings(url, settings)
 
 async_session = async_sessionmaker(
     async_engine,
@@ -0,0 +1,60 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import insert
+from .models import QuizModel, QuizAttemptModel, QuizStatsModel
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def _stats_upsert(db: AsyncSession):
+    """quiz_stats に行がなければ作り，あれば加算する INSERT 文 (DBごとの構文で作る)"""
+    if db.get_bind().dialect.name == "mysql":
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        stmt = mysql_insert(QuizStatsModel)
+        return stmt.on_duplicate_key_update(
+            attempts=QuizStatsModel.attempts + stmt.inserted.attempts,
+            correct=QuizStatsModel.correct + stmt.inserted.correct,
+        )
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as upsert_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as upsert_insert
+    stmt = upsert_insert(QuizStatsModel)
+    return stmt.on_conflict_do_update(
+        index_elements=[QuizStatsModel.quiz_id],
+        set_={
+            "attempts": QuizStatsModel.attempts + stmt.excluded.attempts,
+            "correct": QuizStatsModel.correct + stmt.excluded.correct,
+        },
+    )
+
+async def record_attempts(db: AsyncSession, rows: List[Dict[str, Any]]) -> int:
+    """
+    回答をまとめて保存し，クイズごとの集計に加算する (コミットは呼び出し側で行う)．
+    保存までの間に削除されたクイズへの回答は除き，保存した件数を返す
+    """
+    if not rows:
+        return 0
+    quiz_ids = {row["quiz_id"] for row in rows}
+    existing = set((await db.execute(select(QuizModel.id).where(QuizModel.id.in_(quiz_ids)))).scalars().all())
+    rows = [row for row in rows if row["quiz_id"] in existing]
+    if not rows:
+        return 0
+    await db.execute(insert(QuizAttemptModel), rows)
+
+    counts: Dict[int, List[int]] = {}
+    for row in rows:
+        count = counts.setdefault(row["quiz_id"], [0, 0])
+        count[0] += 1
+        count[1] += int(row["is_correct"])
+    await db.execute(_stats_upsert(db), [
+        {"quiz_id": quiz_id, "attempts": attempts, "correct": correct}
+        for quiz_id, (attempts, correct) in counts.items()
+    ])
+    return len(rows)
+
+async def get_stats(db: AsyncSession, quiz_id: int) -> Tuple[int, int]:
+    """クイズの (回答数, 正解数) を返す (回答がなければ (0, 0))"""
+    result = await db.execute(
+        select(QuizStatsModel.attempts, QuizStatsModel.correct).where(QuizStatsModel.quiz_id == quiz_id))
+    row: Optional[Any] = result.first()
+    return (row.attempts, row.correct) if row is not None else (0, 0)
@@ -0,0 +1,52 @@
+from sqlalchemy.future import select
+from .database import async_session
+from .models import HeritageModel, QuizModel
+from typing import AsyncIterator, Dict, Any, List
+import json
+import os
+import zlib
+
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "500"))
+
+HERITAGE_COLUMNS = list(HeritageModel.__table__.c)
+QUIZ_COLUMNS = list(QuizModel.__table__.c)
+
+
+async def iter_bank(chunk_size: int = EXPORT_CHUNK_SIZE) -> AsyncIterator[Dict[str, Any]]:
+    """
+    クイズを入れ子にした世界遺産データを id 順に一件ずつ返す．
+    世界遺産はサーバーサイドカーソルから chunk_size 件ずつ読み，その分のクイズだけを別の接続で取得する．
+    ORMのオブジェクトを作らずに行を読むため，メモリ使用量はデータ量によらず一定になる
+    """
+    stmt = select(*HERITAGE_COLUMNS).order_by(HeritageModel.id.asc()).execution_options(yield_per=chunk_size)
+    async with async_session() as heritage_db, async_session() as quiz_db:
+        result = await heritage_db.stream(stmt)
+        async for rows in result.partitions(chunk_size):
+            heritages = [dict(row._mapping) for row in rows]
+            quizzes_by_heritage: Dict[int, List[Dict[str, Any]]] = {h["id"]: [] for h in heritages}
+            quiz_stmt = (
+                select(*QUIZ_COLUMNS)
+                .where(QuizModel.heritage_id.in_(list(quizzes_by_heritage)))
+                .order_by(QuizModel.heritage_id.asc(), QuizModel.id.asc())
+            )
+            for quiz in (await quiz_db.execute(quiz_stmt)).mappings():
+                quizzes_by_heritage[quiz["heritage_id"]].append(dict(quiz))
+            for heritage in heritages:
+                heritage["quizzes"] = quizzes_by_heritage[heritage["id"]]
+                yield heritage
+
+async def iter_bank_ndjson(chunk_size: int = EXPORT_CHUNK_SIZE, compress: bool = False) -> AsyncIterator[bytes]:
+    """世界遺産を一行ずつのJSON (NDJSON) にして返す (compress=True の場合は gzip 形式)"""
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    buffer: List[bytes] = []
+    async for heritage in iter_bank(chunk_size):
+        buffer.append(json.dumps(heritage, ensure_ascii=False, default=str).encode("utf-8") + b"\n")
+        if len(buffer) >= chunk_size:
+            data = b"".join(buffer)
+            buffer.clear()
+            yield compressor.compress(data) if compressor else data
+    data = b"".join(buffer)
+    if compressor:
+        yield compressor.compress(data) + compressor.flush()
+    elif data:
+        yield data
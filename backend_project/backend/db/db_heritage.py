@@ -1,9 +1,21 @@
 from fastapi import HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import delete, update, func as sql_func
-from .models import HeritageModel
-from typing import List, Dict, Any, Optional
+from sqlalchemy.orm import selectinload
+from sqlalchemy import delete, update, and_, or_
+from .models import HeritageModel, QuizModel
+from .distractor_index import distractor_index
+from .search_index import search_index
+from .quiz_sampler import quiz_sampler
+from .pagination import decode_cursor, split_page
+from .bulk import insert_rows
+from .db_tag import sync_heritage_tags
+from .db_version import bump_version, HERITAGES, QUIZZES
+from .read_cache import read_cache, heritage_tag, image_tag, quizzes_tag, quiz_tag, HERITAGE_LIST_TAG
+from typing import List, Dict, Any, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
 
 async def create_heritage(db: AsyncSession, image_id: int, heritage_data: Dict[str, Any]) -> HeritageModel:
     new_heritage = HeritageModel(
@@ -20,47 +32,75 @@ async def create_heritage(db: AsyncSession, image_id: int, heritage_data: Dict[s
     )
     db.add(new_heritage)
     try:
+        await db.flush()
+        await sync_heritage_tags(db, [new_heritage], replace=False)
+        await bump_version(db, HERITAGES)
         await db.commit()
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"DB commit failed: {str(e)}")
     await db.refresh(new_heritage)
+    distractor_index.upsert([new_heritage])
+    search_index.upsert([new_heritage])
+    quiz_sampler.upsert_heritages([new_heritage])
+    await read_cache.invalidate(image_tag(image_id), HERITAGE_LIST_TAG)
     return new_heritage
 
+HERITAGE_FIELDS = ("title", "description", "summary", "simple_summary", "criteria", "unesco_tag", "country", "region", "feature")
+
 async def create_multiple_heritages(db: AsyncSession, image_id: int, heritage_data_list: List[Dict[str, Any]]) -> List[HeritageModel]:
-    new_heritages = []
-    for heritage_data in heritage_data_list:
-        new_heritage = HeritageModel(
-            image_id=image_id,
-            title=heritage_data.get("title"),
-            description=heritage_data.get("description"),
-            summary=heritage_data.get("summary"),
-            simple_summary=heritage_data.get("simple_summary"),
-            criteria=heritage_data.get("criteria"),
-            unesco_tag=heritage_data.get("unesco_tag"),
-            country=heritage_data.get("country"),
-            region=heritage_data.get("region"),
-            feature=heritage_data.get("feature"),
-        )
-        db.add(new_heritage)
-        new_heritages.append(new_heritage)
+    """複数の世界遺産データをまとめて保存する (1行ごとの refresh は行わない)"""
+    rows = [
+        {"image_id": image_id, **{field: heritage_data.get(field) for field in HERITAGE_FIELDS}}
+        for heritage_data in heritage_data_list
+    ]
     try:
+        new_heritages = await insert_rows(db, HeritageModel, rows)
+        await sync_heritage_tags(db, new_heritages, replace=False)
+        await bump_version(db, HERITAGES)
         await db.commit()
-        for heritage in new_heritages:
-            await db.refresh(heritage)
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"DB commit failed: {str(e)}")
+    distractor_index.upsert(new_heritages)
+    search_index.upsert(new_heritages)
+    quiz_sampler.upsert_heritages(new_heritages)
+    await read_cache.invalidate(image_tag(image_id), HERITAGE_LIST_TAG)
     return new_heritages
 
-async def get_all_heritages(db: AsyncSession) -> List[HeritageModel]:
-    stmt = select(HeritageModel)
-    stmt = stmt.order_by(HeritageModel.title.asc())
+async def get_heritages_by_ids(db: AsyncSession, heritage_ids: List[int]) -> List[HeritageModel]:
+    """指定されたIDの世界遺産データをまとめて取得する (存在しないIDは無視する)"""
+    if not heritage_ids:
+        return []
+    result = await db.execute(select(HeritageModel).where(HeritageModel.id.in_(heritage_ids)))
+    return result.scalars().all()
+
+async def get_heritages_with_quizzes(
+    db: AsyncSession,
+    image_id: Optional[int] = None,
+    heritage_ids: Optional[List[int]] = None,
+) -> List[HeritageModel]:
+    """
+    世界遺産データをクイズ付きで取得する (タイトル順)．
+    クイズは selectinload で読み込むため，件数によらずSQLは2回で済む
+    """
+    stmt = select(HeritageModel).options(selectinload(HeritageModel.quizzes))
+    if image_id is not None:
+        stmt = stmt.where(HeritageModel.image_id == image_id)
+    if heritage_ids is not None:
+        stmt = stmt.where(HeritageModel.id.in_(heritage_ids))
+    stmt = stmt.order_by(HeritageModel.title.asc(), HeritageModel.id.asc())
     result = await db.execute(stmt)
-    heritages = result.scalars().all()
-    if not heritages:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No heritages found")
-    return heritages
+    return result.scalars().all()
+
+async def get_heritage_ids_without_quizzes(db: AsyncSession, heritage_ids: Optional[List[int]] = None) -> List[int]:
+    """クイズが一つもない世界遺産のIDを取得する (heritage_ids を指定した場合はその中から)"""
+    has_quiz = select(QuizModel.id).where(QuizModel.heritage_id == HeritageModel.id).exists()
+    stmt = select(HeritageModel.id).where(~has_quiz).order_by(HeritageModel.id.asc())
+    if heritage_ids is not None:
+        stmt = stmt.where(HeritageModel.id.in_(heritage_ids))
+    result = await db.execute(stmt)
+    return list(result.scalars().all())
 
 async def get_heritages_by_image_id(db: AsyncSession, image_id: int) -> List[HeritageModel]:
     result = await db.execute(select(HeritageModel).where(HeritageModel.image_id == image_id))
@@ -69,11 +109,37 @@ async def get_heritages_by_image_id(db: AsyncSession, image_id: int) -> List[Her
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No heritages found for this image")
     return heritages
 
+async def get_cascade_ids(db: AsyncSession, image_id: int) -> Tuple[List[int], List[int]]:
+    """画像に紐づく世界遺産とクイズのIDを返す (CASCADE で消える行のキャッシュを無効にするため，削除の前に呼ぶ)"""
+    stmt = (
+        select(HeritageModel.id, QuizModel.id)
+        .outerjoin(QuizModel, QuizModel.heritage_id == HeritageModel.id)
+        .where(HeritageModel.image_id == image_id)
+    )
+    rows = (await db.execute(stmt)).all()
+    heritage_ids = list(dict.fromkeys(heritage_id for heritage_id, _ in rows))
+    quiz_ids = [quiz_id for _, quiz_id in rows if quiz_id is not None]
+    return heritage_ids, quiz_ids
+
+def cascade_tags(heritage_ids: List[int], quiz_ids: List[int]) -> List[str]:
+    """削除した世界遺産と，CASCADE で消えたクイズのキャッシュのタグ"""
+    return [
+        *(heritage_tag(heritage_id) for heritage_id in heritage_ids),
+        *(quizzes_tag(heritage_id) for heritage_id in heritage_ids),
+        *(quiz_tag(quiz_id) for quiz_id in quiz_ids),
+    ]
+
 async def delete_heritages_by_image_id(db: AsyncSession, image_id: int) -> int:
+    heritage_ids, quiz_ids = await get_cascade_ids(db, image_id)
     stmt = delete(HeritageModel).where(HeritageModel.image_id == image_id)
     result = await db.execute(stmt)
     deleted_count = result.rowcount
-    print(f"Attempted to delete heritages for image_id {image_id}. Rows affected: {deleted_count}")
+    await bump_version(db, HERITAGES, QUIZZES)
+    distractor_index.remove_image(image_id)
+    search_index.remove_image(image_id)
+    quiz_sampler.remove_image(image_id)
+    await read_cache.invalidate(image_tag(image_id), HERITAGE_LIST_TAG, *cascade_tags(heritage_ids, quiz_ids))
+    logger.debug("Attempted to delete heritages for image_id %s. Rows affected: %s", image_id, deleted_count)
     return deleted_count
 
 
@@ -96,21 +162,46 @@ async def update_single_heritage(db: AsyncSession, heritage_id: int, heritage_up
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid field: {key}")
     try:
         db.add(heritage)
+        await db.flush()
+        await sync_heritage_tags(db, [heritage])
+        await bump_version(db, HERITAGES)
         await db.commit()
         await db.refresh(heritage)
+        distractor_index.upsert([heritage])
+        search_index.upsert([heritage])
+        quiz_sampler.upsert_heritages([heritage])
+        await read_cache.invalidate(heritage_tag(heritage_id), image_tag(heritage.image_id), HERITAGE_LIST_TAG)
         return heritage
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"DB commit failed: {str(e)}")
 
-async def get_all_heritages_except_id(db: AsyncSession, exclude_id: int) -> List[HeritageModel]:
-    """指定されたID以外のすべての世界遺産データを取得する"""
-    stmt = select(HeritageModel).where(HeritageModel.id != exclude_id).order_by(sql_func.random())
-    result = await db.execute(stmt)
-    return result.scalars().all()
-
 async def get_all_heritages(db: AsyncSession) -> List[HeritageModel]:
      """すべての世界遺産データを取得する"""
      stmt = select(HeritageModel).order_by(HeritageModel.title.asc())
      result = await db.execute(stmt)
      return result.scalars().all()
+
+async def get_heritages_page(
+    db: AsyncSession,
+    limit: int,
+    cursor: Optional[str] = None,
+    image_id: Optional[int] = None,
+    unesco_tag: Optional[str] = None,
+) -> Tuple[List[HeritageModel], Optional[str]]:
+    """世界遺産データを (title, id) 順にキーセットページングで取得する"""
+    stmt = select(HeritageModel)
+    after = decode_cursor(cursor, 2)
+    if after is not None:
+        title, heritage_id = after
+        stmt = stmt.where(or_(
+            HeritageModel.title > title,
+            and_(HeritageModel.title == title, HeritageModel.id > heritage_id),
+        ))
+    if image_id is not None:
+        stmt = stmt.where(HeritageModel.image_id == image_id)
+    if unesco_tag is not None:
+        stmt = stmt.where(HeritageModel.unesco_tag == unesco_tag)
+    stmt = stmt.order_by(HeritageModel.title.asc(), HeritageModel.id.asc()).limit(limit + 1)
+    result = await db.execute(stmt)
+    return split_page(result.scalars().all(), limit, lambda h: (h.title, h.id))
@@ -1,21 +1,31 @@
 from fastapi import HTTPException, status
 from ..routers.schemas import ImageBase
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete
+from sqlalchemy import select, delete, update
 from .models import ImageModel
+from .distractor_index import distractor_index
+from .search_index import search_index
+from .quiz_sampler import quiz_sampler
+from .read_cache import read_cache, image_tag, HERITAGE_LIST_TAG
+from .db_heritage import get_cascade_ids, cascade_tags
 from datetime import datetime
+from typing import List, Optional, Tuple
+from .pagination import decode_cursor, split_page
+from .db_version import bump_version, IMAGES, HERITAGES, QUIZZES
 
 async def create(db: AsyncSession, request: ImageBase):
     new_image = ImageModel(
         filename=request.filename,
+        content_hash=request.content_hash,
         timestamp=datetime.now()
     )
     db.add(new_image)
     try:
+        await bump_version(db, IMAGES)
         await db.commit()
     except Exception as e:
         await db.rollback()
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="DB commit failed: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"DB commit failed: {str(e)}")
     await db.refresh(new_image)
     return new_image
 
@@ -27,6 +37,16 @@ async def get_all(db: AsyncSession):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No images found")
     return images
 
+async def get_page(db: AsyncSession, limit: int, cursor: Optional[str] = None) -> Tuple[List[ImageModel], Optional[str]]:
+    """画像を id 順にキーセットページングで取得する"""
+    query = select(ImageModel)
+    after = decode_cursor(cursor, 1)
+    if after is not None:
+        query = query.where(ImageModel.id > after[0])
+    query = query.order_by(ImageModel.id.asc()).limit(limit + 1)
+    result = await db.execute(query)
+    return split_page(result.scalars().all(), limit, lambda image: (image.id,))
+
 async def get_by_id(db: AsyncSession, id: int):
     result = await db.execute(select(ImageModel).where(ImageModel.id == id))
     image = result.scalars().first()
@@ -34,10 +54,65 @@ async def get_by_id(db: AsyncSession, id: int):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
     return image
 
+async def get_by_content_hash(db: AsyncSession, content_hash: str):
+    """同じ内容の画像があれば返す (なければ None)"""
+    result = await db.execute(select(ImageModel).where(ImageModel.content_hash == content_hash).order_by(ImageModel.id.asc()))
+    return result.scalars().first()
+
+async def add_reference(db: AsyncSession, image: ImageModel) -> bool:
+    """
+    同じ内容の画像がアップロードされたときに参照を一つ増やす．
+    その間に画像が削除されていれば False を返す
+    """
+    stmt = update(ImageModel).where(ImageModel.id == image.id).values(ref_count=ImageModel.ref_count + 1)
+    try:
+        result = await db.execute(stmt)
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"DB commit failed: {str(e)}")
+    if result.rowcount == 0:
+        return False
+    await db.refresh(image)
+    return True
+
+async def release(db: AsyncSession, id: int) -> bool:
+    """
+    画像の参照を一つ減らす．最後の参照だった場合は画像 (と CASCADE で世界遺産・クイズ) を削除して True を返す
+    """
+    stmt = (
+        update(ImageModel)
+        .where(ImageModel.id == id, ImageModel.ref_count > 1)
+        .values(ref_count=ImageModel.ref_count - 1)
+    )
+    while True:
+        result = await db.execute(stmt)
+        await db.commit()
+        if result.rowcount:
+            return False
+        # 画像がなければ 404 (get_by_id が送出する)
+        await get_by_id(db, id)
+        try:
+            await delete_by_id(db, id)
+            return True
+        except HTTPException as e:
+            # 減らしてから削除するまでの間に参照が増えた場合はやり直す
+            if e.status_code != status.HTTP_404_NOT_FOUND:
+                raise
+
 async def delete_by_id(db: AsyncSession, id: int):
-    stmt = delete(ImageModel).where(ImageModel.id == id)
+    # CASCADE で消える世界遺産とクイズのキャッシュも無効にするため，先にIDを取得する
+    heritage_ids, quiz_ids = await get_cascade_ids(db, id)
+    # 削除の直前に重複したアップロードで参照が増えた場合は消さない
+    stmt = delete(ImageModel).where(ImageModel.id == id, ImageModel.ref_count <= 1)
     result = await db.execute(stmt)
+    if result.rowcount:
+        await bump_version(db, IMAGES, HERITAGES, QUIZZES)
     await db.commit()
     if result.rowcount == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+    distractor_index.remove_image(id)
+    search_index.remove_image(id)
+    quiz_sampler.remove_image(id)
+    await read_cache.invalidate(image_tag(id), HERITAGE_LIST_TAG, *cascade_tags(heritage_ids, quiz_ids))
     return {"detail": "Image deleted successfully"}
@@ -0,0 +1,71 @@
+from fastapi import HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import update
+from .models import JobModel
+from typing import Any, Dict, List, Optional
+from datetime import datetime, timedelta
+import uuid
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+async def create_job(db: AsyncSession, kind: str, params: Dict[str, Any]) -> JobModel:
+    new_job = JobModel(
+        id=uuid.uuid4().hex,
+        kind=kind,
+        status=JOB_QUEUED,
+        params=params,
+    )
+    db.add(new_job)
+    try:
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"DB commit failed: {str(e)}")
+    await db.refresh(new_job)
+    return new_job
+
+async def get_job(db: AsyncSession, job_id: str) -> JobModel:
+    result = await db.execute(select(JobModel).where(JobModel.id == job_id))
+    job = result.scalars().first()
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+async def claim_job(db: AsyncSession, job_id: str) -> Optional[JobModel]:
+    """待機中のジョブを実行中にする．他のワーカーが既に取得していれば None を返す"""
+    stmt = update(JobModel).where(JobModel.id == job_id, JobModel.status == JOB_QUEUED).values(status=JOB_RUNNING)
+    result = await db.execute(stmt)
+    await db.commit()
+    if result.rowcount == 0:
+        return None
+    return await get_job(db, job_id)
+
+async def finish_job(db: AsyncSession, job_id: str, result: Any = None, error: Optional[str] = None) -> None:
+    stmt = update(JobModel).where(JobModel.id == job_id).values(
+        status=JOB_FAILED if error is not None else JOB_SUCCEEDED,
+        result=result,
+        error=error,
+    )
+    await db.execute(stmt)
+    await db.commit()
+
+async def get_queued_job_ids(db: AsyncSession) -> List[str]:
+    stmt = select(JobModel.id).where(JobModel.status == JOB_QUEUED).order_by(JobModel.created_at.asc())
+    result = await db.execute(stmt)
+    return list(result.scalars().all())
+
+async def fail_stale_jobs(db: AsyncSession, stale_seconds: float) -> int:
+    """一定時間更新のない実行中ジョブ (プロセスの停止などで中断されたもの) を失敗にする"""
+    threshold = datetime.now() - timedelta(seconds=stale_seconds)
+    stmt = update(JobModel).where(JobModel.status == JOB_RUNNING, JobModel.updated_at < threshold).values(
+        status=JOB_FAILED,
+        error="Job was interrupted",
+    )
+    result = await db.execute(stmt)
+    await db.commit()
+    return result.rowcount
@@ -0,0 +1,66 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import update, or_
+from sqlalchemy.exc import IntegrityError
+from .models import OperationLockModel
+from typing import Any, Optional
+from datetime import datetime, timedelta
+
+LOCK_RUNNING = "running"
+LOCK_DONE = "done"
+LOCK_FAILED = "failed"
+
+
+async def try_acquire(db: AsyncSession, key: str, owner: str, ttl: float) -> bool:
+    """
+    処理の実行権を取得する．他のワーカーが実行中 (期限内) であれば False を返す．
+    終了済み・期限切れの行は上書きして取得する
+    """
+    now = datetime.now()
+    expires_at = now + timedelta(seconds=ttl)
+    db.add(OperationLockModel(key=key, owner=owner, status=LOCK_RUNNING, expires_at=expires_at))
+    try:
+        await db.commit()
+        return True
+    except IntegrityError:
+        await db.rollback()
+
+    stmt = (
+        update(OperationLockModel)
+        .where(
+            OperationLockModel.key == key,
+            or_(OperationLockModel.status != LOCK_RUNNING, OperationLockModel.expires_at < now),
+        )
+        .values(owner=owner, status=LOCK_RUNNING, result=None, status_code=None, error=None, expires_at=expires_at)
+    )
+    result = await db.execute(stmt)
+    await db.commit()
+    return result.rowcount == 1
+
+async def get_lock(db: AsyncSession, key: str) -> Optional[OperationLockModel]:
+    result = await db.execute(
+        select(OperationLockModel).where(OperationLockModel.key == key).execution_options(populate_existing=True)
+    )
+    return result.scalars().first()
+
+async def release(
+    db: AsyncSession,
+    key: str,
+    owner: str,
+    result: Any = None,
+    status_code: Optional[int] = None,
+    error: Optional[str] = None,
+) -> None:
+    """実行権を手放し，待っている他のワーカーのために結果 (または失敗) を保存する"""
+    stmt = (
+        update(OperationLockModel)
+        .where(OperationLockModel.key == key, OperationLockModel.owner == owner)
+        .values(
+            status=LOCK_FAILED if error is not None else LOCK_DONE,
+            result=result,
+            status_code=status_code,
+            error=error,
+        )
+    )
+    await db.execute(stmt)
+    await db.commit()
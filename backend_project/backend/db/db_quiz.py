@@ -3,28 +3,42 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy import delete, update
 from .models import QuizModel
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+from .pagination import decode_cursor, split_page
+from .bulk import insert_rows
+from .db_version import bump_version, QUIZZES
+from .read_cache import read_cache, quizzes_tag, quiz_tag
+from .quiz_sampler import quiz_sampler
 
 
+def quiz_row(heritage_id: int, quiz_data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "heritage_id": heritage_id,
+        "question": quiz_data.get("question"),
+        "options": quiz_data.get("options"),
+        "answer": quiz_data.get("answer"),
+    }
+
 async def create_multiple_quizzes(db: AsyncSession, heritage_id: int, quiz_data_list: List[Dict[str, Any]]) -> List[QuizModel]:
-    new_quizzes = []
-    for quiz_data in quiz_data_list:
-        print(f"Creating quiz with data: {quiz_data}")  # Debugging line
-        new_quiz = QuizModel(
-            heritage_id=heritage_id,
-            question=quiz_data.get("question"),
-            options=quiz_data.get("options"),
-            answer=quiz_data.get("answer"),
-        )
-        db.add(new_quiz)
-        new_quizzes.append(new_quiz)
+    """一つの世界遺産のクイズをまとめて保存する (1行ごとの refresh は行わない)"""
+    return await create_quizzes_for_heritages(db, {heritage_id: quiz_data_list})
+
+async def create_quizzes_for_heritages(db: AsyncSession, quiz_data_by_heritage: Dict[int, List[Dict[str, Any]]]) -> List[QuizModel]:
+    """複数の世界遺産のクイズを一つのトランザクションで保存する"""
+    rows = [
+        quiz_row(heritage_id, quiz_data)
+        for heritage_id, quiz_data_list in quiz_data_by_heritage.items()
+        for quiz_data in quiz_data_list
+    ]
     try:
+        new_quizzes = await insert_rows(db, QuizModel, rows)
+        await bump_version(db, QUIZZES)
         await db.commit()
-        for quiz in new_quizzes:
-            await db.refresh(quiz)
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"DB commit failed: {str(e)}")
+    quiz_sampler.add_quizzes(new_quizzes)
+    await read_cache.invalidate(*(quizzes_tag(heritage_id) for heritage_id in quiz_data_by_heritage))
     return new_quizzes
 
 async def get_all_quizzes(db: AsyncSession) -> List[QuizModel]:
@@ -36,6 +50,23 @@ async def get_all_quizzes(db: AsyncSession) -> List[QuizModel]:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No quizzes found")
     return quizzes
 
+async def get_quizzes_page(
+    db: AsyncSession,
+    limit: int,
+    cursor: Optional[str] = None,
+    heritage_id: Optional[int] = None,
+) -> Tuple[List[QuizModel], Optional[str]]:
+    """クイズを id 順にキーセットページングで取得する"""
+    stmt = select(QuizModel)
+    after = decode_cursor(cursor, 1)
+    if after is not None:
+        stmt = stmt.where(QuizModel.id > after[0])
+    if heritage_id is not None:
+        stmt = stmt.where(QuizModel.heritage_id == heritage_id)
+    stmt = stmt.order_by(QuizModel.id.asc()).limit(limit + 1)
+    result = await db.execute(stmt)
+    return split_page(result.scalars().all(), limit, lambda q: (q.id,))
+
 async def get_quizzes_by_heritage_id(db: AsyncSession, heritage_id: int) -> List[QuizModel]:
     stmt = select(QuizModel).where(QuizModel.heritage_id == heritage_id)
     result = await db.execute(stmt)
@@ -44,6 +75,14 @@ async def get_quizzes_by_heritage_id(db: AsyncSession, heritage_id: int) -> List
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No quizzes found for this heritage")
     return quizzes
 
+async def get_quizzes_by_ids(db: AsyncSession, quiz_ids: List[int]) -> List[QuizModel]:
+    """IDで指定したクイズを指定の順に返す (存在しないIDは除く)"""
+    if not quiz_ids:
+        return []
+    result = await db.execute(select(QuizModel).where(QuizModel.id.in_(quiz_ids)))
+    by_id = {quiz.id: quiz for quiz in result.scalars().all()}
+    return [by_id[quiz_id] for quiz_id in quiz_ids if quiz_id in by_id]
+
 async def get_quiz_by_id(db: AsyncSession, quiz_id: int) -> Optional[QuizModel]:
     stmt = select(QuizModel).where(QuizModel.id == quiz_id)
     result = await db.execute(stmt)
@@ -63,8 +102,10 @@ async def update_quiz(db: AsyncSession, quiz_id: int, quiz_update_data: Dict[str
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid field: {key}")
     try:
         db.add(quiz)
+        await bump_version(db, QUIZZES)
         await db.commit()
         await db.refresh(quiz)
+        await read_cache.invalidate(quizzes_tag(quiz.heritage_id), quiz_tag(quiz_id))
         return quiz
     except Exception as e:
         await db.rollback()
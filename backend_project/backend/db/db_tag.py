@@ -0,0 +1,118 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import delete, insert, and_, or_, func
+from .models import HeritageModel, HeritageTagModel
+from .pagination import decode_cursor, split_page
+from .db_version import bump_version, HERITAGES
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# 絞り込みに使う項目名と HeritageModel の列名
+FACET_COLUMNS = {
+    "unesco": "unesco_tag",
+    "region": "region",
+    "feature": "feature",
+    "country": "country",
+    "criteria": "criteria",
+}
+FACETS = tuple(FACET_COLUMNS)
+BACKFILL_BATCH_SIZE = 1000
+
+
+def tag_rows(heritage) -> List[Dict[str, Any]]:
+    """世界遺産の JSON 列の値を heritage_tags の行にする (重複する値は1行にまとめる)"""
+    rows = []
+    for facet, column in FACET_COLUMNS.items():
+        values = getattr(heritage, column)
+        if values is None:
+            continue
+        if not isinstance(values, list):
+            values = [values]
+        # 列の長さ (191文字) に切り詰めてから重複をまとめる (切り詰めると同じになる値で主キーが重複しないように)
+        for value in dict.fromkeys(str(v)[:191] for v in values if v is not None and str(v) != ""):
+            rows.append({"heritage_id": heritage.id, "facet": facet, "value": value})
+    return rows
+
+async def sync_heritage_tags(db: AsyncSession, heritages: Iterable[HeritageModel], replace: bool = True) -> None:
+    """
+    世界遺産のタグ行を作り直す (IDが採番された後に呼び出し，コミットは呼び出し側で行う)．
+    作成したばかりの世界遺産は replace=False で既存の行の削除を省く
+    """
+    heritages = list(heritages)
+    if not heritages:
+        return
+    if replace:
+        await db.execute(delete(HeritageTagModel).where(HeritageTagModel.heritage_id.in_([h.id for h in heritages])))
+    rows = [row for heritage in heritages for row in tag_rows(heritage)]
+    if rows:
+        await db.execute(insert(HeritageTagModel), rows)
+
+def _matching_ids(filters: Dict[str, List[str]]):
+    """全ての項目の条件 (項目内の値はいずれか) を満たす世界遺産IDの副問い合わせ"""
+    stmt = select(HeritageModel.id)
+    for facet, values in filters.items():
+        if not values:
+            continue
+        stmt = stmt.where(HeritageModel.id.in_(
+            select(HeritageTagModel.heritage_id).where(
+                HeritageTagModel.facet == facet,
+                HeritageTagModel.value.in_(values),
+            )
+        ))
+    return stmt
+
+async def find_heritages(
+    db: AsyncSession,
+    filters: Dict[str, List[str]],
+    limit: int,
+    cursor: Optional[str] = None,
+) -> Tuple[List[HeritageModel], Optional[str], int, Dict[str, Dict[str, int]]]:
+    """
+    タグで絞り込んだ世界遺産を (title, id) 順にページングして返す．
+    (ページ, 次のカーソル, 全件数, 該当する世界遺産の項目ごとの値の件数) を返す
+    """
+    matching = _matching_ids(filters)
+    stmt = select(HeritageModel).where(HeritageModel.id.in_(matching))
+    after = decode_cursor(cursor, 2)
+    if after is not None:
+        title, heritage_id = after
+        stmt = stmt.where(or_(
+            HeritageModel.title > title,
+            and_(HeritageModel.title == title, HeritageModel.id > heritage_id),
+        ))
+    stmt = stmt.order_by(HeritageModel.title.asc(), HeritageModel.id.asc()).limit(limit + 1)
+    result = await db.execute(stmt)
+    page, next_cursor = split_page(result.scalars().all(), limit, lambda h: (h.title, h.id))
+
+    total = (await db.execute(select(func.count()).select_from(matching.subquery()))).scalar_one()
+
+    count_stmt = (
+        select(HeritageTagModel.facet, HeritageTagModel.value, func.count())
+        .where(HeritageTagModel.heritage_id.in_(matching))
+        .group_by(HeritageTagModel.facet, HeritageTagModel.value)
+    )
+    facets: Dict[str, Dict[str, int]] = {facet: {} for facet in FACETS}
+    for facet, value, count in (await db.execute(count_stmt)).all():
+        facets.setdefault(facet, {})[value] = count
+    for facet in facets:
+        facets[facet] = dict(sorted(facets[facet].items(), key=lambda item: (-item[1], item[0])))
+    return page, next_cursor, total, facets
+
+async def backfill_heritage_tags(db: AsyncSession, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """
+    既存の世界遺産のタグ行を作り直す (ID順に batch_size 件ずつコミットする)．処理した件数を返す．
+    バッチごとに heritages の版を上げるため，絞り込みのレスポンスのキャッシュ (ETag) はその都度無効になる．
+    出題用の索引 (quiz_sampler) は実行中のサーバーのメモリにあるため，QUIZ_SAMPLER_TTL が過ぎて作り直されるまで反映されない
+    """
+    columns = [HeritageModel.id] + [getattr(HeritageModel, column) for column in FACET_COLUMNS.values()]
+    last_id = 0
+    processed = 0
+    while True:
+        stmt = select(*columns).where(HeritageModel.id > last_id).order_by(HeritageModel.id.asc()).limit(batch_size)
+        heritages = (await db.execute(stmt)).all()
+        if not heritages:
+            return processed
+        await sync_heritage_tags(db, heritages)
+        await bump_version(db, HERITAGES)
+        await db.commit()
+        processed += len(heritages)
+        last_id = heritages[-1].id
@@ -0,0 +1,32 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import update, insert
+from sqlalchemy.exc import IntegrityError
+from .models import TableVersionModel
+from typing import Dict, List
+
+IMAGES = "images"
+HERITAGES = "heritages"
+QUIZZES = "quizzes"
+
+
+async def bump_version(db: AsyncSession, *tables: str) -> None:
+    """
+    テーブルの更新回数を増やす．書き込みと同じトランザクションで呼び出し，コミットは呼び出し側で行う
+    """
+    for table in tables:
+        stmt = update(TableVersionModel).where(TableVersionModel.name == table).values(version=TableVersionModel.version + 1)
+        result = await db.execute(stmt)
+        if result.rowcount:
+            continue
+        try:
+            await db.execute(insert(TableVersionModel).values(name=table, version=1))
+        except IntegrityError:
+            # 他のリクエストが同時に行を作成した場合
+            await db.execute(stmt)
+
+async def get_versions(db: AsyncSession, tables: List[str]) -> Dict[str, int]:
+    """テーブルごとの更新回数を返す (一度も更新されていないテーブルは 0)"""
+    result = await db.execute(select(TableVersionModel.name, TableVersionModel.version).where(TableVersionModel.name.in_(tables)))
+    versions = dict(result.all())
+    return {table: versions.get(table, 0) for table in tables}
@@ -0,0 +1,223 @@
+import asyncio
+import os
+import time
+import numpy as np
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from .models import HeritageModel
+from .tag_vectors import TagColumns, encode_unesco, encode_region, encode_features, similarity_threshold
+
+# 他のワーカーでの書き込みを取り込むため，この秒数を過ぎた索引は再構築する
+DISTRACTOR_INDEX_TTL = float(os.getenv("DISTRACTOR_INDEX_TTL", "300"))
+# 一度にスコアを計算するターゲット数 (ターゲット数 x 候補数 の配列を作るため上限を設ける)
+DISTRACTOR_SCORE_CHUNK = int(os.getenv("DISTRACTOR_SCORE_CHUNK", "256"))
+# 削除済みの行がこの割合を超えたら列を詰め直す
+DISTRACTOR_INDEX_COMPACT_RATIO = 0.25
+
+
+@dataclass(frozen=True)
+class DistractorEntry:
+    """ダミー選択肢の判定とクイズ作成に必要な列だけを持つ世界遺産"""
+    id: int
+    image_id: int
+    title: str
+    summary: Optional[str]
+    unesco_tag: Optional[str]
+    region: Optional[str]
+    features: FrozenSet[str]
+    unesco_bits: int
+    region_bits: int
+    feature_bits: int
+
+    @classmethod
+    def from_heritage(cls, heritage) -> "DistractorEntry":
+        region_list = heritage.region or []
+        return cls(
+            id=heritage.id,
+            image_id=heritage.image_id,
+            title=heritage.title,
+            summary=heritage.summary,
+            unesco_tag=heritage.unesco_tag,
+            region=region_list[0] if region_list else None,
+            features=frozenset(heritage.feature or []),
+            unesco_bits=encode_unesco(heritage.unesco_tag),
+            region_bits=encode_region(region_list),
+            feature_bits=encode_features(heritage.feature),
+        )
+
+
+class DistractorIndex:
+    """
+    ダミー選択肢を探すための世界遺産の索引．
+    UNESCOタグ・地域・特徴をビットマスク列で持ち，Tier の判定を全候補に対して一括で行う．
+    作成・更新は世界遺産のスロットの行を上書き (新規は末尾に追加) し，削除は行を削除済みにするだけなので，
+    書き込みのたびに列を作り直さない
+    """
+
+    def __init__(self, ttl: float = DISTRACTOR_INDEX_TTL, seed: Optional[int] = None):
+        self.ttl = ttl
+        self._entries: Dict[int, DistractorEntry] = {}
+        self._columns: Optional[TagColumns] = None
+        self._ordered: List[Optional[DistractorEntry]] = []
+        self._slots: Dict[int, int] = {}
+        # 構築中に行われた書き込み (世界遺産ID -> 新しい値．削除は None)．構築後に反映する
+        self._changes: Optional[Dict[int, Optional[DistractorEntry]]] = None
+        self._rng = np.random.default_rng(seed)
+        self._warmed_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, heritage_id: int) -> bool:
+        return heritage_id in self._entries
+
+    def get(self, heritage_id: int) -> Optional[DistractorEntry]:
+        return self._entries.get(heritage_id)
+
+    @property
+    def is_fresh(self) -> bool:
+        return self._warmed_at is not None and time.monotonic() - self._warmed_at < self.ttl
+
+    async def warm(self, db: AsyncSession) -> None:
+        """DBから索引を作り直す (説明文などの大きな列は読み込まない)"""
+        stmt = select(
+            HeritageModel.id,
+            HeritageModel.image_id,
+            HeritageModel.title,
+            HeritageModel.summary,
+            HeritageModel.unesco_tag,
+            HeritageModel.region,
+            HeritageModel.feature,
+        )
+        self._changes = {}
+        try:
+            result = await db.execute(stmt)
+            entries = {row.id: DistractorEntry.from_heritage(row) for row in result.all()}
+        finally:
+            changes, self._changes = self._changes, None
+        # 読み込みと並行して書き込まれた世界遺産は，読み込んだ値より新しい値で上書きする
+        for heritage_id, entry in changes.items():
+            if entry is None:
+                entries.pop(heritage_id, None)
+            else:
+                entries[heritage_id] = entry
+        self._entries = entries
+        self._columns = None
+        self._warmed_at = time.monotonic()
+
+    async def ensure_warm(self, db: AsyncSession) -> None:
+        """索引が未構築，または古くなっていれば構築する"""
+        if self.is_fresh:
+            return
+        async with self._lock:
+            if not self.is_fresh:
+                await self.warm(db)
+
+    def upsert(self, heritages: Iterable[HeritageModel]) -> None:
+        """作成・更新された世界遺産を索引に反映する"""
+        for heritage in heritages:
+            entry = DistractorEntry.from_heritage(heritage)
+            self._entries[entry.id] = entry
+            if self._changes is not None:
+                self._changes[entry.id] = entry
+            if self._columns is None:
+                continue
+            slot = self._slots.get(entry.id)
+            if slot is None:
+                self._slots[entry.id] = self._columns.append(entry.id, entry.unesco_bits, entry.region_bits, entry.feature_bits)
+                self._ordered.append(entry)
+            else:
+                self._columns.set(slot, entry.id, entry.unesco_bits, entry.region_bits, entry.feature_bits)
+                self._ordered[slot] = entry
+
+    def remove(self, heritage_ids: Iterable[int]) -> None:
+        for heritage_id in heritage_ids:
+            self._entries.pop(heritage_id, None)
+            if self._changes is not None:
+                self._changes[heritage_id] = None
+            slot = self._slots.pop(heritage_id, None)
+            if self._columns is not None and slot is not None:
+                self._columns.kill(slot)
+                self._ordered[slot] = None
+        self._compact_if_needed()
+
+    def remove_image(self, image_id: int) -> None:
+        """画像の削除 (CASCADE) に合わせて，その画像に紐づく世界遺産を索引から外す"""
+        self.remove([e.id for e in self._entries.values() if e.image_id == image_id])
+
+    def score_many(self, targets: Iterable) -> np.ndarray:
+        """
+        複数のターゲットについて，索引内の全候補の Tier を (ターゲット数, 候補数) の配列で返す．
+        列の並びは ordered_entries() と同じ
+        """
+        target_entries = [self._as_entry(t) for t in targets]
+        return self._score(self._ensure_columns(), target_entries)
+
+    def ordered_entries(self) -> List[Optional[DistractorEntry]]:
+        """列の並びの世界遺産 (削除済みの行は None)"""
+        self._ensure_columns()
+        return self._ordered
+
+    def find_many(self, targets: Iterable, num_distractors: int = 3) -> List[List[DistractorEntry]]:
+        """
+        複数のターゲットのダミー選択肢をまとめて探す．
+        Tier 1: UNESCO一致 & 地域一致 & 特徴が類似 (ターゲットの特徴の半分以上が共通)
+        Tier 2: UNESCO一致 & 地域一致 (特徴は問わない)
+        Tier 3: UNESCO一致のみ
+        それでも足りなければ残りの世界遺産からランダムに選ぶ
+        """
+        target_entries = [self._as_entry(t) for t in targets]
+        columns = self._ensure_columns()
+        results: List[List[DistractorEntry]] = []
+        for start in range(0, len(target_entries), DISTRACTOR_SCORE_CHUNK):
+            chunk = target_entries[start:start + DISTRACTOR_SCORE_CHUNK]
+            tiers = self._score(columns, chunk)
+            for picked in columns.pick(tiers, num_distractors, self._rng):
+                results.append([self._ordered[i] for i in picked])
+        return results
+
+    def find(self, target, num_distractors: int = 3) -> List[DistractorEntry]:
+        return self.find_many([target], num_distractors)[0]
+
+    def find_all(self, num_distractors: int = 3) -> Dict[int, List[DistractorEntry]]:
+        """索引内の全ての世界遺産についてダミー選択肢を探す (バッチ処理用)"""
+        entries = list(self._entries.values())
+        return {e.id: found for e, found in zip(entries, self.find_many(entries, num_distractors))}
+
+    def _as_entry(self, target) -> DistractorEntry:
+        return target if isinstance(target, DistractorEntry) else DistractorEntry.from_heritage(target)
+
+    def _ensure_columns(self) -> TagColumns:
+        if self._columns is None:
+            self._ordered = list(self._entries.values())
+            self._slots = {e.id: slot for slot, e in enumerate(self._ordered)}
+            self._columns = TagColumns(
+                ids=[e.id for e in self._ordered],
+                unesco=[e.unesco_bits for e in self._ordered],
+                region=[e.region_bits for e in self._ordered],
+                features=[e.feature_bits for e in self._ordered],
+            )
+        return self._columns
+
+    def _compact_if_needed(self) -> None:
+        """削除済みの行が増えたら，次に使うときに列を詰め直す"""
+        if self._columns is None:
+            return
+        dead = len(self._columns) - len(self._slots)
+        if dead and dead > len(self._columns) * DISTRACTOR_INDEX_COMPACT_RATIO:
+            self._columns = None
+
+    def _score(self, columns: TagColumns, targets: List[DistractorEntry]) -> np.ndarray:
+        return columns.score(
+            target_ids=[t.id for t in targets],
+            target_unesco=[t.unesco_bits for t in targets],
+            target_region=[t.region_bits for t in targets],
+            target_features=[t.feature_bits for t in targets],
+            target_thresholds=[similarity_threshold(len(t.features)) for t in targets],
+        )
+
+
+distractor_index = DistractorIndex()
@@ -0,0 +1,23 @@
+from .db_export import iter_bank_ndjson, EXPORT_CHUNK_SIZE
+import argparse
+import asyncio
+import sys
+
+
+async def export_bank(output: str, compress: bool, chunk_size: int) -> None:
+    out_file = sys.stdout.buffer if output == "-" else open(output, "wb")
+    try:
+        async for data in iter_bank_ndjson(chunk_size, compress):
+            out_file.write(data)
+    finally:
+        if out_file is not sys.stdout.buffer:
+            out_file.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="世界遺産とクイズをNDJSON形式で書き出す")
+    parser.add_argument("-o", "--output", default="-", help="出力ファイル (省略時は標準出力)")
+    parser.add_argument("--gzip", action="store_true", help="gzip で圧縮する")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+    asyncio.run(export_bank(args.output, args.gzip, args.chunk_size))
@@ -1,20 +1,22 @@
 from sqlalchemy import create_engine
-from sqlalchemy.engine.url import URL
+from sqlalchemy.engine.url import URL, make_url
+import argparse
+from .database import build_url, settings
 from .models import Base
-from os import environ
-
-url = URL.create(
-    drivername="mysql+pymysql",
-    username=environ["MYSQL_USER"],
-    password=environ["MYSQL_PASSWORD"],
-    host="db",
-    database=environ["MYSQL_DATABASE"],
-    query={"charset": "utf8"}
-)
+
+# テーブルの作成は同期のドライバーで行う (DATABASE_URL に非同期のドライバーが指定されていても使えるように)
+SYNC_DRIVERS = {"mysql": "mysql+pymysql", "sqlite": "sqlite", "postgresql": "postgresql"}
+
+
+def sync_url() -> URL:
+    url = make_url(build_url(drivername="mysql+pymysql"))
+    return url.set(drivername=SYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+url = sync_url()
 
 engine = create_engine(
     url, 
-    echo=True
+    echo=settings.echo
 )
 
 
@@ -22,6 +24,18 @@ def reset_database():
     Base.metadata.drop_all(bind=engine)
     Base.metadata.create_all(bind=engine)
 
+def create_tables():
+    """存在しないテーブルだけを作成する (既存のデータは残す)"""
+    Base.metadata.create_all(bind=engine)
+
 
 if __name__ == "__main__":
-    reset_database()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="データベースのテーブルを作成する")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--create", action="store_true", help="存在しないテーブルだけを作成する (サーバーの起動前に実行する)")
+    mode.add_argument("--reset", action="store_true", help="全てのテーブルを削除して作り直す (省略時の動作)")
+    args = parser.parse_args()
+    if args.create:
+        create_tables()
+    else:
+        reset_database()
@@ -1,12 +1,16 @@
 from .database import Base
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, JSON, select
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, JSON, Boolean, Index, select
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from datetime import datetime
 
 class ImageModel(Base):
     __tablename__ = "images"
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String(255), unique=True, index=True, nullable=False)
+    content_hash = Column(String(64), nullable=True, index=True)
+    # 同じ内容の画像のアップロード数 (重複したアップロードは同じ行を共有し，削除は参照を一つ減らす)
+    ref_count = Column(Integer, nullable=False, default=1, server_default="1")
     timestamp = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     heritages = relationship("HeritageModel", back_populates="image", cascade="all, delete-orphan", passive_deletes=True)
 
@@ -24,7 +28,17 @@ class HeritageModel(Base):
     region = Column(JSON, nullable=True)
     feature = Column(JSON, nullable=True)
     image = relationship("ImageModel", back_populates="heritages")
-    quizzes = relationship("QuizModel", back_populates="heritage", cascade="all, delete-orphan", passive_deletes=True)
+    quizzes = relationship("QuizModel", back_populates="heritage", cascade="all, delete-orphan", passive_deletes=True, order_by="QuizModel.id")
+
+class HeritageTagModel(Base):
+    __tablename__ = "heritage_tags"
+    # JSON列 (region, feature など) の値を1行1値にした絞り込み用の表．世界遺産の書き込み時に同期する
+    heritage_id = Column(Integer, ForeignKey("heritages.id", ondelete="CASCADE"), primary_key=True)
+    facet = Column(String(16), primary_key=True)
+    value = Column(String(191), primary_key=True)
+    __table_args__ = (
+        Index("ix_heritage_tags_facet_value", "facet", "value", "heritage_id"),
+    )
 
 class QuizModel(Base):
     __tablename__ = "quizzes"
@@ -34,3 +48,49 @@ class QuizModel(Base):
     answer = Column(Text, nullable=False)
     heritage_id = Column(Integer, ForeignKey("heritages.id", ondelete="CASCADE"), nullable=False, index=True)
     heritage = relationship("HeritageModel", back_populates="quizzes")
+
+class QuizAttemptModel(Base):
+    __tablename__ = "quiz_attempts"
+    id = Column(Integer, primary_key=True)
+    quiz_id = Column(Integer, ForeignKey("quizzes.id", ondelete="CASCADE"), nullable=False, index=True)
+    session_id = Column(String(32), nullable=True, index=True)
+    answer = Column(Text, nullable=False)
+    is_correct = Column(Boolean, nullable=False)
+    # 書き込みはまとめて行うため，回答時刻はアプリ側で設定する
+    answered_at = Column(DateTime(timezone=True), nullable=False)
+
+class QuizStatsModel(Base):
+    __tablename__ = "quiz_stats"
+    # 回答の書き込み時に加算する集計 (正答率の取得で quiz_attempts を数えないようにする)
+    quiz_id = Column(Integer, ForeignKey("quizzes.id", ondelete="CASCADE"), primary_key=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    correct = Column(Integer, nullable=False, default=0)
+
+class JobModel(Base):
+    __tablename__ = "jobs"
+    id = Column(String(32), primary_key=True)
+    kind = Column(String(64), nullable=False, index=True)
+    status = Column(String(16), nullable=False, index=True)
+    params = Column(JSON, nullable=False)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    # 中断ジョブの判定をアプリ側の時刻で行うため，更新時刻はアプリ側で設定する
+    updated_at = Column(DateTime(timezone=True), default=datetime.now, onupdate=datetime.now, nullable=False)
+
+class OperationLockModel(Base):
+    __tablename__ = "operation_locks"
+    # 処理の種類と入力から作るキー (例: "heritage_preview:12")
+    key = Column(String(191), primary_key=True)
+    owner = Column(String(32), nullable=False)
+    status = Column(String(16), nullable=False)
+    result = Column(JSON, nullable=True)
+    status_code = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+class TableVersionModel(Base):
+    __tablename__ = "table_versions"
+    # 一覧の ETag に使う，テーブルごとの更新回数
+    name = Column(String(64), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,33 @@
+from fastapi import HTTPException, status
+from typing import Any, List, Optional, Sequence
+import base64
+import json
+import os
+
+PAGE_LIMIT_DEFAULT = int(os.getenv("PAGE_LIMIT_DEFAULT", "50"))
+PAGE_LIMIT_MAX = int(os.getenv("PAGE_LIMIT_MAX", "200"))
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """最後に返した行のソートキーを不透明なカーソル文字列にする"""
+    data = json.dumps(list(values), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: Optional[str], size: int) -> Optional[List[Any]]:
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return values
+
+def split_page(rows: List[Any], limit: int, key) -> tuple:
+    """limit + 1 件取得した結果をページと次のカーソルに分ける"""
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor(key(page[-1]))
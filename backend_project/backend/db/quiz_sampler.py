@@ -0,0 +1,324 @@
+import asyncio
+import os
+import time
+import uuid
+import numpy as np
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from .models import HeritageModel, HeritageTagModel, QuizModel
+from .db_tag import tag_rows
+
+# 他のワーカーでの書き込みを取り込むため，この秒数を過ぎた索引は再構築する
+QUIZ_SAMPLER_TTL = float(os.getenv("QUIZ_SAMPLER_TTL", "300"))
+# 絞り込み条件ごとのクイズIDの配列を保持する数
+QUIZ_POOL_CACHE_SIZE = int(os.getenv("QUIZ_POOL_CACHE_SIZE", "256"))
+# 配列から外したクイズがこの割合を超えた配列は捨てて，次に使うときに作り直す
+QUIZ_POOL_COMPACT_RATIO = 0.25
+QUIZ_SESSION_TTL = float(os.getenv("QUIZ_SESSION_TTL", "3600"))
+QUIZ_SESSION_MAX = int(os.getenv("QUIZ_SESSION_MAX", "10000"))
+
+# (項目, 値の一覧) の組．項目どうしは AND，値どうしは OR
+Filters = Tuple[Tuple[str, Tuple[str, ...]], ...]
+
+
+def normalize_filters(filters: Dict[str, Optional[List[str]]]) -> Filters:
+    """絞り込み条件を，キャッシュのキーに使える順序の決まった形にする (値のない項目は除く)"""
+    return tuple(sorted((facet, tuple(sorted(set(values)))) for facet, values in filters.items() if values))
+
+def matches(filters: Filters, tags: Set[Tuple[str, str]]) -> bool:
+    """タグの集合が絞り込み条件を満たすか"""
+    return all(any((facet, value) in tags for value in values) for facet, values in filters)
+
+
+class QuizPool:
+    """
+    絞り込み条件に合うクイズIDの配列．
+    追加は末尾に書き込み (配列は倍々に確保する)，削除は removed に入れるだけで，抽出時に除く
+    """
+
+    def __init__(self, ids: np.ndarray):
+        self._ids = ids
+        self._size = len(ids)
+        self.removed: Set[int] = set()
+
+    def __len__(self) -> int:
+        return self._size - len(self.removed)
+
+    @property
+    def is_stale(self) -> bool:
+        return len(self.removed) > self._size * QUIZ_POOL_COMPACT_RATIO
+
+    def add(self, quiz_ids: Iterable[int]) -> None:
+        """配列にないクイズIDを追加する (外していたIDは戻す)"""
+        for quiz_id in quiz_ids:
+            if quiz_id in self.removed:
+                self.removed.discard(quiz_id)
+                continue
+            if self._size == len(self._ids):
+                grown = np.empty(max(16, self._size * 2), dtype=np.int64)
+                grown[:self._size] = self._ids[:self._size]
+                self._ids = grown
+            self._ids[self._size] = quiz_id
+            self._size += 1
+
+    def discard(self, quiz_ids: Iterable[int]) -> None:
+        """配列にあるクイズIDを外す"""
+        self.removed.update(quiz_ids)
+
+    def sample(self, rng: np.random.Generator, count: int, exclude: Set[int]) -> List[int]:
+        """
+        exclude と外したID以外を count 件，重複なく一様に選ぶ．
+        count + len(exclude) + len(removed) 件を非復元抽出してから除くため，除かれる分を見込んでも必ず足りる
+        """
+        draw = min(self._size, count + len(exclude) + len(self.removed))
+        if draw == 0:
+            return []
+        picked = self._ids[rng.choice(self._size, size=draw, replace=False)]
+        result = []
+        for quiz_id in picked.tolist():
+            if quiz_id not in exclude and quiz_id not in self.removed:
+                result.append(quiz_id)
+                if len(result) == count:
+                    break
+        return result
+
+
+class QuizSampler:
+    """
+    クイズを一様にランダムに選ぶための索引．
+    クイズIDと世界遺産・タグの対応をメモリに持ち，絞り込み条件ごとのクイズIDの配列から
+    非復元抽出するため，選ぶ数にだけ比例した時間で済む (ORDER BY RAND() のような全件の並べ替えをしない)．
+    クイズ・世界遺産の書き込みは，条件に合う配列にだけ追加・削除として反映する
+    """
+
+    def __init__(self, ttl: float = QUIZ_SAMPLER_TTL, seed: Optional[int] = None):
+        self.ttl = ttl
+        self._quiz_heritage: Dict[int, int] = {}
+        self._heritage_quizzes: Dict[int, List[int]] = {}
+        self._heritage_image: Dict[int, int] = {}
+        self._heritage_tags: Dict[int, Set[Tuple[str, str]]] = {}
+        self._tag_heritages: Dict[Tuple[str, str], Set[int]] = {}
+        self._pools: "OrderedDict[Filters, QuizPool]" = OrderedDict()
+        self._rng = np.random.default_rng(seed)
+        self._warmed_at: Optional[float] = None
+        # 構築中に行われた書き込み．構築後に同じ順で反映する
+        self._changes: Optional[List[Tuple[str, list]]] = None
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._quiz_heritage)
+
+    @property
+    def is_fresh(self) -> bool:
+        return self._warmed_at is not None and time.monotonic() - self._warmed_at < self.ttl
+
+    async def warm(self, db: AsyncSession) -> None:
+        """DBから索引を作り直す (クイズ・世界遺産はIDの列だけを読み込む)"""
+        self._changes = []
+        try:
+            quizzes = (await db.execute(select(QuizModel.id, QuizModel.heritage_id))).all()
+            heritages = (await db.execute(select(HeritageModel.id, HeritageModel.image_id))).all()
+            tags = (await db.execute(select(HeritageTagModel.heritage_id, HeritageTagModel.facet, HeritageTagModel.value))).all()
+        finally:
+            changes, self._changes = self._changes, None
+        self._quiz_heritage = {}
+        self._heritage_quizzes = {}
+        self._heritage_image = {row.id: row.image_id for row in heritages}
+        self._heritage_tags = {}
+        self._tag_heritages = {}
+        for row in quizzes:
+            self._add_quiz(row.id, row.heritage_id)
+        for row in tags:
+            self._add_tag(row.heritage_id, (row.facet, row.value))
+        self._pools.clear()
+        # 読み込みと並行して行われた書き込みは，読み込んだ内容に含まれていない可能性があるため反映し直す
+        for method, items in changes:
+            getattr(self, method)(items)
+        self._warmed_at = time.monotonic()
+
+    async def ensure_warm(self, db: AsyncSession) -> None:
+        """索引が未構築，または古くなっていれば構築する"""
+        if self.is_fresh:
+            return
+        async with self._lock:
+            if not self.is_fresh:
+                await self.warm(db)
+
+    def add_quizzes(self, quizzes: Iterable[QuizModel]) -> None:
+        self._add_quiz_rows([(quiz.id, quiz.heritage_id) for quiz in quizzes])
+
+    def upsert_heritages(self, heritages: Iterable[HeritageModel]) -> None:
+        """作成・更新された世界遺産のタグを索引に反映する"""
+        self._upsert_heritage_rows([
+            (heritage.id, heritage.image_id, {(row["facet"], row["value"]) for row in tag_rows(heritage)})
+            for heritage in heritages
+        ])
+
+    def remove_heritages(self, heritage_ids: Iterable[int]) -> None:
+        heritage_ids = list(heritage_ids)
+        self._record("remove_heritages", heritage_ids)
+        for heritage_id in heritage_ids:
+            tags = self._remove_tags(heritage_id)
+            self._heritage_image.pop(heritage_id, None)
+            quiz_ids = self._heritage_quizzes.pop(heritage_id, [])
+            for quiz_id in quiz_ids:
+                self._quiz_heritage.pop(quiz_id, None)
+            if quiz_ids:
+                for filters, pool in self._pools.items():
+                    if matches(filters, tags):
+                        pool.discard(quiz_ids)
+        self._drop_stale_pools()
+
+    def _add_quiz_rows(self, rows: List[Tuple[int, int]]) -> None:
+        """(クイズID, 世界遺産ID) の組を索引と条件に合う配列に追加する"""
+        self._record("_add_quiz_rows", rows)
+        added: Dict[int, List[int]] = {}
+        for quiz_id, heritage_id in rows:
+            if self._add_quiz(quiz_id, heritage_id):
+                added.setdefault(heritage_id, []).append(quiz_id)
+        for heritage_id, quiz_ids in added.items():
+            tags = self._heritage_tags.get(heritage_id, set())
+            for filters, pool in self._pools.items():
+                if matches(filters, tags):
+                    pool.add(quiz_ids)
+
+    def _upsert_heritage_rows(self, rows: List[Tuple[int, int, Set[Tuple[str, str]]]]) -> None:
+        """(世界遺産ID, 画像ID, タグ) の組で世界遺産のタグを置き換え，条件に合う配列を更新する"""
+        self._record("_upsert_heritage_rows", rows)
+        for heritage_id, image_id, new_tags in rows:
+            old_tags = self._remove_tags(heritage_id)
+            self._heritage_image[heritage_id] = image_id
+            for tag in new_tags:
+                self._add_tag(heritage_id, tag)
+            quiz_ids = self._heritage_quizzes.get(heritage_id)
+            if not quiz_ids:
+                continue
+            # タグが変わって条件に合うようになった (合わなくなった) 配列にだけクイズを追加 (削除) する
+            for filters, pool in self._pools.items():
+                was, now = matches(filters, old_tags), matches(filters, new_tags)
+                if now and not was:
+                    pool.add(quiz_ids)
+                elif was and not now:
+                    pool.discard(quiz_ids)
+        self._drop_stale_pools()
+
+    def remove_image(self, image_id: int) -> None:
+        """画像の削除 (CASCADE) に合わせて，その画像に紐づく世界遺産のクイズを索引から外す"""
+        self.remove_heritages([h for h, i in self._heritage_image.items() if i == image_id])
+
+    def pool(self, filters: Filters) -> QuizPool:
+        """条件に合うクイズIDの配列 (条件ごとに一度だけ作り，書き込みは差分で反映して使い回す)"""
+        pool = self._pools.get(filters)
+        if pool is not None:
+            self._pools.move_to_end(filters)
+            return pool
+        if not filters:
+            ids = np.fromiter(self._quiz_heritage.keys(), dtype=np.int64, count=len(self._quiz_heritage))
+        else:
+            heritage_ids: Optional[Set[int]] = None
+            for facet, values in filters:
+                matched: Set[int] = set()
+                for value in values:
+                    matched |= self._tag_heritages.get((facet, value), set())
+                heritage_ids = matched if heritage_ids is None else heritage_ids & matched
+                if not heritage_ids:
+                    break
+            quiz_ids = [q for h in heritage_ids or () for q in self._heritage_quizzes.get(h, ())]
+            ids = np.array(quiz_ids, dtype=np.int64)
+        pool = QuizPool(ids)
+        self._pools[filters] = pool
+        while len(self._pools) > QUIZ_POOL_CACHE_SIZE:
+            self._pools.popitem(last=False)
+        return pool
+
+    def sample(self, filters: Filters, count: int, exclude: Set[int] = frozenset()) -> List[int]:
+        """条件に合うクイズから exclude 以外を count 件，重複なく一様に選ぶ"""
+        return self.pool(filters).sample(self._rng, count, exclude)
+
+    def count_in_pool(self, filters: Filters, quiz_ids: Iterable[int]) -> int:
+        """quiz_ids のうち，今も条件に合うクイズの数"""
+        count = 0
+        for quiz_id in quiz_ids:
+            heritage_id = self._quiz_heritage.get(quiz_id)
+            if heritage_id is not None and matches(filters, self._heritage_tags.get(heritage_id, set())):
+                count += 1
+        return count
+
+    def _record(self, method: str, items: list) -> None:
+        if self._changes is not None:
+            self._changes.append((method, items))
+
+    def _drop_stale_pools(self) -> None:
+        for filters in [f for f, pool in self._pools.items() if pool.is_stale]:
+            del self._pools[filters]
+
+    def _add_quiz(self, quiz_id: int, heritage_id: int) -> bool:
+        if quiz_id in self._quiz_heritage:
+            return False
+        self._quiz_heritage[quiz_id] = heritage_id
+        self._heritage_quizzes.setdefault(heritage_id, []).append(quiz_id)
+        return True
+
+    def _add_tag(self, heritage_id: int, tag: Tuple[str, str]) -> None:
+        self._heritage_tags.setdefault(heritage_id, set()).add(tag)
+        self._tag_heritages.setdefault(tag, set()).add(heritage_id)
+
+    def _remove_tags(self, heritage_id: int) -> Set[Tuple[str, str]]:
+        """世界遺産のタグを索引から外し，外したタグを返す"""
+        tags = self._heritage_tags.pop(heritage_id, set())
+        for tag in tags:
+            heritage_ids = self._tag_heritages.get(tag)
+            if heritage_ids is not None:
+                heritage_ids.discard(heritage_id)
+                if not heritage_ids:
+                    del self._tag_heritages[tag]
+        return tags
+
+
+@dataclass
+class QuizSession:
+    """一回分の出題 (同じセッションでは同じクイズを出さない)"""
+    id: str
+    filters: Filters
+    served: Set[int] = field(default_factory=set)
+    expires_at: float = 0.0
+
+
+class QuizSessionStore:
+    """
+    出題セッションを保持する (件数の上限と TTL 付き)．
+    プロセス内に保持するため，複数ワーカーで動かす場合は同じセッションを同じワーカーに振り分ける必要がある
+    """
+
+    def __init__(self, ttl: float = QUIZ_SESSION_TTL, max_sessions: int = QUIZ_SESSION_MAX):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, QuizSession]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def create(self, filters: Filters) -> QuizSession:
+        session = QuizSession(id=uuid.uuid4().hex, filters=filters, expires_at=time.monotonic() + self.ttl)
+        self._sessions[session.id] = session
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return session
+
+    def get(self, session_id: str) -> Optional[QuizSession]:
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if session.expires_at < time.monotonic():
+            del self._sessions[session_id]
+            return None
+        session.expires_at = time.monotonic() + self.ttl
+        self._sessions.move_to_end(session_id)
+        return session
+
+
+quiz_sampler = QuizSampler()
+quiz_sessions = QuizSessionStore()
@@ -0,0 +1,148 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+READ_CACHE_TTL = float(os.getenv("READ_CACHE_TTL", "60"))
+READ_CACHE_MAX_ENTRIES = int(os.getenv("READ_CACHE_MAX_ENTRIES", "2048"))
+# memory: プロセス内のみ (他のワーカーでの更新は TTL が過ぎるまで反映されない)．redis: ワーカー間で共有する
+READ_CACHE_BACKEND = os.getenv("READ_CACHE_BACKEND", "memory")
+READ_CACHE_REDIS_URL = os.getenv("READ_CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+
+def heritage_tag(heritage_id: int) -> str:
+    return f"heritage:{heritage_id}"
+
+def image_tag(image_id: int) -> str:
+    return f"image:{image_id}"
+
+def quizzes_tag(heritage_id: int) -> str:
+    return f"quizzes:{heritage_id}"
+
+def quiz_tag(quiz_id: int) -> str:
+    return f"quiz:{quiz_id}"
+
+# 世界遺産の一覧 (どの世界遺産の追加・更新・削除でも無効にする)
+HERITAGE_LIST_TAG = "heritages"
+
+def to_dict(record) -> Dict[str, Any]:
+    """モデルの列の値を dict にする (キャッシュにはセッションに紐づかない値を入れる)"""
+    return {column.key: getattr(record, column.key) for column in record.__table__.columns}
+
+
+class MemoryBackend:
+    """プロセス内の LRU (件数の上限と TTL 付き)"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+
+    async def get(self, key: str) -> Optional[Any]:
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def generations(self, tags: List[str]) -> List[int]:
+        return [self._generations.get(tag, 0) for tag in tags]
+
+    async def bump(self, tags: List[str]) -> None:
+        for tag in tags:
+            self._generations[tag] = self._generations.get(tag, 0) + 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Redis に保存する (値は JSON)．件数の上限は Redis の maxmemory-policy で設定する"""
+
+    def __init__(self, url: str, prefix: str = "read-cache:"):
+        # redis は任意の依存なので，使う場合にだけ読み込む
+        import redis.asyncio as redis
+        self._redis = redis.from_url(url)
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[Any]:
+        data = await self._redis.get(self.prefix + key)
+        return json.loads(data) if data is not None else None
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        await self._redis.set(self.prefix + key, json.dumps(value, ensure_ascii=False, default=str), px=int(ttl * 1000))
+
+    async def generations(self, tags: List[str]) -> List[int]:
+        values = await self._redis.mget([f"{self.prefix}gen:{tag}" for tag in tags])
+        return [int(v) if v is not None else 0 for v in values]
+
+    async def bump(self, tags: List[str]) -> None:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for tag in tags:
+                pipe.incr(f"{self.prefix}gen:{tag}")
+            await pipe.execute()
+
+    def __len__(self) -> int:
+        return 0
+
+
+class ReadCache:
+    """
+    読み取り結果のキャッシュ．各エントリはタグ (heritage:1 など) を持ち，
+    書き込み時にタグの世代を上げると，そのタグを持つエントリは全て無効になる．
+    世代は読み込み前に取得するため，読み込み中に書き込まれた場合も古い値が使われることはない
+    """
+
+    def __init__(self, backend=None, ttl: float = READ_CACHE_TTL):
+        self.backend = backend if backend is not None else MemoryBackend(READ_CACHE_MAX_ENTRIES)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def get_or_load(self, key: str, tags: Iterable[str], loader: Callable[[], Awaitable[Any]]) -> Any:
+        """キャッシュにあれば返し，なければ loader の結果を保存して返す (loader の例外はキャッシュしない)"""
+        tags = list(tags)
+        generations = await self.backend.generations(tags)
+        entry = await self.backend.get(key)
+        if entry is not None and entry["generations"] == generations:
+            self.hits += 1
+            return entry["value"]
+        self.misses += 1
+        value = await loader()
+        await self.backend.set(key, {"generations": generations, "value": value}, self.ttl)
+        return value
+
+    async def invalidate(self, *tags: str) -> None:
+        if not tags:
+            return
+        self.invalidations += 1
+        await self.backend.bump(list(tags))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "entries": len(self.backend),
+        }
+
+
+def create_read_cache() -> ReadCache:
+    if READ_CACHE_BACKEND == "redis":
+        return ReadCache(RedisBackend(READ_CACHE_REDIS_URL))
+    return ReadCache()
+
+
+read_cache = create_read_cache()
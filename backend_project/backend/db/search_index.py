@@ -0,0 +1,315 @@
+import asyncio
+import heapq
+import html
+import os
+import time
+import unicodedata
+from array import array
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from .models import HeritageModel
+
+# 他のワーカーでの書き込みを取り込むため，この秒数を過ぎた索引は再構築する
+SEARCH_INDEX_TTL = float(os.getenv("SEARCH_INDEX_TTL", "600"))
+# 削除・更新で使われなくなった枠がこの割合を超えたら索引を詰め直す
+SEARCH_INDEX_COMPACT_RATIO = 0.25
+SNIPPET_CHARS = int(os.getenv("SEARCH_SNIPPET_CHARS", "40"))
+# 項目ごとの重み (タイトルに含まれる世界遺産を上位にする)
+FIELD_WEIGHTS = {"title": 10.0, "summary": 3.0, "description": 1.0}
+FIELDS = tuple(FIELD_WEIGHTS)
+
+
+def normalize(text: Optional[str]) -> str:
+    """全角・半角の違いと大文字・小文字の違いをなくす (NFKC + 小文字)"""
+    return unicodedata.normalize("NFKC", text or "").lower()
+
+def normalize_with_offsets(text: str) -> Tuple[str, List[int], List[int]]:
+    """
+    normalize() で正規化した文字列と，正規化後の i 文字目が元の文字列の [starts[i], ends[i]) から来たことを返す．
+    正規化で前の文字と合成される文字 (半角カナの濁点など) は前の文字とまとめて一つの範囲にする
+    """
+    if unicodedata.is_normalized("NFKC", text) and len(text.lower()) == len(text):
+        # 正規化で文字数が変わらない (大半の文書はここで済む)
+        return text.lower(), list(range(len(text))), list(range(1, len(text) + 1))
+    pieces: List[Tuple[int, int, str]] = []
+    for i, char in enumerate(text):
+        if pieces:
+            start, _, normalized = pieces[-1]
+            joined = normalize(text[start:i + 1])
+            if joined != normalized + normalize(char):
+                pieces[-1] = (start, i + 1, joined)
+                continue
+        pieces.append((i, i + 1, normalize(char)))
+    starts: List[int] = []
+    ends: List[int] = []
+    for start, end, normalized in pieces:
+        starts.extend([start] * len(normalized))
+        ends.extend([end] * len(normalized))
+    return "".join(normalized for _, _, normalized in pieces), starts, ends
+
+def bigrams(text: str) -> Iterable[str]:
+    return (text[i:i + 2] for i in range(len(text) - 1))
+
+def query_grams(term: str) -> set:
+    """検索語の絞り込みに使う組 (1文字の語はその文字自体)"""
+    return set(bigrams(term)) if len(term) > 1 else {term}
+
+
+@dataclass
+class SearchDocument:
+    """検索対象の世界遺産 (照合用に正規化した項目を持つ)"""
+    id: int
+    image_id: int
+    title: str
+    summary: Optional[str]
+    unesco_tag: Optional[str]
+    texts: Dict[str, str]
+    originals: Dict[str, str]
+
+    @classmethod
+    def from_heritage(cls, heritage) -> "SearchDocument":
+        return cls(
+            id=heritage.id,
+            image_id=heritage.image_id,
+            title=heritage.title,
+            summary=heritage.summary,
+            unesco_tag=heritage.unesco_tag,
+            texts={field: normalize(getattr(heritage, field)) for field in FIELDS},
+            originals={field: getattr(heritage, field) or "" for field in FIELDS},
+        )
+
+    def grams(self) -> set:
+        # 1文字の検索語にも索引を使えるよう，bigram に加えて各文字も登録する
+        grams = set()
+        for text in self.texts.values():
+            grams.update(bigrams(text))
+            grams.update(text)
+        return grams
+
+
+@dataclass
+class SearchHit:
+    document: SearchDocument
+    score: float
+    snippet: str
+
+
+class SearchIndex:
+    """
+    世界遺産のタイトル・要約・説明文の文字 bigram による転置索引．
+    日本語は単語で区切れないため，2文字ずつの組を索引にし，候補を絞り込んでから部分文字列で確認する．
+    ポスティングは文書の枠番号の昇順の配列で，更新時は新しい枠を追加して古い枠を無効にする
+    """
+
+    def __init__(self, ttl: float = SEARCH_INDEX_TTL):
+        self.ttl = ttl
+        self._docs: List[Optional[SearchDocument]] = []
+        self._slots: Dict[int, int] = {}
+        self._postings: Dict[str, array] = {}
+        self._warmed_at: Optional[float] = None
+        # 構築中に行われた書き込み (世界遺産ID -> 新しい文書．削除は None)．構築後に反映する
+        self._changes: Optional[Dict[int, Optional[SearchDocument]]] = None
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    @property
+    def is_fresh(self) -> bool:
+        return self._warmed_at is not None and time.monotonic() - self._warmed_at < self.ttl
+
+    async def warm(self, db: AsyncSession) -> None:
+        """DBから索引を作り直す (索引の構築はイベントループを止めないよう別スレッドで行う)"""
+        stmt = select(
+            HeritageModel.id,
+            HeritageModel.image_id,
+            HeritageModel.title,
+            HeritageModel.summary,
+            HeritageModel.description,
+            HeritageModel.unesco_tag,
+        )
+        self._changes = {}
+        try:
+            rows = (await db.execute(stmt)).all()
+            docs, slots, postings = await asyncio.to_thread(self._build, rows)
+        finally:
+            changes, self._changes = self._changes, None
+        self._docs, self._slots, self._postings = docs, slots, postings
+        # 読み込み・構築と並行して書き込まれた世界遺産は，読み込んだ内容より新しいため反映し直す
+        for heritage_id, doc in changes.items():
+            self._remove_slot(heritage_id)
+            if doc is not None:
+                self._add(doc, self._docs, self._slots, self._postings)
+        self._compact_if_needed()
+        self._warmed_at = time.monotonic()
+
+    async def ensure_warm(self, db: AsyncSession) -> None:
+        """索引が未構築，または古くなっていれば構築する"""
+        if self.is_fresh:
+            return
+        async with self._lock:
+            if not self.is_fresh:
+                await self.warm(db)
+
+    def upsert(self, heritages: Iterable[HeritageModel]) -> None:
+        """作成・更新された世界遺産を索引に反映する"""
+        for heritage in heritages:
+            doc = SearchDocument.from_heritage(heritage)
+            if self._changes is not None:
+                self._changes[doc.id] = doc
+            self._remove_slot(doc.id)
+            self._add(doc, self._docs, self._slots, self._postings)
+        self._compact_if_needed()
+
+    def remove(self, heritage_ids: Iterable[int]) -> None:
+        for heritage_id in heritage_ids:
+            if self._changes is not None:
+                self._changes[heritage_id] = None
+            self._remove_slot(heritage_id)
+        self._compact_if_needed()
+
+    def remove_image(self, image_id: int) -> None:
+        """画像の削除 (CASCADE) に合わせて，その画像に紐づく世界遺産を索引から外す"""
+        self.remove([doc.id for doc in self._docs if doc is not None and doc.image_id == image_id])
+
+    def search(self, query: str, limit: int, offset: int = 0) -> Tuple[List[SearchHit], int]:
+        """
+        空白で区切った全ての語を含む世界遺産を，語が含まれる項目の重みの合計が大きい順に返す．
+        (該当ページの結果, 全件数) を返す
+        """
+        terms = [t for t in dict.fromkeys(normalize(query).split()) if t]
+        if not terms:
+            return [], 0
+        candidates: Optional[np.ndarray] = None
+        grams = set()
+        for term in terms:
+            grams.update(query_grams(term))
+        # 短いポスティングから積を取り，候補を早く絞り込む
+        for gram in sorted(grams, key=lambda g: len(self._postings.get(g, ()))):
+            posting = self._postings.get(gram)
+            if posting is None:
+                return [], 0
+            slots = np.frombuffer(posting, dtype=np.uint32)
+            candidates = slots if candidates is None else np.intersect1d(candidates, slots, assume_unique=True)
+            if candidates.size == 0:
+                return [], 0
+
+        scored: List[Tuple[float, SearchDocument]] = []
+        for slot in candidates.tolist():
+            doc = self._docs[slot]
+            if doc is None:
+                continue
+            score = self._score(doc, terms)
+            if score > 0:
+                scored.append((score, doc))
+        # 全件数は必要だが，並べ替えはページの末尾までで足りる
+        ranked = heapq.nsmallest(offset + limit, scored, key=lambda item: (-item[0], item[1].title, item[1].id))
+        page = ranked[offset:]
+        return [SearchHit(doc, score, self._snippet(doc, terms)) for score, doc in page], len(scored)
+
+    def _score(self, doc: SearchDocument, terms: List[str]) -> float:
+        score = 0.0
+        for term in terms:
+            term_score = 0.0
+            for field, weight in FIELD_WEIGHTS.items():
+                count = doc.texts[field].count(term)
+                if count:
+                    # 出現回数は効きすぎないよう頭打ちにする
+                    term_score += weight * (1.0 + 0.1 * min(count - 1, 5))
+            if term_score == 0:
+                return 0.0
+            if doc.texts["title"].startswith(term):
+                term_score += 2.0
+            score += term_score
+        return score
+
+    def _snippet(self, doc: SearchDocument, terms: List[str]) -> str:
+        """説明文 (なければ要約・タイトル) の最初に一致した箇所の前後を，一致部分を <mark> で囲んで返す"""
+        for field in ("description", "summary", "title"):
+            if not any(term in doc.texts[field] for term in terms):
+                continue
+            # 一致は正規化した文字列で探し，表示は元の文字列の対応する範囲で行う
+            original = doc.originals[field]
+            text, starts, ends = normalize_with_offsets(original)
+            positions = [text.find(term) for term in terms if term in text]
+            if not positions:
+                continue
+            first = min(positions)
+            start = max(0, first - SNIPPET_CHARS)
+            end = min(len(text), first + SNIPPET_CHARS * 2)
+            original_start, original_end = starts[start], ends[end - 1]
+            marked = [False] * (original_end - original_start)
+            for i, is_match in enumerate(self._match_mask(text[start:end], terms), start):
+                if is_match:
+                    for j in range(starts[i], ends[i]):
+                        marked[j - original_start] = True
+            snippet = self._highlight(original[original_start:original_end], marked)
+            return ("…" if original_start > 0 else "") + snippet + ("…" if original_end < len(original) else "")
+        return html.escape(doc.title)
+
+    @staticmethod
+    def _match_mask(text: str, terms: List[str]) -> List[bool]:
+        """text の各文字が検索語のいずれかに一致する部分か"""
+        marked = [False] * len(text)
+        for term in terms:
+            start = text.find(term)
+            while start >= 0:
+                for i in range(start, start + len(term)):
+                    marked[i] = True
+                start = text.find(term, start + 1)
+        return marked
+
+    @staticmethod
+    def _highlight(window: str, marked: List[bool]) -> str:
+        """marked が True の文字の並びを <mark> で囲む (HTMLはエスケープする)"""
+        parts: List[str] = []
+        i = 0
+        while i < len(window):
+            j = i
+            while j < len(window) and marked[j] == marked[i]:
+                j += 1
+            chunk = html.escape(window[i:j])
+            parts.append(f"<mark>{chunk}</mark>" if marked[i] else chunk)
+            i = j
+        return "".join(parts)
+
+    @staticmethod
+    def _add(doc: SearchDocument, docs: List, slots: Dict[int, int], postings: Dict[str, array]) -> None:
+        slot = len(docs)
+        docs.append(doc)
+        slots[doc.id] = slot
+        for gram in doc.grams():
+            posting = postings.get(gram)
+            if posting is None:
+                posting = postings[gram] = array("I")
+            posting.append(slot)
+
+    def _build(self, heritages) -> Tuple[List, Dict[int, int], Dict[str, array]]:
+        docs: List[Optional[SearchDocument]] = []
+        slots: Dict[int, int] = {}
+        postings: Dict[str, array] = {}
+        for heritage in heritages:
+            self._add(SearchDocument.from_heritage(heritage), docs, slots, postings)
+        return docs, slots, postings
+
+    def _remove_slot(self, heritage_id: int) -> None:
+        slot = self._slots.pop(heritage_id, None)
+        if slot is not None:
+            self._docs[slot] = None
+
+    def _compact_if_needed(self) -> None:
+        dead = len(self._docs) - len(self._slots)
+        if dead and dead > len(self._docs) * SEARCH_INDEX_COMPACT_RATIO:
+            live = [doc for doc in self._docs if doc is not None]
+            docs: List[Optional[SearchDocument]] = []
+            slots: Dict[int, int] = {}
+            postings: Dict[str, array] = {}
+            for doc in live:
+                self._add(doc, docs, slots, postings)
+            self._docs, self._slots, self._postings = docs, slots, postings
+
+
+search_index = SearchIndex()
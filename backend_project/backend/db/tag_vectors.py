@@ -0,0 +1,157 @@
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Sequence
+from .tags import UNESCO_TAGS, REGION_TAGS, FEATURE_TAGS
+
+# タグをビット位置に対応させる (語彙外のタグはビットを持たない)
+UNESCO_BITS: Dict[str, int] = {tag: 1 << i for i, tag in enumerate(UNESCO_TAGS)}
+REGION_BITS: Dict[str, int] = {tag: 1 << i for i, tag in enumerate(REGION_TAGS)}
+FEATURE_BITS: Dict[str, int] = {tag: 1 << i for i, tag in enumerate(FEATURE_TAGS)}
+
+# 正解のUNESCOビット -> ダミー選択肢として許容するUNESCOビットのマスク (複合遺産を考慮)
+_CULTURAL, _NATURAL, _MIXED = (UNESCO_BITS[tag] for tag in ("文化遺産", "自然遺産", "複合遺産"))
+UNESCO_COMPATIBLE_LUT = np.zeros(1 << len(UNESCO_TAGS), dtype=np.uint8)
+UNESCO_COMPATIBLE_LUT[_CULTURAL] = _CULTURAL | _MIXED
+UNESCO_COMPATIBLE_LUT[_NATURAL] = _NATURAL | _MIXED
+UNESCO_COMPATIBLE_LUT[_MIXED] = _CULTURAL | _NATURAL | _MIXED
+
+# Tier 1: UNESCO一致 & 地域一致 & 特徴が類似, Tier 2: UNESCO一致 & 地域一致, Tier 3: UNESCO一致のみ, それ以外
+TIER_SIMILAR, TIER_REGION, TIER_UNESCO, TIER_OTHER = 1, 2, 3, 4
+
+_POPCOUNT_LUT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def encode_unesco(tag: Optional[str]) -> int:
+    return UNESCO_BITS.get(tag, 0) if tag else 0
+
+def encode_region(regions: Optional[List[str]]) -> int:
+    """地域は最初の要素だけを比較する (単一地域タグを想定)"""
+    return REGION_BITS.get(regions[0], 0) if regions else 0
+
+def encode_features(features: Optional[Iterable[str]]) -> int:
+    bits = 0
+    for tag in features or ():
+        bits |= FEATURE_BITS.get(tag, 0)
+    return bits
+
+def similarity_threshold(feature_count: int) -> int:
+    """Tier 1 とみなす共通特徴数 (ターゲットの特徴の半分以上．特徴がなければ 0 = Tier 1 なし)"""
+    return max(1, feature_count // 2) if feature_count else 0
+
+def popcount(values: np.ndarray) -> np.ndarray:
+    """uint64 配列の各要素の立っているビット数"""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    as_bytes = np.ascontiguousarray(values).view(np.uint8).reshape(values.shape + (8,))
+    return _POPCOUNT_LUT[as_bytes].sum(axis=-1, dtype=np.uint8)
+
+
+class TagColumns:
+    """
+    候補の世界遺産のタグをビットマスク列として保持する．
+    行 (スロット) の上書き・追加・削除ができ，削除した行は alive を False にしてスコアの対象から外す
+    """
+
+    def __init__(self, ids: Sequence[int], unesco: Sequence[int], region: Sequence[int], features: Sequence[int]):
+        self._ids = np.array(ids, dtype=np.int64)
+        self._unesco = np.array(unesco, dtype=np.uint8)
+        self._region = np.array(region, dtype=np.uint8)
+        self._features = np.array(features, dtype=np.uint64)
+        self._alive = np.ones(len(self._ids), dtype=bool)
+        self._size = len(self._ids)
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self._ids[:self._size]
+
+    @property
+    def unesco(self) -> np.ndarray:
+        return self._unesco[:self._size]
+
+    @property
+    def region(self) -> np.ndarray:
+        return self._region[:self._size]
+
+    @property
+    def features(self) -> np.ndarray:
+        return self._features[:self._size]
+
+    @property
+    def alive(self) -> np.ndarray:
+        return self._alive[:self._size]
+
+    def append(self, id: int, unesco: int, region: int, features: int) -> int:
+        """行を末尾に追加してそのスロットを返す (配列は倍々に確保するため，追加は償却 O(1))"""
+        if self._size == len(self._ids):
+            self._grow(max(16, self._size * 2))
+        slot = self._size
+        self._size += 1
+        self.set(slot, id, unesco, region, features)
+        return slot
+
+    def set(self, slot: int, id: int, unesco: int, region: int, features: int) -> None:
+        self._ids[slot] = id
+        self._unesco[slot] = unesco
+        self._region[slot] = region
+        self._features[slot] = features
+        self._alive[slot] = True
+
+    def kill(self, slot: int) -> None:
+        """行を削除済みにする (スロットは詰めないため，他の行のスロットは変わらない)"""
+        self._ids[slot] = -1
+        self._alive[slot] = False
+
+    def _grow(self, capacity: int) -> None:
+        for name in ("_ids", "_unesco", "_region", "_features", "_alive"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def score(
+        self,
+        target_ids: Sequence[int],
+        target_unesco: Sequence[int],
+        target_region: Sequence[int],
+        target_features: Sequence[int],
+        target_thresholds: Sequence[int],
+    ) -> np.ndarray:
+        """
+        複数のターゲットについて，全候補の Tier を一度に計算する．
+        戻り値は (ターゲット数, 候補数) の配列で，ターゲット自身と削除済みの行の列は 0 になる．
+        """
+        t_ids = np.asarray(target_ids, dtype=np.int64)[:, None]
+        t_unesco = np.asarray(target_unesco, dtype=np.uint8)
+        t_region = np.asarray(target_region, dtype=np.uint8)[:, None]
+        t_features = np.asarray(target_features, dtype=np.uint64)[:, None]
+        t_thresholds = np.asarray(target_thresholds, dtype=np.int64)[:, None]
+
+        unesco_ok = (self.unesco[None, :] & UNESCO_COMPATIBLE_LUT[t_unesco][:, None]) != 0
+        region_ok = unesco_ok & ((self.region[None, :] & t_region) != 0)
+        common = popcount(self.features[None, :] & t_features)
+        similar = region_ok & (t_thresholds > 0) & (common >= t_thresholds)
+
+        tiers = np.full(unesco_ok.shape, TIER_OTHER, dtype=np.uint8)
+        tiers[unesco_ok] = TIER_UNESCO
+        tiers[region_ok] = TIER_REGION
+        tiers[similar] = TIER_SIMILAR
+        tiers[self.ids[None, :] == t_ids] = 0
+        tiers[:, ~self.alive] = 0
+        return tiers
+
+    def pick(self, tiers: np.ndarray, k: int, rng: np.random.Generator) -> List[np.ndarray]:
+        """
+        Tier の小さい順に k 個ずつ候補のインデックスを選ぶ (同じ Tier の中ではランダム)．
+        """
+        # Tier の整数部に [0, 1) の乱数を足して同じ Tier 内の順序をランダムにする
+        keys = tiers + rng.random(tiers.shape)
+        keys[tiers == 0] = np.inf
+        k = min(k, len(self))
+        if k == 0:
+            return [np.empty(0, dtype=np.int64) for _ in range(len(tiers))]
+        top = np.argpartition(keys, k - 1, axis=1)[:, :k]
+        order = np.take_along_axis(keys, top, axis=1).argsort(axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        return [row[np.isfinite(keys[i, row])] for i, row in enumerate(top)]
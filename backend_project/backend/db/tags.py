@@ -0,0 +1,21 @@
+from typing import List
+
+# 世界遺産に付与するタグの語彙 (並び順はビットマスクのビット位置として使うため，追加は末尾に行う)
+UNESCO_TAGS: List[str] = ["文化遺産", "自然遺産", "複合遺産"]
+
+REGION_TAGS: List[str] = [
+    "アジア", "ヨーロッパ", "アフリカ", "北アメリカ", "南アメリカ", "オセアニア"
+]
+
+FEATURE_TAGS: List[str] = [
+    "宗教建築", "キリスト教建築", "イスラム建築", "仏教建築", "ヒンドゥー教建築",
+    "神社建築", "その他宗教建築", "宮殿・邸宅", "城郭・要塞", "遺跡・考古学的遺跡",
+    "歴史的都市・集落", "文化的景観", "産業遺産", "交通遺産", "庭園・公園",
+    "古墳・墓所", "記念建造物", "岩絵・壁画", "負の遺産", "山岳・山脈",
+    "火山・火山地形", "森林", "砂漠", "河川・湖沼", "湿地・湿原",
+    "氷河・氷床・フィヨルド", "海岸・崖", "島嶼", "海洋生態系",
+    "サンゴ礁", "カルスト地形・洞窟", "滝",
+    "特殊な地形・地質",  # 追加
+    "化石産地",
+    # 他のタグも追加可能 (64個まで)
+]
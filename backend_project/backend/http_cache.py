@@ -0,0 +1,148 @@
+import gzip
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from fastapi import Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from .db.db_version import get_versions
+
+# これより小さいレスポンスは圧縮しない
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+# バージョンごとのレスポンス本文 (圧縮済み) を保持する上限
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+try:
+    # brotli は任意の依存 (なければ gzip のみ)
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class ResponseBodyCache:
+    """(URL, テーブルのバージョン, 圧縮形式) ごとのレスポンス本文の LRU (合計バイト数で上限を設ける)"""
+
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self._entries: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._total_bytes = 0
+
+    def get(self, key: Tuple[str, str]) -> Optional[bytes]:
+        body = self._entries.get(key)
+        if body is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return body
+
+    def put(self, key: Tuple[str, str], body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._total_bytes -= len(old)
+        self._entries[key] = body
+        self._total_bytes += len(body)
+        while self._total_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._total_bytes -= len(evicted)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "entries": len(self._entries),
+            "bytes": self._total_bytes,
+        }
+
+
+response_cache = ResponseBodyCache()
+
+
+def choose_encoding(accept_encoding: str) -> str:
+    """Accept-Encoding から使う圧縮形式を選ぶ (br > gzip > identity)"""
+    accepted = set()
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip().lower())
+    if brotli is not None and ("br" in accepted or "*" in accepted):
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return "identity"
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL)
+    return body
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match に ETag が含まれるか (圧縮形式の接尾辞 -gzip / -br は区別しない)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    base = etag.strip('"')
+    for candidate in if_none_match.split(","):
+        value = candidate.strip()
+        if value.startswith("W/"):
+            value = value[2:]
+        value = value.strip('"')
+        for suffix in ("-gzip", "-br"):
+            if value.endswith(suffix):
+                value = value[:-len(suffix)]
+        if value == base:
+            return True
+    return False
+
+async def versioned_json_response(
+    request: Request,
+    db: AsyncSession,
+    tables: List[str],
+    build: Callable[[], Awaitable[Any]],
+) -> Response:
+    """
+    テーブルのバージョンから ETag を作り，If-None-Match が一致すれば一覧を読まずに 304 を返す．
+    一致しなければ build() の結果 (JSONに変換できる値) を返す．本文は圧縮形式ごとにバージョン単位で保存し，
+    同じバージョンの間は build() も圧縮も行わない
+    """
+    versions = await get_versions(db, tables)
+    version_key = ",".join(f"{table}={versions[table]}" for table in tables)
+    url_key = f"{request.url.path}?{request.url.query}"
+    digest = hashlib.sha256(f"{url_key}|{version_key}".encode("utf-8")).hexdigest()[:32]
+    etag = f'"{digest}"'
+    headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        response_cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+
+    encoding = choose_encoding(request.headers.get("accept-encoding", ""))
+    body = response_cache.get((digest, encoding))
+    if body is None:
+        raw = response_cache.get((digest, "identity")) if encoding != "identity" else None
+        if raw is None:
+            raw = json.dumps(await build(), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            response_cache.put((digest, "identity"), raw)
+        if encoding != "identity" and len(raw) < COMPRESS_MIN_BYTES:
+            encoding = "identity"
+        body = compress(raw, encoding) if encoding != "identity" else raw
+        if encoding != "identity":
+            response_cache.put((digest, encoding), body)
+
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+        headers["ETag"] = f'"{digest}-{encoding}"'
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,244 @@
+import argparse
+import asyncio
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from PIL import Image, ImageChops, ImageOps
+import aiofiles
+
+IMAGE_FORDER = os.getenv("IMAGE_FORDER", "backend/images")
+WEB_IMAGE_FORDER = os.getenv("WEB_IMAGE_FORDER", "images")
+DERIVED_DIRNAME = "derived"
+THUMBNAIL_WIDTHS = [int(w) for w in os.getenv("THUMBNAIL_WIDTHS", "320,640,1280").split(",")]
+THUMBNAIL_FORMAT = os.getenv("THUMBNAIL_FORMAT", "webp")
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "80"))
+IMAGE_PROCESS_WORKERS = int(os.getenv("IMAGE_PROCESS_WORKERS", "2"))
+# LLMに送る画像の前処理 (長辺の上限は文字が読める大きさにする)
+OCR_MAX_EDGE = int(os.getenv("OCR_MAX_EDGE", "2048"))
+OCR_FORMAT = os.getenv("OCR_FORMAT", "webp")
+OCR_QUALITY = int(os.getenv("OCR_QUALITY", "85"))
+OCR_CROP_BORDERS = os.getenv("OCR_CROP_BORDERS", "1") == "1"
+OCR_SUFFIX = ".ocr"
+# 派生画像のURLをファイル名ごとに保持する数と，派生画像が揃っていない結果を保持する秒数
+# (他のプロセスで作られた派生画像は，この秒数が過ぎてから確認し直す)
+VARIANT_CACHE_SIZE = int(os.getenv("VARIANT_CACHE_SIZE", "100000"))
+VARIANT_MISSING_TTL = float(os.getenv("VARIANT_MISSING_TTL", "30"))
+
+_FORMAT_EXTENSIONS = {"webp": "webp", "jpeg": "jpg"}
+_executor: Optional[ProcessPoolExecutor] = None
+
+# OCR前処理による送信バイト数の削減量
+ocr_stats: Dict[str, int] = {"images": 0, "original_bytes": 0, "sent_bytes": 0}
+# 画像ファイル名 -> (幅ごとの派生画像のURL, 期限)．ファイル名は内容のハッシュで変わらないため，全ての幅が揃えば期限なし
+_variant_cache: Dict[str, Tuple[Dict[str, str], float]] = {}
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Pillowの処理を実行するプロセスプール (イベントループを止めないため)"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=IMAGE_PROCESS_WORKERS)
+    return _executor
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+def derived_dir(image_dir: str = IMAGE_FORDER) -> str:
+    return os.path.join(image_dir, DERIVED_DIRNAME)
+
+def derivative_name(filename: str, width: int, fmt: str = THUMBNAIL_FORMAT) -> str:
+    stem = os.path.basename(filename).split(".", 1)[0]
+    return f"{stem}_w{width}.{_FORMAT_EXTENSIONS[fmt]}"
+
+def make_derivatives(
+    source_path: str,
+    dest_dir: str,
+    widths: List[int] = THUMBNAIL_WIDTHS,
+    fmt: str = THUMBNAIL_FORMAT,
+    quality: int = THUMBNAIL_QUALITY,
+) -> List[str]:
+    """
+    画像を決まった幅に縮小した派生画像を作る (ワーカープロセスで実行する)．
+    元画像より大きい幅は拡大せず元の幅で作る．作成したファイルのパスを返す
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    created = []
+    with Image.open(source_path) as img:
+        img = ImageOps.exif_transpose(img)
+        img = img.convert("RGBA" if fmt == "webp" and img.mode in ("RGBA", "LA", "P") else "RGB")
+        for width in sorted(widths):
+            target_width = min(width, img.width)
+            height = max(1, round(img.height * target_width / img.width))
+            resized = img.resize((target_width, height), Image.LANCZOS)
+            path = os.path.join(dest_dir, derivative_name(source_path, width, fmt))
+            tmp_path = f"{path}.part"
+            if fmt == "webp":
+                resized.save(tmp_path, format="WEBP", quality=quality, method=4)
+            else:
+                resized.save(tmp_path, format="JPEG", quality=quality, optimize=True, progressive=True)
+            os.replace(tmp_path, path)
+            created.append(path)
+    return created
+
+async def generate_derivatives(filename: str, image_dir: str = IMAGE_FORDER) -> List[str]:
+    """画像ファイル名 (images/xxx.png など) の派生画像をプロセスプールで作る"""
+    source_path = os.path.join(image_dir, os.path.basename(filename))
+    loop = asyncio.get_running_loop()
+    created = await loop.run_in_executor(get_executor(), make_derivatives, source_path, derived_dir(image_dir))
+    if image_dir == IMAGE_FORDER:
+        _cache_variants(filename, {str(width): variant_url(filename, width) for width in THUMBNAIL_WIDTHS})
+    return created
+
+async def generate_derivatives_quietly(filename: str) -> None:
+    """アップロード後にバックグラウンドで実行する (失敗してもアップロード自体は成功とする)"""
+    try:
+        await generate_derivatives(filename)
+    except Exception as e:
+        print(f"Warning: Could not create derivatives for {filename}: {str(e)}")
+
+def has_derivatives(filename: str) -> bool:
+    return bool(variant_urls(filename))
+
+def variant_url(filename: str, width: int) -> str:
+    return f"{WEB_IMAGE_FORDER}/{DERIVED_DIRNAME}/{derivative_name(filename, width)}"
+
+def variant_urls(filename: str) -> Dict[str, str]:
+    """
+    作成済みの派生画像のURLを幅ごとに返す．
+    ファイルの有無の確認結果はファイル名ごとに保持し，派生画像の作成・削除時に更新する
+    """
+    cached = _variant_cache.get(os.path.basename(filename))
+    if cached is not None and cached[1] > time.monotonic():
+        return cached[0]
+    variants = {}
+    for width in THUMBNAIL_WIDTHS:
+        if os.path.exists(os.path.join(derived_dir(), derivative_name(filename, width))):
+            variants[str(width)] = variant_url(filename, width)
+    _cache_variants(filename, variants)
+    return variants
+
+def _cache_variants(filename: str, variants: Dict[str, str]) -> None:
+    expires_at = math.inf if len(variants) == len(THUMBNAIL_WIDTHS) else time.monotonic() + VARIANT_MISSING_TTL
+    key = os.path.basename(filename)
+    _variant_cache.pop(key, None)
+    _variant_cache[key] = (variants, expires_at)
+    while len(_variant_cache) > VARIANT_CACHE_SIZE:
+        _variant_cache.pop(next(iter(_variant_cache)), None)
+
+def ocr_image_name(filename: str, fmt: str = OCR_FORMAT) -> str:
+    stem = os.path.basename(filename).split(".", 1)[0]
+    return f"{stem}{OCR_SUFFIX}.{_FORMAT_EXTENSIONS[fmt]}"
+
+def crop_uniform_borders(img: Image.Image, tolerance: int = 10) -> Image.Image:
+    """左上の画素と同じ色 (誤差 tolerance 以内) の余白を切り落とす"""
+    background = Image.new(img.mode, img.size, img.getpixel((0, 0)))
+    diff = ImageChops.difference(img, background).convert("L")
+    bbox = diff.point(lambda v: 255 if v > tolerance else 0).getbbox()
+    if not bbox or bbox == (0, 0) + img.size:
+        return img
+    return img.crop(bbox)
+
+def preprocess_for_ocr(
+    source_path: str,
+    dest_path: str,
+    max_edge: int = OCR_MAX_EDGE,
+    fmt: str = OCR_FORMAT,
+    quality: int = OCR_QUALITY,
+    crop_borders: bool = OCR_CROP_BORDERS,
+) -> int:
+    """
+    LLMに送る画像を作る (ワーカープロセスで実行する)．
+    余白の切り落とし，長辺 max_edge までの縮小，圧縮率の高い形式への変換を行い，書き込んだバイト数を返す
+    """
+    with Image.open(source_path) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode in ("RGBA", "LA", "P"):
+            img = img.convert("RGBA")
+            flattened = Image.new("RGB", img.size, (255, 255, 255))
+            flattened.paste(img, mask=img.getchannel("A"))
+            img = flattened
+        else:
+            img = img.convert("RGB")
+        if crop_borders:
+            img = crop_uniform_borders(img)
+        if max(img.size) > max_edge:
+            img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        tmp_path = f"{dest_path}.part"
+        if fmt == "webp":
+            img.save(tmp_path, format="WEBP", quality=quality, method=4)
+        else:
+            img.save(tmp_path, format="JPEG", quality=quality, optimize=True)
+        os.replace(tmp_path, dest_path)
+    return os.path.getsize(dest_path)
+
+async def prepare_ocr_image(filename: str, image_dir: str = IMAGE_FORDER) -> Tuple[bytes, str]:
+    """
+    LLMに送る画像のバイト列と形式 (data URL 用) を返す．
+    前処理した画像は元画像の隣に保存して再利用し，元画像より小さくならない場合や失敗した場合は元画像を使う
+    """
+    source_path = os.path.join(image_dir, os.path.basename(filename))
+    original_size = os.path.getsize(source_path)
+    dest_path = os.path.join(image_dir, ocr_image_name(filename))
+    if not os.path.exists(dest_path) or os.path.getmtime(dest_path) < os.path.getmtime(source_path):
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(get_executor(), preprocess_for_ocr, source_path, dest_path)
+        except Exception as e:
+            print(f"Warning: Could not preprocess {filename} for OCR: {str(e)}")
+
+    if os.path.exists(dest_path) and os.path.getsize(dest_path) < original_size:
+        path, fmt = dest_path, OCR_FORMAT
+    else:
+        path, fmt = source_path, os.path.basename(filename).split(".")[-1]
+    async with aiofiles.open(path, "rb") as image_file:
+        data = await image_file.read()
+
+    ocr_stats["images"] += 1
+    ocr_stats["original_bytes"] += original_size
+    ocr_stats["sent_bytes"] += len(data)
+    return data, fmt
+
+def remove_derivatives(filename: str, image_dir: str = IMAGE_FORDER) -> None:
+    _variant_cache.pop(os.path.basename(filename), None)
+    paths = [os.path.join(derived_dir(image_dir), derivative_name(filename, width)) for width in THUMBNAIL_WIDTHS]
+    paths.append(os.path.join(image_dir, ocr_image_name(filename)))
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+def backfill(image_dir: str = IMAGE_FORDER, force: bool = False) -> int:
+    """既存の画像ファイルの派生画像をまとめて作る．作成した画像ファイル数を返す"""
+    sources = []
+    for name in sorted(os.listdir(image_dir)):
+        path = os.path.join(image_dir, name)
+        if name.startswith(".") or OCR_SUFFIX + "." in name or not os.path.isfile(path):
+            continue
+        if not force and all(
+            os.path.exists(os.path.join(derived_dir(image_dir), derivative_name(name, w))) for w in THUMBNAIL_WIDTHS
+        ):
+            continue
+        sources.append(path)
+
+    done = 0
+    with ProcessPoolExecutor(max_workers=IMAGE_PROCESS_WORKERS) as executor:
+        futures = {path: executor.submit(make_derivatives, path, derived_dir(image_dir)) for path in sources}
+        for path, future in futures.items():
+            try:
+                future.result()
+                done += 1
+            except Exception as e:
+                print(f"Warning: Could not create derivatives for {path}: {str(e)}")
+    return done
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="既存の画像の派生画像 (サムネイル) を作成する")
+    parser.add_argument("--image-dir", default=IMAGE_FORDER)
+    parser.add_argument("--force", action="store_true", help="作成済みの派生画像も作り直す")
+    args = parser.parse_args()
+    print(f"Created derivatives for {backfill(args.image_dir, args.force)} images")
@@ -0,0 +1,102 @@
+import asyncio
+import os
+from fastapi import HTTPException
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from .db.database import async_session
+from .db import db_job
+from .db.models import JobModel
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# 実行中のままこの秒数を過ぎたジョブは，起動時に中断扱いにする
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "600"))
+
+JobHandler = Callable[..., Awaitable[Any]]
+
+
+class JobQueue:
+    """
+    プロセス内のジョブキュー．
+    ジョブの状態は jobs テーブルに保存し，登録された処理を固定数のワーカーで実行する．
+    DBセッションはジョブの状態を読み書きする間だけ開く．
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = workers
+        self._handlers: Dict[str, JobHandler] = {}
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+        self._done_events: Dict[str, asyncio.Event] = {}
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        """ジョブの種類と処理を登録する (処理はパラメータをキーワード引数で受け取る)"""
+        self._handlers[kind] = handler
+
+    async def start(self) -> None:
+        """中断されたジョブを片付け，待機中のジョブを積み直してワーカーを起動する"""
+        async with async_session() as db:
+            await db_job.fail_stale_jobs(db, JOB_STALE_SECONDS)
+            queued_ids = await db_job.get_queued_job_ids(db)
+        for job_id in queued_ids:
+            self._enqueue(job_id)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, kind: str, params: Dict[str, Any]) -> JobModel:
+        if kind not in self._handlers:
+            raise HTTPException(status_code=400, detail=f"Unknown job kind: {kind}")
+        async with async_session() as db:
+            job = await db_job.create_job(db, kind, params)
+        self._enqueue(job.id)
+        return job
+
+    async def wait(self, job_id: str, timeout: float) -> None:
+        """ジョブの完了を最大 timeout 秒待つ (このプロセスで実行されるジョブのみ)"""
+        event = self._done_events.get(job_id)
+        if event is None or timeout <= 0:
+            return
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def _enqueue(self, job_id: str) -> None:
+        self._done_events.setdefault(job_id, asyncio.Event())
+        self._queue.put_nowait(job_id)
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                print(f"Warning: Job {job_id} could not be processed: {str(e)}")
+            finally:
+                event = self._done_events.pop(job_id, None)
+                if event is not None:
+                    event.set()
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        async with async_session() as db:
+            job = await db_job.claim_job(db, job_id)
+        if job is None:
+            return
+
+        result, error = None, None
+        try:
+            result = await self._handlers[job.kind](**job.params)
+        except HTTPException as http_ex:
+            error = str(http_ex.detail)
+        except Exception as e:
+            error = f"An unexpected error occurred: {str(e)}"
+
+        async with async_session() as db:
+            await db_job.finish_job(db, job_id, result=result, error=error)
+
+
+job_queue = JobQueue()
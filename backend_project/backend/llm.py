@@ -0,0 +1,39 @@
+import os
+import threading
+from typing import Any, List, Optional
+
+# langchain / google-genai は読み込みに時間がかかるため，LLMを使う処理が初めて呼ばれたときに読み込む．
+# 一覧などの読み取り専用のエンドポイントしか使わないワーカーは読み込まずに済む
+
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-1.5-pro")
+
+_llm: Optional[Any] = None
+_llm_lock = threading.Lock()
+
+
+def get_llm() -> Any:
+    """
+    世界遺産の解析とクイズ作成に使うチャットモデルを返す．
+    set_llm で差し替えていなければ，最初の呼び出し時に Gemini のモデルを作る
+    """
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                from langchain_google_genai import ChatGoogleGenerativeAI
+                _llm = ChatGoogleGenerativeAI(model=LLM_MODEL)
+    return _llm
+
+def get_llm_model() -> str:
+    """キャッシュのキーに使うモデル名 (キャッシュにある場合はモデルを作らずに済むよう，未作成なら設定値を返す)"""
+    return _llm.model if _llm is not None else LLM_MODEL
+
+def set_llm(llm: Any) -> None:
+    """チャットモデルを差し替える (ベンチマークなどで決定的な偽のモデルを使うため)．None で元に戻す"""
+    global _llm
+    _llm = llm
+
+def human_message(content: List[dict]) -> Any:
+    """ユーザーのメッセージ (langchain の HumanMessage) を作る"""
+    from langchain_core.messages import HumanMessage
+    return HumanMessage(content=content)
@@ -0,0 +1,120 @@
+import asyncio
+import hashlib
+import json
+import os
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Union
+import aiofiles
+
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", "backend/cache/llm")
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+class LLMResultCache:
+    """
+    LLMの応答をディスクに保存するキャッシュ．
+    キーは入力 (画像のバイト列やプロンプト) とモデル名のハッシュで，合計サイズが上限を超えたら
+    最も長く使われていないものから削除する (LRU)．
+    """
+
+    def __init__(self, directory: str = LLM_CACHE_DIR, max_bytes: int = LLM_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.evictions = 0
+        self._entries: Optional["OrderedDict[str, int]"] = None
+        self._total_bytes = 0
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def make_key(kind: str, model: str, *parts: Union[bytes, str]) -> str:
+        """処理の種類・モデル名・入力から内容に基づくキーを作る"""
+        digest = hashlib.sha256()
+        for part in (kind, model) + parts:
+            data = part.encode("utf-8") if isinstance(part, str) else part
+            digest.update(len(data).to_bytes(8, "big"))
+            digest.update(data)
+        return digest.hexdigest()
+
+    async def get(self, key: str) -> Optional[Any]:
+        await self._load()
+        path = self._path(key)
+        try:
+            async with aiofiles.open(path, "r", encoding="utf-8") as f:
+                value = json.loads(await f.read())
+        except (FileNotFoundError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    async def put(self, key: str, value: Any) -> None:
+        await self._load()
+        path = self._path(key)
+        data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        async with aiofiles.open(tmp_path, "wb") as f:
+            await f.write(data)
+        os.replace(tmp_path, path)
+        async with self._lock:
+            self._total_bytes += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, size = self._entries.popitem(last=False)
+                self._total_bytes -= size
+                self.evictions += 1
+                try:
+                    os.remove(self._path(old_key))
+                except FileNotFoundError:
+                    pass
+
+    def record_bypass(self) -> None:
+        self.bypasses += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+            "evictions": self.evictions,
+            "entries": len(self._entries or ()),
+            "bytes": self._total_bytes,
+        }
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    async def _load(self) -> None:
+        """起動後の最初の利用時に，既存のキャッシュファイルを最終利用時刻の順に読み込む"""
+        if self._entries is not None:
+            return
+        async with self._lock:
+            if self._entries is None:
+                found = await asyncio.to_thread(self._scan)
+                self._entries = OrderedDict((key, size) for _, key, size in sorted(found))
+                self._total_bytes = sum(self._entries.values())
+
+    def _scan(self):
+        found = []
+        if not os.path.isdir(self.directory):
+            return found
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                stat = os.stat(os.path.join(root, name))
+                found.append((stat.st_mtime, name[:-len(".json")], stat.st_size))
+        return found
+
+
+llm_cache = LLMResultCache()
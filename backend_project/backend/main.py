@@ -1,17 +1,33 @@
 from fastapi import FastAPI
 from .db import models
-from .db.database import async_engine, Base
-from .routers import image, heritage, quiz
-from fastapi.staticfiles import StaticFiles
+from .db.database import async_engine, async_session, Base
+from .db.distractor_index import distractor_index
+from .db.search_index import search_index
+from .db.quiz_sampler import quiz_sampler
+from .routers import image, heritage, quiz, job, export, system, metrics as metrics_router
+from .metrics import MetricsMiddleware, instrument_engine
+from .jobs import job_queue
+from .attempts import attempt_buffer
+from .image_pipeline import shutdown_executor
+from .static_images import ImageStaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import asyncio
+import os
+
+# テーブルの作成は起動前に python -m backend.db.migrate --create で行う．
+# 1 にすると従来どおりワーカーの起動時に作成する (マイグレーションを実行しない開発環境向け)
+DB_CREATE_ALL = os.getenv("DB_CREATE_ALL", "0") == "1"
 
 app = FastAPI()
 
 app.include_router(image.router)
 app.include_router(heritage.router)
 app.include_router(quiz.router)
+app.include_router(job.router)
+app.include_router(export.router)
+app.include_router(system.router)
+app.include_router(metrics_router.router)
 
 origins = [
     "http://localhost:5173"
@@ -24,12 +40,27 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+instrument_engine(async_engine.sync_engine)
 
-app.mount("/images", StaticFiles(directory="backend/images"), name="images")
+app.mount("/images", ImageStaticFiles(directory="backend/images"), name="images")
 @app.on_event("startup")
 async def on_startup():
-    async with async_engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    if DB_CREATE_ALL:
+        async with async_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    async with async_session() as db:
+        await distractor_index.warm(db)
+        await search_index.warm(db)
+        await quiz_sampler.warm(db)
+    await job_queue.start()
+    await attempt_buffer.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await job_queue.stop()
+    await attempt_buffer.stop()
+    shutdown_executor()
 
 if __name__=="__main__":
     uvicorn.run("main:app",port=8000, reload=True)
@@ -0,0 +1,223 @@
+import logging
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# この秒数以上かかったリクエストは内訳 (SQL・LLM) を付けてログに出す
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "1.0"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LLM_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """単調増加するカウンター (Prometheus の counter)"""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {_format_number(value)}")
+        return lines
+
+
+class Histogram:
+    """値の分布を固定のバケットで数えるヒストグラム (Prometheus の histogram)"""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # ラベルの値ごとに [バケットごとの件数..., +Inf の件数], 合計
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        counts = self._counts.get(label_values)
+        if counts is None:
+            counts = self._counts[label_values] = [0] * (len(self.buckets) + 1)
+            self._sums[label_values] = 0.0
+        counts[bisect_left(self.buckets, value)] += 1
+        self._sums[label_values] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for label_values, counts in sorted(self._counts.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_number(bound)
+                bucket_labels = _format_labels(self.labels, label_values, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {repr(self._sums[label_values])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status"))
+http_request_db_statements = Histogram(
+    "http_request_db_statements", "SQL statements executed per HTTP request", ("method", "route"), COUNT_BUCKETS)
+http_request_db_seconds = Histogram(
+    "http_request_db_seconds", "Time spent in SQL statements per HTTP request", ("method", "route"))
+db_statement_duration = Histogram(
+    "db_statement_duration_seconds", "SQL statement execution time")
+llm_request_duration = Histogram(
+    "llm_request_duration_seconds", "LLM call latency", ("kind", "model", "outcome"), LLM_BUCKETS)
+llm_failures = Counter(
+    "llm_failures_total", "LLM calls that raised an error", ("kind", "model"))
+
+METRICS = [
+    http_request_duration,
+    http_request_db_statements,
+    http_request_db_seconds,
+    db_statement_duration,
+    llm_request_duration,
+    llm_failures,
+]
+
+# /metrics の出力時に値を読む (名前, 説明, 値) の一覧を返す関数
+GaugeCollector = Callable[[], List[Tuple[str, str, float]]]
+_collectors: List[GaugeCollector] = []
+
+
+def register_collector(collector: GaugeCollector) -> None:
+    """キャッシュやコネクションプールの現在値を gauge として出力するための関数を登録する"""
+    _collectors.append(collector)
+
+def render() -> str:
+    """全てのメトリクスを Prometheus のテキスト形式で返す"""
+    lines: List[str] = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        for name, documentation, value in collector():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {_format_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+@dataclass
+class RequestStats:
+    """一つのリクエストの処理時間の内訳"""
+    db_statements: int = 0
+    db_seconds: float = 0.0
+    llm_calls: int = 0
+    llm_seconds: float = 0.0
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """SQLの実行回数と時間を記録するイベントを登録する (非同期エンジンは sync_engine を渡す)"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        db_statement_duration.observe(elapsed)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.db_statements += 1
+            stats.db_seconds += elapsed
+
+@contextmanager
+def observe_llm(kind: str, model: str) -> Iterator[None]:
+    """LLMの呼び出し (ainvoke) の時間と失敗を記録する"""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "success"
+    except Exception:
+        llm_failures.inc(kind, model)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        llm_request_duration.observe(elapsed, kind, model, outcome)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.llm_calls += 1
+            stats.llm_seconds += elapsed
+
+
+class MetricsMiddleware:
+    """ルートごとのレイテンシとリクエストごとのSQL・LLMの内訳を記録する ASGI ミドルウェア"""
+
+    def __init__(self, app, slow_request_seconds: float = SLOW_REQUEST_SECONDS):
+        self.app = app
+        self.slow_request_seconds = slow_request_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_stats.reset(token)
+            self._record(scope, status, time.perf_counter() - start, stats)
+
+    def _record(self, scope, status: int, elapsed: float, stats: RequestStats) -> None:
+        # ラベルの種類が増えすぎないよう，パスではなくルートのテンプレートを使う
+        route = getattr(scope.get("route"), "path", None) or "unmatched"
+        method = scope["method"]
+        http_request_duration.observe(elapsed, method, route, str(status))
+        http_request_db_statements.observe(stats.db_statements, method, route)
+        http_request_db_seconds.observe(stats.db_seconds, method, route)
+        if elapsed >= self.slow_request_seconds:
+            logger.warning(
+                "Slow request: %s %s -> %d in %.3fs (db: %d statements / %.3fs, llm: %d calls / %.3fs, other: %.3fs)",
+                method, scope["path"], status, elapsed,
+                stats.db_statements, stats.db_seconds, stats.llm_calls, stats.llm_seconds,
+                max(elapsed - stats.db_seconds - stats.llm_seconds, 0.0),
+            )
@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+from ..db.db_export import iter_bank_ndjson, EXPORT_CHUNK_SIZE
+
+router = APIRouter(
+    prefix="/export",
+    tags=["export"],
+    responses={404: {"description": "Not found"}},
+)
+
+
+@router.get("/bank")
+async def export_bank(gzip: bool = False, chunk_size: int = Query(EXPORT_CHUNK_SIZE, ge=1, le=10000)):
+    """世界遺産とクイズをNDJSON形式でストリーミングして返す (gzip=true の場合は .ndjson.gz)"""
+    filename = "quiz_bank.ndjson.gz" if gzip else "quiz_bank.ndjson"
+    return StreamingResponse(
+        iter_bank_ndjson(chunk_size, compress=gzip),
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
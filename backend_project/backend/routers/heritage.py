@@ -1,18 +1,27 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from ..db.database import get_db
-from ..db import db_image, db_heritage, db_quiz
+from ..db.database import get_db, async_session
+from ..db import db_image, db_heritage, db_quiz, db_tag, cached_reads
 from ..db.models import HeritageModel
-from .schemas import HeritageSchema, HeritageUpdateSchema, HeritageListResponseSchema
+from ..db.tags import REGION_TAGS, FEATURE_TAGS
+from ..llm_cache import llm_cache
+from ..jobs import job_queue
+from ..image_pipeline import prepare_ocr_image
+from ..metrics import observe_llm
+from ..llm import get_llm, get_llm_model, human_message
+from ..singleflight import single_flight
+from .job import accept_job
+from ..db.pagination import PAGE_LIMIT_DEFAULT, PAGE_LIMIT_MAX, encode_cursor, decode_cursor
+from ..db.search_index import search_index
+from ..db.db_version import HERITAGES
+from ..http_cache import versioned_json_response
+from .schemas import HeritageSchema, HeritageUpdateSchema, HeritageListResponseSchema, HeritagePageSchema, HeritageBundleResponseSchema, HeritageFacetPageSchema, HeritageSearchPageSchema, JobAcceptedSchema
 import base64
+import copy
 import aiofiles
 import os
-from google import genai
-from google.genai import types
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import HumanMessage
-from typing import List, Optional
+from typing import List, Literal, Optional, Union
 from typing_extensions import Annotated, TypedDict
 
 router = APIRouter(
@@ -50,63 +59,70 @@ class HeritageItem(TypedDict):
 class HeritageResponse(TypedDict):
     content: List[HeritageItem]
 
-llm = ChatGoogleGenerativeAI(model="gemini-1.5-pro")
+OCR_PROMPT = "画像には一つ，または複数の世界遺産についての情報が含まれています。画像内にある世界遺産の名前，説明，世界遺産の登録基準の数値，国名を画像からそのまま抽出してください。大陸名，特徴は選択肢から選んでください．"
 IMAGE_FORDER = os.getenv("IMAGE_FORDER", "backend/images")
 
 def check_region(tag: str) -> bool:
     """指定されたタグが正しいかどうかを確認する"""
-    valid_tags = [
-        "アジア", "ヨーロッパ", "アフリカ", "北アメリカ", "南アメリカ", "オセアニア"
-    ]
-    return tag in valid_tags
+    return tag in REGION_TAGS
 def check_feature(tag: str) -> bool:
     """指定されたタグが正しいかどうかを確認する"""
-    valid_tags = [
-        "宗教建築", "キリスト教建築", "イスラム建築", "仏教建築", "ヒンドゥー教建築",
-        "神社建築", "その他宗教建築", "宮殿・邸宅", "城郭・要塞", "遺跡・考古学的遺跡",
-        "歴史的都市・集落", "文化的景観", "産業遺産", "交通遺産", "庭園・公園",
-        "古墳・墓所", "記念建造物", "岩絵・壁画", "負の遺産", "山岳・山脈",
-        "火山・火山地形", "森林", "砂漠", "河川・湖沼", "湿地・湿原",
-        "氷河・氷床・フィヨルド", "海岸・崖", "島嶼", "海洋生態系",
-        "サンゴ礁", "カルスト地形・洞窟", "滝",
-        "特殊な地形・地質",  # 追加
-        "化石産地",
-        # 他のタグも追加可能
-    ]
-    return tag in valid_tags
+    return tag in FEATURE_TAGS
 
 
-@router.post("/preview/{image_id}", response_model=HeritageListResponseSchema)
-async def preview_ocr_image(image_id: int, db: AsyncSession = Depends(get_db)):
-    record = await db_image.get_by_id(db, image_id)
+async def run_preview(image_id: int, no_cache: bool = False) -> dict:
+    """
+    同じ画像の解析が実行中であれば，LLMの呼び出しと保存を重ねずにその結果を返す．
+    no_cache の実行はキャッシュを使う実行の結果を受け取らないよう，別のキーでまとめる
+    """
+    key = f"heritage_preview:{image_id}" + (":no_cache" if no_cache else "")
+    return await single_flight.do(key, lambda: analyze_image(image_id, no_cache))
+
+async def analyze_image(image_id: int, no_cache: bool = False) -> dict:
+    """
+    画像をLLMで解析して世界遺産データを保存する．
+    LLMの応答を待つ間はDBセッション (コネクション) を保持しない
+    """
+    async with async_session() as db:
+        record = await db_image.get_by_id(db, image_id)
     if not record:
         raise HTTPException(status_code=404, detail="Image not found")
     filename = record.filename.split("/")[-1]
-    path = os.path.join(IMAGE_FORDER, filename)
-    extention = filename.split(".")[-1]
     try:
-        async with aiofiles.open(path, "rb") as image_file:
-            encoded_string = base64.b64encode(await image_file.read()).decode("utf-8")
+        # 縮小・再圧縮した画像を送る (送信量とLLMの処理時間を減らす)
+        image_bytes, extention = await prepare_ocr_image(filename, IMAGE_FORDER)
     except Exception as e:
         raise HTTPException(status_code=404, detail="Image not found")
 
-    message = HumanMessage(
-        content=[
+    # 同じ画像・プロンプト・モデルの解析結果はキャッシュから返す
+    cache_key = llm_cache.make_key("heritage-ocr", get_llm_model(), OCR_PROMPT, image_bytes)
+    llm_response: Optional[HeritageResponse] = None
+    if no_cache:
+        llm_cache.record_bypass()
+    else:
+        llm_response = await llm_cache.get(cache_key)
+    from_cache = llm_response is not None
+
+    if not from_cache:
+        encoded_string = base64.b64encode(image_bytes).decode("utf-8")
+        message = human_message([
             {
                 "type": "text",
-                "text": "画像には一つ，または複数の世界遺産についての情報が含まれています。画像内にある世界遺産の名前，説明，世界遺産の登録基準の数値，国名を画像からそのまま抽出してください。大陸名，特徴は選択肢から選んでください．"
+                "text": OCR_PROMPT
             },
             {
                 "type": "image_url",
                 "image_url": f"data:image/{extention};base64,{encoded_string}"
             },
-        ]
-    )
-    strucutred_llm = llm.with_structured_output(HeritageResponse)
-    try:
-        llm_response: HeritageResponse = await strucutred_llm.ainvoke([message])
-    except Exception as e:
-        raise HTTPException(status_code=500, detail="Failed to process image with LLM")
+        ])
+        llm = get_llm()
+        strucutred_llm = llm.with_structured_output(HeritageResponse)
+        try:
+            with observe_llm("heritage-ocr", llm.model):
+                llm_response = await strucutred_llm.ainvoke([message])
+        except Exception as e:
+            raise HTTPException(status_code=500, detail="Failed to process image with LLM")
+    raw_response = copy.deepcopy(llm_response)
 
     if llm_response and llm_response.get("content"):
         for item in llm_response["content"]:
@@ -116,42 +132,141 @@ async def preview_ocr_image(image_id: int, db: AsyncSession = Depends(get_db)):
             item["image_id"] = image_id
             item["region"] = item.get("region")
             item["feature"] = item.get("feature")
-            if not check_region(item["region"]):
+            if not item["region"] or not all(check_region(tag) for tag in item["region"]):
                 raise HTTPException(status_code=400, detail="Invalid region tag")
             if not all(check_feature(tag) for tag in item["feature"]):
                 raise HTTPException(status_code=400, detail="Invalid feature tag")
-
+        if not from_cache:
+            await llm_cache.put(cache_key, raw_response)
 
     try:
-        saved_heritages = await db_heritage.create_multiple_heritages(db, image_id, llm_response["content"])
+        async with async_session() as db:
+            saved_heritages = await db_heritage.create_multiple_heritages(db, image_id, llm_response["content"])
     except HTTPException as http_ex:
         raise http_ex
     except Exception as e:
         raise HTTPException(status_code=500, detail="n unexpected error occurred while saving data.")
 
-    return {"content": saved_heritages}
+    return {"content": [HeritageSchema.model_validate(h).model_dump(mode="json") for h in saved_heritages]}
+
+job_queue.register("heritage_preview", run_preview)
+
+@router.post(
+    "/preview/{image_id}",
+    response_model=HeritageListResponseSchema,
+    responses={202: {"model": JobAcceptedSchema}},
+)
+async def preview_ocr_image(image_id: int, no_cache: bool = False, mode: Literal["sync", "async"] = "sync"):
+    """画像を解析する (mode=async の場合はジョブとして登録し，202 とジョブIDを返す)"""
+    if mode == "async":
+        return await accept_job("heritage_preview", {"image_id": image_id, "no_cache": no_cache})
+    return await run_preview(image_id, no_cache)
 
 @router.post("/view/{image_id}", response_model=HeritageListResponseSchema)
 async def confirm_ocr_image(image_id: int, db: AsyncSession = Depends(get_db)):
-    image_record = await db_image.get_by_id(db, image_id)
-    if not image_record:
-        raise HTTPException(status_code=404, detail="Image not found")
-    heritage_records = await db_heritage.get_heritages_by_image_id(db, image_id)
+    heritage_records = await cached_reads.get_heritages_by_image_id(db, image_id)
 
     return {"content": heritage_records}
 
-@router.get("/all", response_model=List[HeritageSchema])
-async def get_all_heritages(db: AsyncSession = Depends(get_db)):
-    heritages = await db_heritage.get_all_heritages(db)
-    return heritages
+@router.get("/all", response_model=Union[HeritagePageSchema, List[HeritageSchema]])
+async def get_all_heritages(
+    request: Request,
+    limit: int = Query(PAGE_LIMIT_DEFAULT, ge=1, le=PAGE_LIMIT_MAX),
+    cursor: Optional[str] = None,
+    image_id: Optional[int] = None,
+    unesco_tag: Optional[str] = None,
+    unpaginated: bool = False,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    世界遺産一覧をタイトル順にページングして返す (unpaginated=true の場合は全件をリストで返す)．
+    ETag が一致すれば 304 を返す
+    """
+    async def build():
+        if unpaginated:
+            heritages = await cached_reads.get_all_heritages(db)
+            return [HeritageSchema.model_validate(h).model_dump(mode="json") for h in heritages]
+        page = await cached_reads.get_heritages_page(db, limit, cursor, image_id, unesco_tag)
+        return HeritagePageSchema.model_validate(page).model_dump(mode="json")
+    return await versioned_json_response(request, db, [HERITAGES], build)
+
+@router.get("/bundle", response_model=HeritageBundleResponseSchema)
+async def get_heritage_bundle(
+    image_id: Optional[int] = None,
+    heritage_ids: Optional[List[int]] = Query(None, max_length=PAGE_LIMIT_MAX),
+    db: AsyncSession = Depends(get_db),
+):
+    """世界遺産をクイズ付きで返す (image_id または heritage_ids で絞り込む)"""
+    if image_id is None and not heritage_ids:
+        raise HTTPException(status_code=400, detail="image_id or heritage_ids is required")
+    heritages = await db_heritage.get_heritages_with_quizzes(db, image_id, heritage_ids)
+    return {"content": heritages}
+
+@router.get("/facets", response_model=HeritageFacetPageSchema)
+async def filter_heritages(
+    request: Request,
+    unesco: Optional[List[str]] = Query(None),
+    region: Optional[List[str]] = Query(None),
+    feature: Optional[List[str]] = Query(None),
+    country: Optional[List[str]] = Query(None),
+    criteria: Optional[List[str]] = Query(None),
+    limit: int = Query(PAGE_LIMIT_DEFAULT, ge=1, le=PAGE_LIMIT_MAX),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    世界遺産をタグで絞り込む (例: ?unesco=自然遺産&region=アフリカ&feature=滝)．
+    項目どうしは AND，同じ項目に複数の値を指定した場合は OR で，結果と一緒に項目ごとの値の件数を返す
+    """
+    filters = {"unesco": unesco, "region": region, "feature": feature, "country": country, "criteria": criteria}
+
+    async def build():
+        heritages, next_cursor, total, facets = await db_tag.find_heritages(
+            db, {facet: values for facet, values in filters.items() if values}, limit, cursor)
+        return HeritageFacetPageSchema(
+            content=[HeritageSchema.model_validate(h) for h in heritages],
+            next=next_cursor,
+            total=total,
+            facets=facets,
+        ).model_dump(mode="json")
+    return await versioned_json_response(request, db, [HERITAGES], build)
+
+@router.get("/search", response_model=HeritageSearchPageSchema)
+async def search_heritages(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=PAGE_LIMIT_MAX),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    世界遺産をタイトル・要約・説明文から全文検索する (空白区切りの語は全て含むものを返す)．
+    タイトルに一致したものほど上位になり，snippet に一致箇所の前後を返す
+    """
+    after = decode_cursor(cursor, 1)
+    offset = after[0] if after is not None else 0
+    if not isinstance(offset, int) or offset < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    await search_index.ensure_warm(db)
+    hits, total = search_index.search(q, limit, offset)
+    content = [
+        {
+            "id": hit.document.id,
+            "image_id": hit.document.image_id,
+            "title": hit.document.title,
+            "summary": hit.document.summary,
+            "unesco_tag": hit.document.unesco_tag,
+            "score": hit.score,
+            "snippet": hit.snippet,
+        }
+        for hit in hits
+    ]
+    next_cursor = encode_cursor([offset + limit]) if offset + limit < total else None
+    return {"content": content, "total": total, "next": next_cursor}
 
 @router.get("/detail/{heritage_id}", response_model=HeritageSchema)
 async def get_heritage_detail_endpoint(heritage_id: int, db: AsyncSession = Depends(get_db)):
     """指定されたIDの世界遺産詳細を取得する"""
-    heritage = await db_heritage.get_heritage_by_id(db, heritage_id)
-    if heritage is None:
-        raise HTTPException(status_code=404, detail="Heritage not found")
-    return heritage
+    return await cached_reads.get_heritage_by_id(db, heritage_id)
 
 @router.put("/update/{heritage_id}", response_model=HeritageSchema)
 async def update_single_heritage_endpoint(
@@ -1,14 +1,19 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException, Depends
+from fastapi import APIRouter, BackgroundTasks, File, UploadFile, HTTPException, Depends, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from ..db.database import get_db
+from ..db.database import get_db, async_session
 from ..db import db_image
-from .schemas import ImageBase, ImageDisplay
+from ..db.pagination import PAGE_LIMIT_DEFAULT, PAGE_LIMIT_MAX
+from ..db.db_version import bump_version, IMAGES
+from ..http_cache import versioned_json_response
+from .schemas import ImageBase, ImageDisplay, ImagePageSchema
+from ..image_pipeline import generate_derivatives_quietly, has_derivatives, remove_derivatives
 import aiofiles
 import uuid
 import os
+import asyncio
+import hashlib
 from PIL import Image, UnidentifiedImageError
-from io import BytesIO
-from typing import List
+from typing import List, Optional, Tuple, Union
 from datetime import datetime
 
 router = APIRouter(
@@ -19,57 +24,160 @@ router = APIRouter(
 
 IMAGE_FORDER = os.getenv("IMAGE_FORDER", "backend/images")
 WEB_IMAGE_FORDER = os.getenv("WEB_IMAGE_FORDER", "images")
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
 
+SNIFF_BYTES = 12
+IMAGE_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+]
 
-@router.get("/all", response_model=List[ImageDisplay])
-async def get_all_images(db: AsyncSession = Depends(get_db)):
-    return await db_image.get_all(db)
+def remove_file(path: str) -> None:
+    if os.path.exists(path):
+        os.remove(path)
 
-@router.post("/upload", response_model=ImageDisplay)
-async def upload_image(image: UploadFile = File(...), db: AsyncSession = Depends(get_db)):
-    # Check if the file is an image
+
+@router.get("/all", response_model=Union[ImagePageSchema, List[ImageDisplay]])
+async def get_all_images(
+    request: Request,
+    limit: int = Query(PAGE_LIMIT_DEFAULT, ge=1, le=PAGE_LIMIT_MAX),
+    cursor: Optional[str] = None,
+    unpaginated: bool = False,
+    db: AsyncSession = Depends(get_db),
+):
+    """画像一覧を id 順にページングして返す (unpaginated=true の場合は全件をリストで返す)．ETag が一致すれば 304 を返す"""
+    async def build():
+        if unpaginated:
+            return [ImageDisplay.model_validate(i).model_dump(mode="json", by_alias=True) for i in await db_image.get_all(db)]
+        images, next_cursor = await db_image.get_page(db, limit, cursor)
+        return ImagePageSchema(content=images, next=next_cursor).model_dump(mode="json", by_alias=True)
+    return await versioned_json_response(request, db, [IMAGES], build)
+
+async def generate_derivatives_and_bump(filename: str) -> None:
+    """派生画像を作った後，一覧の variants が更新されるよう画像テーブルのバージョンを上げる"""
+    await generate_derivatives_quietly(filename)
     try:
-        contents = await image.read()
-        img = Image.open(BytesIO(contents))
+        async with async_session() as db:
+            await bump_version(db, IMAGES)
+            await db.commit()
+    except Exception as e:
+        print(f"Warning: Could not update image list version: {str(e)}")
+
+def sniff_image_type(header: bytes) -> Optional[str]:
+    """ファイル先頭のバイト列から画像形式を判定する"""
+    for signature, kind in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return kind
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+def verify_image(path: str) -> None:
+    """Pillowで画像ファイルを検証する (CPUを使うためワーカースレッドで実行する)"""
+    with Image.open(path) as img:
         img.verify()
-    except Exception:
+
+async def save_upload_stream(upload: UploadFile, tmp_path: str) -> Tuple[str, int, str]:
+    """
+    アップロードされたファイルをチャンクごとに一時ファイルへ書き込む．
+    書き込みと同時にSHA-256の計算，サイズ上限の確認，先頭バイトによる形式の判定を行う．
+    戻り値は (SHA-256, バイト数, 画像形式)
+    """
+    digest = hashlib.sha256()
+    size = 0
+    header = b""
+    async with aiofiles.open(tmp_path, "wb") as out_file:
+        while True:
+            chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            if len(header) < SNIFF_BYTES:
+                header += chunk[:SNIFF_BYTES - len(header)]
+                if len(header) >= SNIFF_BYTES and sniff_image_type(header) is None:
+                    raise HTTPException(status_code=400, detail="Invalid image file")
+            size += len(chunk)
+            if size > MAX_UPLOAD_BYTES:
+                raise HTTPException(status_code=413, detail="Image file too large")
+            digest.update(chunk)
+            await out_file.write(chunk)
+    kind = sniff_image_type(header)
+    if size == 0 or kind is None:
         raise HTTPException(status_code=400, detail="Invalid image file")
-    finally:
-        image.file.seek(0)
+    return digest.hexdigest(), size, kind
 
+@router.post("/upload", response_model=ImageDisplay)
+async def upload_image(
+    background_tasks: BackgroundTasks,
+    image: UploadFile = File(...),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    画像を内容のハッシュ (SHA-256) をファイル名として保存する．
+    同じ内容の画像が既にあれば，新しく保存せずに既存のレコードの参照数を増やして返す．
+    ギャラリー用の派生画像はレスポンスの後にプロセスプールで作る
+    """
     # Extract file extension
-    filename_parts = image.filename.split(".", 1)
+    filename_parts = (image.filename or "").split(".", 1)
     if len(filename_parts) != 2:
         raise HTTPException(status_code=400, detail="Invalid image file")
-    ext = filename_parts[1]
 
-    # Generate unique filename
-    unique_filename = f"{uuid.uuid4().hex}.{ext}"
+    # 同じディレクトリの一時ファイルに書き込み，検証後にリネームする
+    tmp_path = os.path.join(IMAGE_FORDER, f".{uuid.uuid4().hex}.part")
 
-    path = os.path.join(IMAGE_FORDER, unique_filename)
-    web_path = os.path.join(WEB_IMAGE_FORDER, unique_filename)
-
-    # Save the image
+    # Stream the image to a temporary file and check if the file is an image
     try:
-        async with aiofiles.open(path, "wb") as out_file:
-            file_content = await image.read()
-            await out_file.write(file_content)
+        content_hash, _, kind = await save_upload_stream(image, tmp_path)
+        existing = await db_image.get_by_content_hash(db, content_hash)
+        if existing is not None and not await db_image.add_reference(db, existing):
+            existing = None
+        if existing is not None:
+            path = os.path.join(IMAGE_FORDER, existing.filename.split("/")[-1])
+            if os.path.exists(path):
+                remove_file(tmp_path)
+            else:
+                os.replace(tmp_path, path)
+            if not has_derivatives(existing.filename):
+                background_tasks.add_task(generate_derivatives_and_bump, existing.filename)
+            return existing
+
+        try:
+            await asyncio.to_thread(verify_image, tmp_path)
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid image file")
+
+        content_filename = f"{content_hash}.{kind}"
+        path = os.path.join(IMAGE_FORDER, content_filename)
+        web_path = os.path.join(WEB_IMAGE_FORDER, content_filename)
+        os.replace(tmp_path, path)
+    except HTTPException:
+        remove_file(tmp_path)
+        raise
     except Exception:
+        remove_file(tmp_path)
         raise HTTPException(status_code=500, detail="Failed to save image")
 
     # Save the image to the database
     image_data = ImageBase(
         filename=web_path,
-        timestamp=datetime.utcnow()
+        timestamp=datetime.utcnow(),
+        content_hash=content_hash,
     )
 
     try:
         record = await db_image.create(db, image_data)
     except Exception:
-        if os.path.exists(path):
-            os.remove(path)
+        # 同じ画像が同時にアップロードされた場合は，先に保存されたレコードを返す
+        existing = await db_image.get_by_content_hash(db, content_hash)
+        if existing is not None and await db_image.add_reference(db, existing):
+            return existing
+        if existing is None:
+            remove_file(path)
         raise HTTPException(status_code=500, detail="Failed to save image")
 
+    background_tasks.add_task(generate_derivatives_and_bump, record.filename)
     return record
 
 @router.delete("/delete/{image_id}", response_model=dict)
@@ -77,14 +185,20 @@ async def delete_image(image_id: int, db: AsyncSession = Depends(get_db)):
     record = await db_image.get_by_id(db, image_id)
     if not record:
         raise HTTPException(status_code=404, detail="Image not found")
-    unique_filename = record.filename.split("/")[-1]
+    filename = record.filename
+    unique_filename = filename.split("/")[-1]
     path = os.path.join(IMAGE_FORDER, unique_filename)
-    if os.path.exists(path):
-        try:
+
+    # 同じ画像を他にもアップロードしていれば参照を減らすだけで，画像・世界遺産・クイズは残す
+    if not await db_image.release(db, image_id):
+        return {"detail": "Image reference released"}
+
+    # 画像ファイルは最後の参照が削除されたときだけ消す
+    try:
+        if os.path.exists(path):
             os.remove(path)
-        except Exception:
-            raise HTTPException(status_code=500, detail="Image file not found on server")
-    else:
-        pass
+        remove_derivatives(filename)
+    except Exception as e:
+        print(f"Warning: Could not remove image file {path}: {str(e)}")
 
-    return await db_image.delete_by_id(db, image_id)
+    return {"detail": "Image deleted successfully"}
@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Query
+from fastapi.responses import JSONResponse
+from ..db.database import async_session
+from ..db import db_job
+from ..jobs import job_queue
+from .schemas import JobSchema, JobAcceptedSchema
+from typing import Any, Dict
+
+router = APIRouter(
+    prefix="/job",
+    tags=["job"],
+    responses={404: {"description": "Not found"}},
+)
+
+
+async def accept_job(kind: str, params: Dict[str, Any]) -> JSONResponse:
+    """ジョブを登録し，202 Accepted とジョブIDを返す"""
+    job = await job_queue.submit(kind, params)
+    body = JobAcceptedSchema(job_id=job.id, status=job.status)
+    return JSONResponse(status_code=202, content=body.model_dump(), headers={"Location": f"/job/{job.id}"})
+
+@router.get("/{job_id}", response_model=JobSchema)
+async def get_job_status(job_id: str, wait: float = Query(0, ge=0, le=30)):
+    """ジョブの状態を取得する (wait 秒まで完了を待ってから返す)"""
+    async with async_session() as db:
+        job = await db_job.get_job(db, job_id)
+    if job.status in (db_job.JOB_QUEUED, db_job.JOB_RUNNING) and wait > 0:
+        await job_queue.wait(job_id, wait)
+        async with async_session() as db:
+            job = await db_job.get_job(db, job_id)
+    return job
@@ -0,0 +1,34 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from .. import metrics
+from ..attempts import attempt_buffer
+from ..db.database import pool_stats
+from ..db.read_cache import read_cache
+from ..image_pipeline import ocr_stats
+from ..llm_cache import llm_cache
+from ..singleflight import single_flight
+
+router = APIRouter(
+    tags=["metrics"],
+)
+
+
+def collect_app_stats():
+    """LLMキャッシュ・読み取りキャッシュ・重複実行の抑止・回答の書き込みバッファ・OCR前処理・コネクションプールの現在値"""
+    values = [(f"llm_cache_{key}", f"LLM result cache {key}", value) for key, value in llm_cache.stats().items()]
+    values += [(f"read_cache_{key}", f"Read-through cache {key}", value) for key, value in read_cache.stats().items()]
+    values += [(f"singleflight_{key}", f"Coalesced LLM operations {key}", value) for key, value in single_flight.stats().items()]
+    values += [(f"quiz_attempts_{key}", f"Write-behind quiz attempt buffer {key}", value) for key, value in attempt_buffer.stats().items()]
+    values += [(f"ocr_{key}_total", f"OCR preprocessing {key}", value) for key, value in ocr_stats.items()]
+    for key, value in pool_stats().items():
+        if isinstance(value, (int, float)):
+            values.append((f"db_pool_{key}", f"DB connection pool {key}", value))
+    return values
+
+metrics.register_collector(collect_app_stats)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus のテキスト形式でメトリクスを返す"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
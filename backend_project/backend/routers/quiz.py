@@ -1,20 +1,30 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from ..db.database import get_db
-from ..db import db_image, db_heritage, db_quiz
+from ..db.database import get_db, async_session
+from ..db import db_image, db_heritage, db_quiz, db_attempt, cached_reads
 from ..db.models import HeritageModel, QuizModel
-from .schemas import HeritageSchema, HeritageUpdateSchema, HeritageListResponseSchema, QuizSchema, QuizListResponseSchema, QuizUpdateSchema
+from ..db.distractor_index import distractor_index, DistractorEntry
+from ..db.quiz_sampler import quiz_sampler, quiz_sessions, normalize_filters, QuizSession
+from ..db.pagination import PAGE_LIMIT_DEFAULT, PAGE_LIMIT_MAX
+from ..db.db_version import QUIZZES
+from ..http_cache import versioned_json_response
+from ..llm_cache import llm_cache
+from ..metrics import observe_llm
+from ..llm import get_llm, get_llm_model, human_message
+from ..singleflight import single_flight
+from ..jobs import job_queue
+from ..attempts import attempt_buffer
+from .job import accept_job
+from .schemas import HeritageSchema, HeritageUpdateSchema, HeritageListResponseSchema, QuizSchema, QuizListResponseSchema, QuizUpdateSchema, QuizPageSchema, QuizBulkGenerateSchema, QuizBulkResultItem, QuizBulkGenerateResponseSchema, QuizSessionCreateSchema, QuizSessionSchema, QUIZ_SESSION_COUNT_MAX, QuizAnswerSchema, QuizAnswerResultSchema, QuizStatsSchema, JobAcceptedSchema
 import base64
+import json
 import aiofiles
 import os
-from google import genai
-from google.genai import types
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import HumanMessage
-from typing import List, Optional
+from typing import Dict, List, Literal, Optional, Union
 from typing_extensions import Annotated, TypedDict
 import random
+import asyncio
 
 router = APIRouter(
     prefix="/quiz",
@@ -22,7 +32,8 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-llm = ChatGoogleGenerativeAI(model="gemini-1.5-pro")
+QUIZ_BULK_CONCURRENCY = int(os.getenv("QUIZ_BULK_CONCURRENCY", "4"))
+QUIZ_BULK_BATCH_SIZE = int(os.getenv("QUIZ_BULK_BATCH_SIZE", "20"))
 
 class QuizItem(TypedDict):
     question: Annotated[str, ..., "4択のクイズの問題文を作成してください"]
@@ -32,163 +43,71 @@ class QuizItem(TypedDict):
 class QuizResponse(TypedDict):
     content: List[QuizItem]
 
-def calculate_tag_similarity(tags1: Optional[List[str]], tags2: Optional[List[str]]) -> int:
-    """タグリスト間の共通要素数を返す"""
-    if not tags1 or not tags2:
-        return 0
-    set1 = set(tags1)
-    set2 = set(tags2)
-    return len(set1.intersection(set2))
-
 def find_distractors(
     target: HeritageModel,
-    candidates: List[HeritageModel],
     num_distractors: int = 3
-) -> List[HeritageModel]:
+) -> List[DistractorEntry]:
     """
     個別のタグフィールドを参照して類似度に基づきダミー選択肢を探す
+    (インメモリ索引のビットマスク列に対して Tier をまとめて判定する)
     """
-    distractors_found: List[HeritageModel] = []
-    target_id = target.id
-    target_unesco = target.unesco_tag
-    target_region_list = target.region or []
-    target_feature_set = set(target.feature or [])
-
-    # 自分自身を除外し、候補をシャッフル
-    valid_candidates = [c for c in candidates if c.id != target_id]
-    random.shuffle(valid_candidates)
-
-    # UNESCOタグのマッチング関数 (複合遺産を考慮)
-    def check_unesco_match(unesco1: Optional[str], unesco2: Optional[str]) -> bool:
-        if not unesco1 or not unesco2: return False
-        if unesco1 == unesco2: return True
-        # 正解が文化遺産/自然遺産の場合、複合遺産も候補として許容
-        if unesco1 == "文化遺産" and unesco2 == "複合遺産": return True
-        if unesco1 == "自然遺産" and unesco2 == "複合遺産": return True
-        # 正解が複合遺産の場合、文化/自然遺産も候補として許容
-        if unesco1 == "複合遺産" and unesco2 == "文化遺産": return True
-        if unesco1 == "複合遺産" and unesco2 == "自然遺産": return True
-        return False
-
-    # 地域タグのマッチング関数 (リストの最初の要素が一致するか、またはリストが一致するか)
-    # 単一地域を想定する場合は前者、複数地域を許容する場合は後者や共通要素確認
-    def check_region_match(region1_list: Optional[List[str]], region2_list: Optional[List[str]]) -> bool:
-        if not region1_list or not region2_list: return False
-        # 最も単純な比較: 最初の要素が同じか (単一地域タグを想定)
-        return region1_list[0] == region2_list[0]
-        # または、共通の地域タグが一つでもあればマッチとする場合:
-        # return bool(set(region1_list) & set(region2_list))
-
-    processed_candidate_ids = set() # 処理済み候補ID
-
-    # --- 優先度に基づいてダミー選択肢を検索 ---
-    # Tier 1: UNESCO一致 & 地域一致 & 特徴が類似 (例: 半分以上一致)
-    for cand in valid_candidates:
-        if len(distractors_found) >= num_distractors: break
-        if cand.id in processed_candidate_ids: continue
-
-        # cand_unesco = get_unesco_tag(cand.criteria) # DBに unesco_tag がない場合
-        cand_unesco = cand.unesco_tag # DBに保存されていると仮定
-        cand_region_list = cand.region or []
-        cand_feature_set = set(cand.feature or [])
-
-        if check_unesco_match(target_unesco, cand_unesco) and \
-           check_region_match(target_region_list, cand_region_list):
-            common_features = len(target_feature_set.intersection(cand_feature_set))
-            # 類似度の閾値 (調整可能)
-            # 例1: ターゲットに特徴があり、共通の特徴が1つ以上ある
-            # 例2: ターゲットの特徴の半分以上が共通している
-            if target_feature_set and common_features >= max(1, len(target_feature_set) // 2):
-                 distractors_found.append(cand)
-                 processed_candidate_ids.add(cand.id)
-
-    # Tier 2: UNESCO一致 & 地域一致 (特徴は問わない)
-    if len(distractors_found) < num_distractors:
-        for cand in valid_candidates:
-            if len(distractors_found) >= num_distractors: break
-            if cand.id in processed_candidate_ids: continue
-
-            # cand_unesco = get_unesco_tag(cand.criteria)
-            cand_unesco = cand.unesco_tag
-            cand_region_list = cand.region or []
-
-            if check_unesco_match(target_unesco, cand_unesco) and \
-               check_region_match(target_region_list, cand_region_list):
-                 distractors_found.append(cand)
-                 processed_candidate_ids.add(cand.id)
-
-    # Tier 3: UNESCO一致のみ
-    if len(distractors_found) < num_distractors:
-        for cand in valid_candidates:
-            if len(distractors_found) >= num_distractors: break
-            if cand.id in processed_candidate_ids: continue
-
-            # cand_unesco = get_unesco_tag(cand.criteria)
-            cand_unesco = cand.unesco_tag
-
-            if check_unesco_match(target_unesco, cand_unesco):
-                 distractors_found.append(cand)
-                 processed_candidate_ids.add(cand.id)
-
-    # Fallback: それでも足りなければ残りの候補からランダムに追加
-    if len(distractors_found) < num_distractors:
-        remaining_candidates = [c for c in valid_candidates if c.id not in processed_candidate_ids]
-        needed = num_distractors - len(distractors_found)
-        distractors_found.extend(random.sample(remaining_candidates, min(needed, len(remaining_candidates))))
-
-    # 最終的に num_distractors 個に絞る (多く見つかりすぎた場合)
-    return distractors_found[:num_distractors]
-
-@router.post("/generate/{heritage_id}")
-async def generate_quiz(heritage_id: int, db: AsyncSession = Depends(get_db)):
-    """ LLMによるクイズ作成 """
-    record = await db_heritage.get_heritage_by_id(db, heritage_id)
-    if not record:
-        raise HTTPException(status_code=404, detail="Heritage not found")
+    return distractor_index.find(target, num_distractors)
+
+def build_quiz_prompt(record: HeritageModel) -> List[dict]:
+    """クイズ作成用のプロンプトを作る"""
     number_of_quizzes = 2
-    if len(record.description) >= 500:
+    if len(record.description or "") >= 500:
         number_of_quizzes = 3
-    message = HumanMessage(
-        content=[
-            {
-                "type": "text",
-                "text": f"対象の世界遺産とその説明から4択のクイズを{number_of_quizzes}つ作成してください．"
-            },
-            {
-                "type": "text",
-                "text": f"対象の世界遺産：{record.title} 説明：{record.description} 登録基準：{record.criteria}"
-            },
-        ]
-    )
-    structured_llm = llm.with_structured_output(QuizResponse)
-    try:
-        response: QuizResponse = await structured_llm.ainvoke([message])
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to generate quiz: {str(e)}")
+    return [
+        {
+            "type": "text",
+            "text": f"対象の世界遺産とその説明から4択のクイズを{number_of_quizzes}つ作成してください．"
+        },
+        {
+            "type": "text",
+            "text": f"対象の世界遺産：{record.title} 説明：{record.description} 登録基準：{record.criteria}"
+        },
+    ]
+
+async def request_llm_quizzes(record: HeritageModel, no_cache: bool = False) -> QuizResponse:
+    """ LLMによるクイズ作成 (同じプロンプト・モデルの結果はキャッシュから返す) """
+    prompt = build_quiz_prompt(record)
+    cache_key = llm_cache.make_key("quiz", get_llm_model(), json.dumps(prompt, ensure_ascii=False))
+    response: Optional[QuizResponse] = None
+    if no_cache:
+        llm_cache.record_bypass()
+    else:
+        response = await llm_cache.get(cache_key)
+
+    if response is None:
+        llm = get_llm()
+        structured_llm = llm.with_structured_output(QuizResponse)
+        try:
+            with observe_llm("quiz", llm.model):
+                response = await structured_llm.ainvoke([human_message(prompt)])
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to generate quiz: {str(e)}")
+        if not response or not isinstance(response.get("content"), list):
+            raise HTTPException(status_code=500, detail="Failed to generate quiz: invalid LLM response")
+        await llm_cache.put(cache_key, response)
 
     for quiz in response["content"]:
         if quiz.get("question") and quiz.get("options") and quiz.get("answer"):
             quiz["question"] = f"「{record.title}」に関する問題です．" + quiz["question"]
+    return response
 
+def add_rule_based_quizzes(target_heritage: HeritageModel, content: List[dict], num_distractors: int = 3) -> None:
     """ 世界遺産のデータに基づき，ルールベースでクイズを生成 """
-    target_heritage = await db_heritage.get_heritage_by_id(db, heritage_id)
-    if not target_heritage:
-        raise HTTPException(status_code=404, detail="Heritage not found")
-
-    candidate_heritages = await db_heritage.get_all_heritages_except_id(db, heritage_id)
-    if not candidate_heritages:
-        raise HTTPException(status_code=404, detail="No candidate heritages found")
-
-    num_distractors = 3
+    heritage_id = target_heritage.id
 
     # Quiz Type 1: 簡易要約を基にしたクイズ
     if target_heritage.simple_summary and len(target_heritage.simple_summary) >= 3:
-        distractor_models_t1 = find_distractors(target_heritage, candidate_heritages, num_distractors)
+        distractor_models_t1 = find_distractors(target_heritage, num_distractors)
         if len(distractor_models_t1) == num_distractors: # ダミーが3つ見つかった場合のみ作成
             question_text = "次の３つの説明文から推測される遺産として，正しいものはどれか．\n" + "\n".join(f"- {s}" for s in target_heritage.simple_summary[:3])
             options = [d.title for d in distractor_models_t1] + [target_heritage.title]
             random.shuffle(options)
-            response["content"].append({
+            content.append({
                 "question": question_text,
                 "options": options,
                 "answer": target_heritage.title
@@ -198,12 +117,12 @@ async def generate_quiz(heritage_id: int, db: AsyncSession = Depends(get_db)):
 
     # Quiz Type 2: 要約を当てるクイズ
     if target_heritage.summary:
-        distractor_models_t2 = find_distractors(target_heritage, candidate_heritages, num_distractors)
+        distractor_models_t2 = find_distractors(target_heritage, num_distractors)
         if len(distractor_models_t2) == num_distractors:
              question_text = f"「{target_heritage.title}」の説明として，正しいものはどれか"
              options = [d.summary for d in distractor_models_t2] + [target_heritage.summary]
              random.shuffle(options)
-             response["content"].append({
+             content.append({
                  "question": question_text,
                  "options": options,
                  "answer": target_heritage.summary
@@ -211,9 +130,104 @@ async def generate_quiz(heritage_id: int, db: AsyncSession = Depends(get_db)):
         else:
             print(f"Warning: Could not find enough distractors for Quiz Type 2 (Summary) for ID {heritage_id}")
 
+async def run_bulk_generate(
+    heritage_ids: Optional[List[int]] = None,
+    without_quizzes: bool = False,
+    concurrency: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    no_cache: bool = False,
+) -> dict:
+    """
+    複数の世界遺産のクイズをまとめて作成する．
+    LLMの呼び出しは concurrency 件まで並行に行い，結果は batch_size 件の世界遺産ごとにまとめて保存する．
+    """
+    if heritage_ids is None and not without_quizzes:
+        raise HTTPException(status_code=400, detail="Specify heritage_ids or without_quizzes")
+
+    async with async_session() as db:
+        if without_quizzes:
+            target_ids = await db_heritage.get_heritage_ids_without_quizzes(db, heritage_ids)
+        else:
+            target_ids = list(dict.fromkeys(heritage_ids))
+        records = {h.id: h for h in await db_heritage.get_heritages_by_ids(db, target_ids)}
+        # 候補の読み込みはバッチ全体で一度だけ行う
+        await distractor_index.ensure_warm(db)
+
+    results = {heritage_id: QuizBulkResultItem(heritage_id=heritage_id, success=False, detail="Heritage not found")
+               for heritage_id in target_ids if heritage_id not in records}
+    semaphore = asyncio.Semaphore(concurrency or QUIZ_BULK_CONCURRENCY)
+    batch_size = batch_size or QUIZ_BULK_BATCH_SIZE
+
+    async def generate_one(record: HeritageModel):
+        try:
+            async with semaphore:
+                response = await request_llm_quizzes(record, no_cache=no_cache)
+            add_rule_based_quizzes(record, response["content"])
+            return record.id, response["content"], None
+        except HTTPException as http_ex:
+            return record.id, None, http_ex.detail
+        except Exception as e:
+            return record.id, None, f"Failed to generate quiz: {str(e)}"
+
+    pending: Dict[int, List[dict]] = {}
+
+    async def flush() -> None:
+        batch = dict(pending)
+        pending.clear()
+        try:
+            async with async_session() as db:
+                await db_quiz.create_quizzes_for_heritages(db, batch)
+        except HTTPException as http_ex:
+            for heritage_id in batch:
+                results[heritage_id] = QuizBulkResultItem(heritage_id=heritage_id, success=False, detail=http_ex.detail)
+            return
+        for heritage_id, content in batch.items():
+            results[heritage_id] = QuizBulkResultItem(heritage_id=heritage_id, success=True, quiz_count=len(content))
+
+    for task in asyncio.as_completed([generate_one(record) for record in records.values()]):
+        heritage_id, content, error = await task
+        if error is not None:
+            results[heritage_id] = QuizBulkResultItem(heritage_id=heritage_id, success=False, detail=error)
+            continue
+        pending[heritage_id] = content
+        if len(pending) >= batch_size:
+            await flush()
+    if pending:
+        await flush()
+
+    ordered = [results[heritage_id] for heritage_id in target_ids]
+    succeeded = sum(1 for r in ordered if r.success)
+    return QuizBulkGenerateResponseSchema(
+        succeeded=succeeded, failed=len(ordered) - succeeded, results=ordered
+    ).model_dump(mode="json")
+
+async def run_generate_quiz(heritage_id: int, no_cache: bool = False) -> dict:
+    """
+    同じ世界遺産のクイズ作成が実行中であれば，LLMの呼び出しと保存を重ねずにその結果を返す．
+    no_cache の実行はキャッシュを使う実行の結果を受け取らないよう，別のキーでまとめる
+    """
+    key = f"quiz_generate:{heritage_id}" + (":no_cache" if no_cache else "")
+    return await single_flight.do(key, lambda: create_quizzes(heritage_id, no_cache))
+
+async def create_quizzes(heritage_id: int, no_cache: bool = False) -> dict:
+    """
+    LLMとルールベースで世界遺産のクイズを作成して保存する．
+    LLMの応答を待つ間はDBセッション (コネクション) を保持しない
+    """
+    async with async_session() as db:
+        record = await db_heritage.get_heritage_by_id(db, heritage_id)
+        if not record:
+            raise HTTPException(status_code=404, detail="Heritage not found")
+        await distractor_index.ensure_warm(db)
+    if len(distractor_index) - (heritage_id in distractor_index) == 0:
+        raise HTTPException(status_code=404, detail="No candidate heritages found")
+
+    response = await request_llm_quizzes(record, no_cache=no_cache)
+    add_rule_based_quizzes(record, response["content"])
 
     try: # Debugging line
-        saved_quizzes = await db_quiz.create_multiple_quizzes(db, heritage_id, response["content"])
+        async with async_session() as db:
+            saved_quizzes = await db_quiz.create_multiple_quizzes(db, heritage_id, response["content"])
     except HTTPException as http_ex:
         raise http_ex
     except Exception as e:
@@ -221,10 +235,104 @@ async def generate_quiz(heritage_id: int, db: AsyncSession = Depends(get_db)):
 
     return response
 
-@router.get("/all", response_model=List[QuizSchema])
-async def get_all_quizzes(db: AsyncSession = Depends(get_db)):
-    """ 全てのクイズを取得 """
-    return await db_quiz.get_all_quizzes(db)
+job_queue.register("quiz_generate", run_generate_quiz)
+job_queue.register("quiz_bulk_generate", run_bulk_generate)
+
+@router.post(
+    "/generate/bulk",
+    response_model=QuizBulkGenerateResponseSchema,
+    responses={202: {"model": JobAcceptedSchema}},
+)
+async def generate_quizzes_bulk(request: QuizBulkGenerateSchema, mode: Literal["sync", "async"] = "sync"):
+    """複数の世界遺産のクイズをまとめて作成する (mode=async の場合はジョブとして登録する)"""
+    params = request.model_dump()
+    if mode == "async":
+        return await accept_job("quiz_bulk_generate", params)
+    return await run_bulk_generate(**params)
+
+@router.post("/generate/{heritage_id}", responses={202: {"model": JobAcceptedSchema}})
+async def generate_quiz(heritage_id: int, no_cache: bool = False, mode: Literal["sync", "async"] = "sync"):
+    """ LLMによるクイズ作成 (mode=async の場合はジョブとして登録し，202 とジョブIDを返す) """
+    if mode == "async":
+        return await accept_job("quiz_generate", {"heritage_id": heritage_id, "no_cache": no_cache})
+    return await run_generate_quiz(heritage_id, no_cache)
+
+@router.get("/all", response_model=Union[QuizPageSchema, List[QuizSchema]])
+async def get_all_quizzes(
+    request: Request,
+    limit: int = Query(PAGE_LIMIT_DEFAULT, ge=1, le=PAGE_LIMIT_MAX),
+    cursor: Optional[str] = None,
+    heritage_id: Optional[int] = None,
+    unpaginated: bool = False,
+    db: AsyncSession = Depends(get_db),
+):
+    """ クイズを id 順にページングして取得 (unpaginated=true の場合は全てのクイズをリストで取得)．ETag が一致すれば 304 を返す """
+    async def build():
+        if unpaginated:
+            return [QuizSchema.model_validate(q).model_dump(mode="json") for q in await db_quiz.get_all_quizzes(db)]
+        quizzes, next_cursor = await db_quiz.get_quizzes_page(db, limit, cursor, heritage_id)
+        return QuizPageSchema(content=quizzes, next=next_cursor).model_dump(mode="json")
+    return await versioned_json_response(request, db, [QUIZZES], build)
+
+async def serve_session(db: AsyncSession, session: QuizSession, count: int) -> dict:
+    """セッションでまだ出題していないクイズを count 件ランダムに選んで返す"""
+    await quiz_sampler.ensure_warm(db)
+    quiz_ids = quiz_sampler.sample(session.filters, count, session.served)
+    # 読み込みを待つ間に同じセッションの別のリクエストが同じクイズを選ばないよう，先に出題済みにする
+    session.served.update(quiz_ids)
+    try:
+        quizzes = await db_quiz.get_quizzes_by_ids(db, quiz_ids)
+    except Exception:
+        session.served.difference_update(quiz_ids)
+        raise
+    # 削除されていて読み込めなかったクイズは出題済みから外す
+    session.served.difference_update(set(quiz_ids) - {quiz.id for quiz in quizzes})
+    # 出題済みのクイズのうち，削除やタグの変更で条件から外れたものは数えない
+    served = quiz_sampler.count_in_pool(session.filters, session.served)
+    remaining = max(len(quiz_sampler.pool(session.filters)) - served, 0)
+    return {"session_id": session.id, "content": quizzes, "remaining": remaining}
+
+@router.post("/session", response_model=QuizSessionSchema)
+async def create_quiz_session(request: QuizSessionCreateSchema, db: AsyncSession = Depends(get_db)):
+    """タグで絞り込んだクイズからランダムに出題するセッションを作り，最初の count 問を返す"""
+    filters = normalize_filters(request.model_dump(exclude={"count"}))
+    session = quiz_sessions.create(filters)
+    return await serve_session(db, session, request.count)
+
+@router.post("/session/{session_id}/next", response_model=QuizSessionSchema)
+async def next_quiz_session(
+    session_id: str,
+    count: int = Query(10, ge=1, le=QUIZ_SESSION_COUNT_MAX),
+    db: AsyncSession = Depends(get_db),
+):
+    """セッションの続きの問題を返す (同じセッションで出題済みのクイズは出さない)"""
+    session = quiz_sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Quiz session not found or expired")
+    return await serve_session(db, session, count)
+
+@router.post("/answer/{quiz_id}", response_model=QuizAnswerResultSchema)
+async def submit_answer(quiz_id: int, request: QuizAnswerSchema, db: AsyncSession = Depends(get_db)):
+    """回答を採点して記録する (記録はまとめて非同期に保存する)"""
+    quiz = await cached_reads.get_quiz_by_id(db, quiz_id)
+    correct = request.answer.strip() == quiz["answer"].strip()
+    attempt_buffer.record(quiz_id, request.answer, correct, request.session_id)
+    return {"quiz_id": quiz_id, "correct": correct, "answer": quiz["answer"]}
+
+@router.get("/stats/{quiz_id}", response_model=QuizStatsSchema)
+async def get_quiz_stats(quiz_id: int, db: AsyncSession = Depends(get_db)):
+    """クイズの回答数と正答率 (未保存の回答も含む)"""
+    await cached_reads.get_quiz_by_id(db, quiz_id)
+    attempts, correct = await db_attempt.get_stats(db, quiz_id)
+    pending_attempts, pending_correct = attempt_buffer.pending(quiz_id)
+    attempts += pending_attempts
+    correct += pending_correct
+    return {
+        "quiz_id": quiz_id,
+        "attempts": attempts,
+        "correct": correct,
+        "correct_rate": correct / attempts if attempts else None,
+    }
 
 @router.get("/list/{heritage_id}", response_model=List[QuizSchema])
 async def get_quizzes_by_heritage_id_endpoint(
@@ -232,7 +340,7 @@ async def get_quizzes_by_heritage_id_endpoint(
     db: AsyncSession = Depends(get_db),
 ):
     """指定されたIDの世界遺産に関連するクイズを取得する"""
-    quizzes_models = await db_quiz.get_quizzes_by_heritage_id(db, heritage_id)
+    quizzes_models = await cached_reads.get_quizzes_by_heritage_id(db, heritage_id)
     if not quizzes_models:
         raise HTTPException(status_code=404, detail="No quizzes found for this heritage")
 
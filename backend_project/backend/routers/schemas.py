@@ -1,10 +1,12 @@
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, computed_field
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
+from ..image_pipeline import variant_urls
 
 class ImageBase(BaseModel):
     filename: str
     timestamp: datetime
+    content_hash: Optional[str] = None
 
 class ImageDisplay(BaseModel):
     imade_id: int = Field(..., alias="id")
@@ -14,6 +16,16 @@ class ImageDisplay(BaseModel):
         from_attributes=True
     )
 
+    @computed_field
+    @property
+    def variants(self) -> Dict[str, str]:
+        """幅ごとの派生画像 (サムネイル) のURL"""
+        return variant_urls(self.filename)
+
+class ImagePageSchema(BaseModel):
+    content: List[ImageDisplay]
+    next: Optional[str] = None
+
 class HeritageSchema(BaseModel):
     id: int
     image_id: int
@@ -31,6 +43,32 @@ class HeritageSchema(BaseModel):
 class HeritageListResponseSchema(BaseModel):
     content: List[HeritageSchema]
 
+class HeritagePageSchema(BaseModel):
+    content: List[HeritageSchema]
+    next: Optional[str] = None
+
+class HeritageFacetPageSchema(BaseModel):
+    content: List[HeritageSchema]
+    next: Optional[str] = None
+    total: int
+    # 絞り込み結果に含まれる，項目 (region など) ごとの値とその件数
+    facets: Dict[str, Dict[str, int]]
+
+class HeritageSearchHitSchema(BaseModel):
+    id: int
+    image_id: int
+    title: str
+    summary: Optional[str] = None
+    unesco_tag: Optional[str] = None
+    score: float
+    # 一致箇所を <mark> で囲んだ HTML (それ以外の部分はエスケープ済み)
+    snippet: str
+
+class HeritageSearchPageSchema(BaseModel):
+    content: List[HeritageSearchHitSchema]
+    total: int
+    next: Optional[str] = None
+
 class HeritageUpdateSchema(BaseModel):
     title: str
     description: Optional[str] = None
@@ -54,7 +92,90 @@ class QuizListResponseSchema(BaseModel):
     content: List[QuizSchema]
     model_config = ConfigDict(from_attributes=True)
 
+class QuizPageSchema(BaseModel):
+    content: List[QuizSchema]
+    next: Optional[str] = None
+
 class QuizUpdateSchema(BaseModel):
     question: str
     options: List[str]
     answer: str
+
+class HeritageWithQuizzesSchema(HeritageSchema):
+    quizzes: List[QuizSchema] = []
+
+class HeritageBundleResponseSchema(BaseModel):
+    content: List[HeritageWithQuizzesSchema]
+
+QUIZ_SESSION_COUNT_MAX = 50
+
+class QuizSessionCreateSchema(BaseModel):
+    count: int = Field(10, ge=1, le=QUIZ_SESSION_COUNT_MAX)
+    # 世界遺産のタグで絞り込む (項目どうしは AND，同じ項目の値どうしは OR)
+    unesco: Optional[List[str]] = None
+    region: Optional[List[str]] = None
+    feature: Optional[List[str]] = None
+    country: Optional[List[str]] = None
+    criteria: Optional[List[str]] = None
+
+class QuizPlaySchema(BaseModel):
+    """出題用のクイズ (正解は含めない)"""
+    id: int
+    heritage_id: int
+    question: str
+    options: List[str]
+    model_config = ConfigDict(from_attributes=True)
+
+class QuizSessionSchema(BaseModel):
+    session_id: str
+    content: List[QuizPlaySchema]
+    # このセッションでまだ出題していない，条件に合うクイズの数
+    remaining: int
+
+class QuizAnswerSchema(BaseModel):
+    answer: str
+    session_id: Optional[str] = Field(None, max_length=32)
+
+class QuizAnswerResultSchema(BaseModel):
+    quiz_id: int
+    correct: bool
+    # 正解の選択肢
+    answer: str
+
+class QuizStatsSchema(BaseModel):
+    quiz_id: int
+    attempts: int
+    correct: int
+    correct_rate: Optional[float] = None
+
+class QuizBulkGenerateSchema(BaseModel):
+    heritage_ids: Optional[List[int]] = None
+    without_quizzes: bool = False
+    concurrency: Optional[int] = Field(None, ge=1, le=32)
+    batch_size: Optional[int] = Field(None, ge=1, le=500)
+    no_cache: bool = False
+
+class QuizBulkResultItem(BaseModel):
+    heritage_id: int
+    success: bool
+    quiz_count: int = 0
+    detail: Optional[str] = None
+
+class QuizBulkGenerateResponseSchema(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[QuizBulkResultItem]
+
+class JobSchema(BaseModel):
+    id: str
+    kind: str
+    status: str
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    model_config = ConfigDict(from_attributes=True)
+
+class JobAcceptedSchema(BaseModel):
+    job_id: str
+    status: str
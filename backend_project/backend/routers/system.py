@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+from ..db.database import pool_stats
+
+router = APIRouter(
+    prefix="/system",
+    tags=["system"],
+    responses={404: {"description": "Not found"}},
+)
+
+
+@router.get("/pool")
+async def get_pool_stats():
+    """DBのコネクションプールの使用状況を返す (プールの大きさを決めるため)"""
+    return pool_stats()
@@ -0,0 +1,117 @@
+import asyncio
+import os
+import uuid
+from datetime import datetime
+from fastapi import HTTPException
+from typing import Any, Awaitable, Callable, Dict, Optional
+from .db.database import async_session
+from .db import db_lock
+
+# 複数のワーカー (プロセス) の間でも重複を防ぐ場合は 1 にする (operation_locks テーブルを使う)
+SINGLEFLIGHT_DB_LOCK = os.getenv("SINGLEFLIGHT_DB_LOCK", "0") == "1"
+# 実行中のワーカーが落ちた場合に，この秒数を過ぎたら他のワーカーが実行権を引き継ぐ
+SINGLEFLIGHT_LOCK_TTL = float(os.getenv("SINGLEFLIGHT_LOCK_TTL", "300"))
+SINGLEFLIGHT_POLL_INTERVAL = float(os.getenv("SINGLEFLIGHT_POLL_INTERVAL", "0.5"))
+
+
+class SingleFlight:
+    """
+    同じキー (処理の種類と入力) の処理が実行中であれば，新しく実行せずにその結果を待って返す．
+    処理は呼び出し元とは別のタスクで実行するため，先に呼び出したリクエストが切断されても他の呼び出し元は結果を受け取れる．
+    use_db_lock=True の場合はロック用のテーブルで他のワーカーとも調整し，結果 (JSON) をテーブル経由で受け渡す
+    """
+
+    def __init__(
+        self,
+        use_db_lock: bool = SINGLEFLIGHT_DB_LOCK,
+        lock_ttl: float = SINGLEFLIGHT_LOCK_TTL,
+        poll_interval: float = SINGLEFLIGHT_POLL_INTERVAL,
+    ):
+        self.use_db_lock = use_db_lock
+        self.lock_ttl = lock_ttl
+        self.poll_interval = poll_interval
+        self.executed = 0
+        self.coalesced = 0
+        self.remote_waits = 0
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run(key, fn))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "remote_waits": self.remote_waits,
+            "inflight": len(self._inflight),
+        }
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # 待っている呼び出し元が全て切断された場合も，例外が未処理の警告にならないようにする
+            task.exception()
+
+    async def _run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.use_db_lock:
+            self.executed += 1
+            return await fn()
+
+        owner = uuid.uuid4().hex
+        while True:
+            async with async_session() as db:
+                if await db_lock.try_acquire(db, key, owner, self.lock_ttl):
+                    break
+            self.remote_waits += 1
+            finished, result = await self._wait_remote(key)
+            if finished:
+                return result
+
+        self.executed += 1
+        try:
+            result = await fn()
+        except HTTPException as http_ex:
+            await self._release(key, owner, status_code=http_ex.status_code, error=str(http_ex.detail))
+            raise
+        except Exception as e:
+            await self._release(key, owner, status_code=500, error=f"An unexpected error occurred: {str(e)}")
+            raise
+        await self._release(key, owner, result=result)
+        return result
+
+    async def _wait_remote(self, key: str):
+        """
+        他のワーカーの処理の終了を待つ．(True, 結果) を返すか，失敗した場合は同じ例外を送出する．
+        実行中の行が消えた・期限切れになった場合は (False, None) を返し，呼び出し元が実行権の取得からやり直す
+        """
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            async with async_session() as db:
+                lock = await db_lock.get_lock(db, key)
+            if lock is None:
+                return False, None
+            if lock.status == db_lock.LOCK_DONE:
+                return True, lock.result
+            if lock.status == db_lock.LOCK_FAILED:
+                raise HTTPException(status_code=lock.status_code or 500, detail=lock.error)
+            if lock.expires_at < datetime.now():
+                return False, None
+
+    async def _release(self, key: str, owner: str, **values: Any) -> None:
+        try:
+            async with async_session() as db:
+                await db_lock.release(db, key, owner, **values)
+        except Exception as e:
+            # 解放に失敗しても，期限切れ後に他のワーカーが引き継げる
+            print(f"Warning: Could not release operation lock {key}: {str(e)}")
+
+
+single_flight = SingleFlight()
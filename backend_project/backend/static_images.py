@@ -0,0 +1,51 @@
+import os
+from urllib.parse import quote
+from fastapi.staticfiles import StaticFiles
+from starlette.responses import Response
+from starlette.types import Scope
+
+# 画像のファイル名は一意 (アップロード時に作る) で内容が変わらないため，ブラウザには再検証させない
+IMAGE_CACHE_MAX_AGE = int(os.getenv("IMAGE_CACHE_MAX_AGE", str(365 * 24 * 3600)))
+# 前段の nginx に配信を任せる場合の内部パス (例: /internal-images/)．空ならこのプロセスで返す．
+# nginx 側では次のように，同じディレクトリを internal な location で公開する
+#     location /internal-images/ { internal; alias /app_backend/backend/images/; sendfile on; }
+IMAGE_ACCEL_REDIRECT_PREFIX = os.getenv("IMAGE_ACCEL_REDIRECT_PREFIX", "")
+
+
+class ImageStaticFiles(StaticFiles):
+    """
+    画像を返す StaticFiles．長期間の immutable な Cache-Control を付ける．
+    Range・If-None-Match・If-Modified-Since には StaticFiles / FileResponse が対応し，
+    サーバーが http.response.pathsend に対応していればファイルの送信はサーバーが行う．
+    accel_redirect_prefix を指定すると本文は返さず，X-Accel-Redirect で前段のプロキシに配信を任せる
+    """
+
+    def __init__(
+        self,
+        *args,
+        max_age: int = IMAGE_CACHE_MAX_AGE,
+        accel_redirect_prefix: str = IMAGE_ACCEL_REDIRECT_PREFIX,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.cache_control = f"public, max-age={max_age}, immutable"
+        self.accel_redirect_prefix = accel_redirect_prefix
+
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        if self.accel_redirect_prefix:
+            relative = os.path.relpath(os.path.realpath(full_path), os.path.realpath(self.directory))
+            location = self.accel_redirect_prefix.rstrip("/") + "/" + quote(relative.replace(os.sep, "/"))
+            # Content-Type・Range・条件付きリクエストは nginx が処理する
+            return Response(status_code=status_code, headers={
+                "X-Accel-Redirect": location,
+                "Cache-Control": self.cache_control,
+            })
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        response.headers["Cache-Control"] = self.cache_control
+        return response
@@ -0,0 +1,104 @@
+"""
+世界遺産とクイズの一括保存の速さを測る．
+
+    pip install -r requirements-dev.txt   # aiosqlite
+    python -m benchmarks.bulk_insert --rows 10000
+    BENCH_DATABASE_URL="mysql+aiomysql://user:pass@db/bench" python -m benchmarks.bulk_insert
+
+1行ずつ refresh する従来の保存方法と db.bulk.insert_rows を比べる．
+指定したDBのテーブルは作り直すので，本番のDBには使わないこと
+"""
+import argparse
+import asyncio
+import os
+import time
+
+for name in ("MYSQL_USER", "MYSQL_PASSWORD", "MYSQL_DATABASE"):
+    os.environ.setdefault(name, "bench")
+
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from backend.db.database import Base
+from backend.db.models import ImageModel, HeritageModel, QuizModel
+from backend.db.bulk import insert_rows
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCH_DATABASE_URL = os.getenv(
+    "BENCH_DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(BENCH_DIR, '.data', 'bench_bulk_insert.sqlite')}")
+os.makedirs(os.path.join(BENCH_DIR, ".data"), exist_ok=True)
+
+
+def heritage_rows(n: int):
+    return [
+        {
+            "image_id": 1,
+            "title": f"世界遺産 {i}",
+            "description": "説明文" * 20,
+            "summary": "要約",
+            "simple_summary": ["一", "二", "三"],
+            "criteria": [1, 4],
+            "unesco_tag": "文化遺産",
+            "country": ["日本"],
+            "region": ["アジア"],
+            "feature": ["宗教建築", "仏教建築"],
+        }
+        for i in range(n)
+    ]
+
+def quiz_rows(n: int, heritage_ids):
+    return [
+        {
+            "heritage_id": heritage_ids[i % len(heritage_ids)],
+            "question": f"問題 {i}",
+            "options": ["A", "B", "C", "D"],
+            "answer": "A",
+        }
+        for i in range(n)
+    ]
+
+async def save_with_refresh(session, model, rows):
+    """変更前の保存方法 (add して commit した後に1行ずつ refresh する)"""
+    objects = [model(**row) for row in rows]
+    for obj in objects:
+        session.add(obj)
+    await session.commit()
+    for obj in objects:
+        await session.refresh(obj)
+    return objects
+
+async def save_bulk(session, model, rows):
+    objects = await insert_rows(session, model, rows)
+    await session.commit()
+    return objects
+
+async def run(rows: int) -> None:
+    engine = create_async_engine(BENCH_DATABASE_URL)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    print(f"database: {engine.url.render_as_string(hide_password=True)}, rows: {rows}")
+    for label, save in (("refresh per row", save_with_refresh), ("bulk insert", save_bulk)):
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+        async with session_factory() as session:
+            session.add(ImageModel(id=1, filename="images/bench.png"))
+            await session.commit()
+
+        async with session_factory() as session:
+            start = time.perf_counter()
+            heritages = await save(session, HeritageModel, heritage_rows(rows))
+            heritage_seconds = time.perf_counter() - start
+        heritage_ids = [h.id for h in heritages]
+        assert all(heritage_ids), "ids were not populated"
+        async with session_factory() as session:
+            start = time.perf_counter()
+            await save(session, QuizModel, quiz_rows(rows, heritage_ids))
+            quiz_seconds = time.perf_counter() - start
+        print(f"{label:>16}: heritages {heritage_seconds:7.3f}s ({rows / heritage_seconds:8.0f} rows/s), "
+              f"quizzes {quiz_seconds:7.3f}s ({rows / quiz_seconds:8.0f} rows/s)")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="世界遺産とクイズの一括保存のベンチマーク")
+    parser.add_argument("--rows", type=int, default=10000)
+    args = parser.parse_args()
+    asyncio.run(run(args.rows))
@@ -0,0 +1,71 @@
+"""
+ベンチマーク用の決定的な偽のチャットモデル．
+
+backend.llm.set_llm(FakeChatModel(...)) で差し替えて使う．同じ入力には常に同じ応答を返し，
+応答までの待ち時間と応答の大きさ (説明文の文字数・クイズの数) を指定できる
+"""
+import asyncio
+import hashlib
+import json
+import random
+from typing import Any, Dict, List
+from backend.db.tags import REGION_TAGS, FEATURE_TAGS
+
+
+class FakeStructuredModel:
+    def __init__(self, parent: "FakeChatModel", schema_name: str):
+        self.parent = parent
+        self.schema_name = schema_name
+
+    async def ainvoke(self, messages: List[Any]) -> Dict[str, Any]:
+        text = json.dumps([m.content for m in messages], ensure_ascii=False, sort_keys=True)
+        rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+        parent = self.parent
+        delay = parent.latency + rng.uniform(0, parent.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        parent.calls += 1
+        if self.schema_name == "QuizResponse":
+            return {"content": [parent.make_quiz(rng, i) for i in range(parent.quiz_count)]}
+        return {"content": [parent.make_heritage(rng, i) for i in range(parent.heritages_per_image)]}
+
+
+class FakeChatModel:
+    """ChatGoogleGenerativeAI の代わりに使う (with_structured_output と ainvoke のみ対応)"""
+
+    model = "fake"
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        jitter: float = 0.0,
+        quiz_count: int = 5,
+        heritages_per_image: int = 1,
+        description_chars: int = 400,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.quiz_count = quiz_count
+        self.heritages_per_image = heritages_per_image
+        self.description_chars = description_chars
+        self.calls = 0
+
+    def with_structured_output(self, schema: Any) -> FakeStructuredModel:
+        return FakeStructuredModel(self, getattr(schema, "__name__", str(schema)))
+
+    def make_heritage(self, rng: random.Random, index: int) -> Dict[str, Any]:
+        number = rng.randrange(10 ** 6)
+        return {
+            "title": f"偽の世界遺産 {number}-{index}",
+            "description": ("説明文" * self.description_chars)[:self.description_chars],
+            "summary": f"偽の世界遺産 {number} の要約",
+            "simple_summary": [f"特徴 {number}-{i}" for i in range(3)],
+            "criteria": sorted(rng.sample(range(1, 11), rng.randint(1, 3))),
+            "country": ["日本"],
+            "region": [rng.choice(REGION_TAGS)],
+            "feature": rng.sample(FEATURE_TAGS, rng.randint(1, 3)),
+        }
+
+    def make_quiz(self, rng: random.Random, index: int) -> Dict[str, Any]:
+        options = [f"選択肢 {rng.randrange(10 ** 6)}" for _ in range(4)]
+        return {"question": f"問題 {index}", "options": options, "answer": rng.choice(options)}
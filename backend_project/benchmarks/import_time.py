@@ -0,0 +1,97 @@
+"""
+アプリの読み込み時間を測る (新しいプロセスで python -X importtime を実行して集計する)．
+
+    cd backend_project
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --max-seconds 1.5
+
+LLM関連のライブラリ (LAZY_MODULES) が起動時に読み込まれていないことも確認し，
+読み込まれていた場合や --max-seconds を超えた場合は終了コード 1 で終わる．
+テストからは measure_import() の結果を使って同じ確認ができる
+"""
+import argparse
+import os
+import subprocess
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# LLMを使う処理が呼ばれるまで読み込まないモジュール (backend/llm.py を参照)
+LAZY_MODULES = ("langchain_google_genai", "langchain_core", "google.genai")
+
+
+@dataclass
+class ImportReport:
+    """モジュールごとの読み込み時間 (秒)．cumulative は読み込んだ子モジュールの分を含む"""
+    module: str
+    self_seconds: Dict[str, float] = field(default_factory=dict)
+    cumulative_seconds: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def total_seconds(self) -> float:
+        return self.cumulative_seconds.get(self.module, 0.0)
+
+    def imported(self, name: str) -> bool:
+        """name (またはそのサブモジュール) が読み込まれたか"""
+        return any(m == name or m.startswith(name + ".") for m in self.cumulative_seconds)
+
+    def slowest(self, count: int = 20) -> List[Tuple[str, float]]:
+        """読み込み時間 (子モジュールを含む) の長いトップレベルのパッケージ"""
+        packages: Dict[str, float] = {}
+        for name, seconds in self.cumulative_seconds.items():
+            if "." not in name:
+                packages[name] = max(packages.get(name, 0.0), seconds)
+        return sorted(packages.items(), key=lambda item: -item[1])[:count]
+
+
+def parse_importtime(stderr: str, module: str) -> ImportReport:
+    """-X importtime の出力 ("import time: self [us] | cumulative | imported package") を読む"""
+    report = ImportReport(module=module)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        name = name.strip()
+        # 同じモジュールが複数回出ることはないが，念のため大きい方を使う
+        report.self_seconds[name] = max(report.self_seconds.get(name, 0.0), int(self_us) / 1e6)
+        report.cumulative_seconds[name] = max(report.cumulative_seconds.get(name, 0.0), int(cumulative_us) / 1e6)
+    return report
+
+def measure_import(module: str = "backend.main", env: Optional[Dict[str, str]] = None) -> ImportReport:
+    """新しいプロセスで module を読み込み，その読み込み時間を返す"""
+    process_env = dict(os.environ)
+    # DBには接続しないが，接続先の設定がないと backend.db.database の読み込みに失敗するため
+    process_env.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+    process_env.update(env or {})
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_DIR, env=process_env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to import {module}:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr, module)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="アプリの読み込み時間を測る")
+    parser.add_argument("--module", default="backend.main")
+    parser.add_argument("--top", type=int, default=15, help="表示するパッケージの数")
+    parser.add_argument("--max-seconds", type=float, default=None, help="読み込み時間の上限 (超えたら終了コード 1)")
+    args = parser.parse_args()
+
+    report = measure_import(args.module)
+    print(f"{args.module}: {report.total_seconds * 1000:.1f} ms")
+    for name, seconds in report.slowest(args.top):
+        print(f"  {name:<32} {seconds * 1000:8.1f} ms")
+
+    failed = False
+    for name in LAZY_MODULES:
+        if report.imported(name):
+            print(f"NG: {name} is imported at startup")
+            failed = True
+    if args.max_seconds is not None and report.total_seconds > args.max_seconds:
+        print(f"NG: import took longer than {args.max_seconds}s")
+        failed = True
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,58 @@
+import os
+import tempfile
+
+# backend の読み込み前に，テスト用のSQLiteと画像ディレクトリを設定する
+TEST_DIR = tempfile.mkdtemp(prefix="backend-tests-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(TEST_DIR, 'test.sqlite')}"
+os.environ["DB_ECHO"] = "0"
+os.environ["IMAGE_FORDER"] = os.path.join(TEST_DIR, "images")
+os.environ["LLM_CACHE_DIR"] = os.path.join(TEST_DIR, "llm_cache")
+os.makedirs(os.environ["IMAGE_FORDER"], exist_ok=True)
+
+import httpx
+import pytest
+from sqlalchemy import event
+from backend.db.database import Base, async_engine, async_session
+from backend.db.models import ImageModel
+from backend.db.read_cache import read_cache, MemoryBackend, READ_CACHE_MAX_ENTRIES
+
+
+@event.listens_for(async_engine.sync_engine, "connect")
+def enable_foreign_keys(dbapi_connection, connection_record):
+    """MySQL と同じく ON DELETE CASCADE が効くよう，SQLite の外部キー制約を有効にする"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+async def tables():
+    """テストごとにテーブルと読み取りキャッシュを空にする"""
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    read_cache.backend = MemoryBackend(READ_CACHE_MAX_ENTRIES)
+    yield
+
+@pytest.fixture
+async def db(tables):
+    async with async_session() as session:
+        yield session
+
+@pytest.fixture
+async def client(tables):
+    """アプリの起動処理 (索引の構築など) を行ってから，プロセス内でAPIを呼び出すクライアント"""
+    from backend.main import app
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+            yield http
+
+async def add_image(db, image_id: int = 1, filename: str = "images/test.png") -> ImageModel:
+    image = ImageModel(id=image_id, filename=filename)
+    db.add(image)
+    await db.commit()
+    return image
@@ -0,0 +1,21 @@
+import pytest
+from backend.db import db_heritage
+from backend.db.db_tag import tag_rows
+from backend.db.models import HeritageModel
+from conftest import add_image
+
+
+def test_tag_rows_truncate_before_removing_duplicates():
+    long = "あ" * 191
+    heritage = HeritageModel(id=1, feature=[long + "い", long + "う", "森林", "森林"], unesco_tag="文化遺産")
+    rows = tag_rows(heritage)
+    assert sorted((row["facet"], row["value"]) for row in rows) == [
+        ("feature", long), ("feature", "森林"), ("unesco", "文化遺産"),
+    ]
+
+@pytest.mark.anyio
+async def test_heritage_with_values_sharing_a_long_prefix_can_be_saved(db):
+    await add_image(db)
+    long = "a" * 200
+    heritages = await db_heritage.create_multiple_heritages(db, 1, [{"title": "t", "country": [long + "1", long + "2"]}])
+    assert heritages[0].id is not None
@@ -0,0 +1,42 @@
+import io
+import os
+import pytest
+from PIL import Image
+from backend.db import db_image
+from backend.routers.image import IMAGE_FORDER
+
+pytestmark = pytest.mark.anyio
+
+
+def png_bytes(color) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (40, 30), color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+async def test_deleting_a_deduplicated_upload_keeps_the_shared_image(client, db):
+    data = png_bytes("red")
+    first = (await client.post("/image/upload", files={"image": ("a.png", data, "image/png")})).json()
+    second = (await client.post("/image/upload", files={"image": ("b.png", data, "image/png")})).json()
+    assert first["id"] == second["id"]
+    path = os.path.join(IMAGE_FORDER, first["filename"].split("/")[-1])
+    assert (await db_image.get_by_id(db, first["id"])).ref_count == 2
+
+    response = await client.delete(f"/image/delete/{first['id']}")
+    assert response.json() == {"detail": "Image reference released"}
+    assert os.path.exists(path)
+    db.expire_all()
+    assert (await db_image.get_by_id(db, first["id"])).ref_count == 1
+
+    response = await client.delete(f"/image/delete/{first['id']}")
+    assert response.json() == {"detail": "Image deleted successfully"}
+    assert not os.path.exists(path)
+    assert (await client.delete(f"/image/delete/{first['id']}")).status_code == 404
+
+async def test_release_deletes_only_the_last_reference(db):
+    image = await db_image.create(db, db_image.ImageBase(filename="images/x.png", timestamp="2024-01-01T00:00:00", content_hash="x"))
+    assert await db_image.add_reference(db, image)
+    assert await db_image.release(db, image.id) is False
+    assert await db_image.release(db, image.id) is True
+    with pytest.raises(Exception) as error:
+        await db_image.release(db, image.id)
+    assert error.value.status_code == 404
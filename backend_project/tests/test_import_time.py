@@ -0,0 +1,14 @@
+import pytest
+from benchmarks.import_time import LAZY_MODULES, measure_import
+
+
+@pytest.fixture(scope="module")
+def report():
+    return measure_import("backend.main")
+
+
+@pytest.mark.parametrize("module", LAZY_MODULES)
+def test_llm_modules_are_not_imported_at_startup(report, module):
+    """LLM関連のライブラリはアプリの読み込み時には読み込まれない (backend/llm.py で遅延して読み込む)"""
+    assert report.total_seconds > 0
+    assert not report.imported(module), f"{module} is imported by backend.main"
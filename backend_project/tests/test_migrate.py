@@ -0,0 +1,12 @@
+import pytest
+from backend.db.migrate import sync_url
+
+
+@pytest.mark.parametrize("database_url, drivername", [
+    ("sqlite+aiosqlite:///bench.sqlite", "sqlite"),
+    ("mysql+aiomysql://user:pass@db/app", "mysql+pymysql"),
+    ("postgresql+asyncpg://user:pass@db/app", "postgresql"),
+])
+def test_sync_url_uses_a_sync_driver(monkeypatch, database_url, drivername):
+    monkeypatch.setenv("DATABASE_URL", database_url)
+    assert sync_url().drivername == drivername
@@ -0,0 +1,37 @@
+import pytest
+from fastapi import HTTPException
+from backend.db import db_image
+from backend.db.pagination import encode_cursor, decode_cursor, split_page
+from conftest import add_image
+
+
+def test_cursor_round_trip():
+    values = [42, "日本語", 1.5, None]
+    assert decode_cursor(encode_cursor(values), len(values)) == values
+    assert decode_cursor(None, 1) is None
+    assert decode_cursor("", 1) is None
+
+@pytest.mark.parametrize("cursor", ["not base64!", encode_cursor([1, 2]), encode_cursor([])[:-1] + "@"])
+def test_invalid_cursor_is_400(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, 1)
+    assert error.value.status_code == 400
+
+def test_split_page():
+    key = lambda row: (row,)
+    assert split_page([1, 2], 2, key) == ([1, 2], None)
+    page, cursor = split_page([1, 2, 3], 2, key)
+    assert page == [1, 2]
+    assert decode_cursor(cursor, 1) == [2]
+
+@pytest.mark.anyio
+async def test_image_pages_cover_every_row_once(db):
+    for image_id in range(1, 8):
+        await add_image(db, image_id, f"images/{image_id}.png")
+    seen, cursor = [], None
+    while True:
+        images, cursor = await db_image.get_page(db, 3, cursor)
+        seen.extend(image.id for image in images)
+        if cursor is None:
+            break
+    assert seen == list(range(1, 8))
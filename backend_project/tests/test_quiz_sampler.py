@@ -0,0 +1,40 @@
+import numpy as np
+from backend.db.quiz_sampler import QuizPool
+
+
+def make_pool(count: int) -> QuizPool:
+    return QuizPool(np.arange(1, count + 1, dtype=np.int64))
+
+def test_sample_is_unique_and_skips_excluded_and_removed():
+    rng = np.random.default_rng(0)
+    pool = make_pool(20)
+    pool.discard([1, 2, 3])
+    for _ in range(50):
+        picked = pool.sample(rng, 10, {4, 5})
+        assert len(picked) == 10
+        assert len(set(picked)) == 10
+        assert not set(picked) & {1, 2, 3, 4, 5}
+
+def test_sample_returns_everything_left_when_count_is_too_large():
+    pool = make_pool(6)
+    pool.discard([2])
+    picked = pool.sample(np.random.default_rng(0), 10, {3})
+    assert sorted(picked) == [1, 4, 5, 6]
+    assert make_pool(0).sample(np.random.default_rng(0), 3, set()) == []
+
+def test_add_restores_removed_ids_and_grows():
+    pool = make_pool(3)
+    pool.discard([2])
+    assert len(pool) == 2
+    pool.add([2])
+    assert len(pool) == 3 and not pool.removed
+    pool.add(range(4, 40))
+    assert len(pool) == 39
+    assert sorted(pool.sample(np.random.default_rng(0), 100, set())) == list(range(1, 40))
+
+def test_is_stale_after_many_removals():
+    pool = make_pool(8)
+    pool.discard([1, 2])
+    assert not pool.is_stale
+    pool.discard([3])
+    assert pool.is_stale
@@ -0,0 +1,35 @@
+import asyncio
+import pytest
+from backend.db import db_heritage, db_quiz
+from conftest import add_image
+
+pytestmark = pytest.mark.anyio
+
+
+async def add_quizzes(db, count: int):
+    await add_image(db)
+    heritages = await db_heritage.create_multiple_heritages(db, 1, [{"title": "遺産", "region": ["アジア"]}])
+    await db_quiz.create_quizzes_for_heritages(db, {
+        heritages[0].id: [{"question": f"q{i}", "options": ["a", "b"], "answer": "a"} for i in range(count)]
+    })
+
+async def test_concurrent_next_calls_do_not_repeat_quizzes(db, client):
+    await add_quizzes(db, 30)
+    response = await client.post("/quiz/session", json={"count": 2})
+    assert response.status_code == 200
+    session = response.json()
+    served = [quiz["id"] for quiz in session["content"]]
+
+    responses = await asyncio.gather(*(
+        client.post(f"/quiz/session/{session['session_id']}/next", params={"count": 5}) for _ in range(4)
+    ))
+    for response in responses:
+        assert response.status_code == 200
+        served += [quiz["id"] for quiz in response.json()["content"]]
+
+    assert len(served) == 22
+    assert len(set(served)) == len(served)
+    last = (await client.post(f"/quiz/session/{session['session_id']}/next", params={"count": 50})).json()
+    assert len(last["content"]) == 8
+    assert not {quiz["id"] for quiz in last["content"]} & set(served)
+    assert last["remaining"] == 0
@@ -0,0 +1,50 @@
+import pytest
+from fastapi import HTTPException
+from backend.db import cached_reads, db_heritage, db_image, db_quiz
+from conftest import add_image
+
+pytestmark = pytest.mark.anyio
+
+
+async def add_heritage_with_quiz(db):
+    await add_image(db)
+    heritages = await db_heritage.create_multiple_heritages(db, 1, [{"title": "古い名前"}])
+    quizzes = await db_quiz.create_quizzes_for_heritages(db, {
+        heritages[0].id: [{"question": "古い問題", "options": ["a", "b"], "answer": "a"}]
+    })
+    return heritages[0].id, quizzes[0].id
+
+async def test_update_single_heritage_invalidates_cached_reads(db):
+    heritage_id, _ = await add_heritage_with_quiz(db)
+    assert (await cached_reads.get_heritage_by_id(db, heritage_id))["title"] == "古い名前"
+    assert [h["title"] for h in await cached_reads.get_heritages_by_image_id(db, 1)] == ["古い名前"]
+    assert [h["title"] for h in await cached_reads.get_all_heritages(db)] == ["古い名前"]
+
+    await db_heritage.update_single_heritage(db, heritage_id, {"title": "新しい名前"})
+    assert (await cached_reads.get_heritage_by_id(db, heritage_id))["title"] == "新しい名前"
+    assert [h["title"] for h in await cached_reads.get_heritages_by_image_id(db, 1)] == ["新しい名前"]
+    assert [h["title"] for h in await cached_reads.get_all_heritages(db)] == ["新しい名前"]
+
+async def test_update_quiz_invalidates_cached_reads(db):
+    heritage_id, quiz_id = await add_heritage_with_quiz(db)
+    assert (await cached_reads.get_quiz_by_id(db, quiz_id))["question"] == "古い問題"
+    assert [q["question"] for q in await cached_reads.get_quizzes_by_heritage_id(db, heritage_id)] == ["古い問題"]
+
+    await db_quiz.update_quiz(db, quiz_id, {"question": "新しい問題"})
+    assert (await cached_reads.get_quiz_by_id(db, quiz_id))["question"] == "新しい問題"
+    assert [q["question"] for q in await cached_reads.get_quizzes_by_heritage_id(db, heritage_id)] == ["新しい問題"]
+
+async def test_image_delete_invalidates_cascaded_reads(db):
+    heritage_id, quiz_id = await add_heritage_with_quiz(db)
+    await cached_reads.get_heritage_by_id(db, heritage_id)
+    await cached_reads.get_quiz_by_id(db, quiz_id)
+    assert len(await cached_reads.get_quizzes_by_heritage_id(db, heritage_id)) == 1
+    assert len(await cached_reads.get_all_heritages(db)) == 1
+
+    await db_image.delete_by_id(db, 1)
+    for read in (cached_reads.get_heritage_by_id(db, heritage_id), cached_reads.get_quiz_by_id(db, quiz_id),
+                 cached_reads.get_quizzes_by_heritage_id(db, heritage_id), cached_reads.get_heritages_by_image_id(db, 1)):
+        with pytest.raises(HTTPException) as error:
+            await read
+        assert error.value.status_code == 404
+    assert await cached_reads.get_all_heritages(db) == []
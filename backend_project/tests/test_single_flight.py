@@ -0,0 +1,25 @@
+import asyncio
+import pytest
+from backend.routers import heritage, quiz
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize("module, runner, target", [
+    (quiz, "run_generate_quiz", "create_quizzes"),
+    (heritage, "run_preview", "analyze_image"),
+])
+async def test_no_cache_run_is_not_coalesced_with_a_cached_run(tables, monkeypatch, module, runner, target):
+    calls = []
+
+    async def fake(target_id, no_cache=False):
+        calls.append(no_cache)
+        await asyncio.sleep(0.05)
+        return {"no_cache": no_cache}
+    monkeypatch.setattr(module, target, fake)
+
+    run = getattr(module, runner)
+    results = await asyncio.gather(run(1), run(1, no_cache=True), run(1), run(1, no_cache=True))
+    assert [result["no_cache"] for result in results] == [False, True, False, True]
+    # 同じ種類の実行どうしはまとめられる
+    assert sorted(calls) == [False, True]
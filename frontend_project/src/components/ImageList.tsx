@@ -5,6 +5,18 @@ import { ImageData } from "../types"; // 型定義をインポート
 
 const BACKEND_URL = "http://localhost:8000"; // Appから渡すか、Configファイル等で管理
 
+// 一覧では最も小さい派生画像を使う (未作成の場合は元画像)
+const thumbnailPath = (img: ImageData): string => {
+  const widths = Object.keys(img.variants ?? {}).map(Number).sort((a, b) => a - b);
+  return widths.length > 0 ? img.variants![String(widths[0])] : img.filename;
+};
+
+const thumbnailSrcSet = (img: ImageData): string | undefined => {
+  const entries = Object.entries(img.variants ?? {});
+  if (entries.length === 0) return undefined;
+  return entries.map(([width, path]) => `${BACKEND_URL}/${path} ${width}w`).join(", ");
+};
+
 interface ImageListProps {
   images: ImageData[];
   onImageClick: (index: number) => void;
@@ -29,7 +41,11 @@ const ImageList: React.FC<ImageListProps> = ({
           >
             <CardContent className="flex flex-col items-center p-2">
               <img
-                src={`${BACKEND_URL}/${img.filename}`} // BACKEND_URLの扱いに注意
+                src={`${BACKEND_URL}/${thumbnailPath(img)}`} // BACKEND_URLの扱いに注意
+                srcSet={thumbnailSrcSet(img)}
+                sizes="128px"
+                loading="lazy"
+                decoding="async"
                 alt={`Uploaded ${img.id}`}
                 className="w-32 h-32 object-cover mb-1"
               />
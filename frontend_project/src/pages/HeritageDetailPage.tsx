@@ -16,7 +16,7 @@ import {
 import { Loader2 } from "lucide-react";
 import { HeritageData, DetailViewMode, QuizData } from "../types";
 import {
-  fetchHeritageDetailAPI,
+  fetchHeritageBundleAPI,
   updateSingleHeritageAPI,
   generateQuizAPI,
   fetchQuizzesByHeritageIdAPI,
@@ -71,32 +71,18 @@ const HeritageDetailPage: React.FC = () => {
     setQuizzes(null);
     setDetailViewMode("detailsOnly");
 
-    let heritageData: HeritageWithId | null = null;
-    let quizData: QuizData[] | [];
-
     try {
-      heritageData = await fetchHeritageDetailAPI(heritageId);
+      const [bundle] = await fetchHeritageBundleAPI({ heritageIds: [heritageId] });
+      if (!bundle) {
+        throw new Error("世界遺産が見つかりません (Status: 404)");
+      }
+      const { quizzes: quizData, ...heritageData } = bundle;
       setHeritage(heritageData);
+      setQuizzes(quizData);
     } catch (err: any) {
       setError(err.message || "データの取得に失敗しました");
-      setIsLoading(false);
-      setIsLoadingQuizzes(false);
-      return;
     } finally {
       setIsLoading(false);
-    }
-
-    try {
-      quizData = await fetchQuizzesByHeritageIdAPI(heritageId);
-      setQuizzes(quizData);
-    } catch (err: any) {
-      if (err.message?.includes("(Status: 404)")) {
-        setQuizzes([]);
-      } else {
-        setQuizError(`クイズの取得に失敗しました: ${err.message}`);
-        setQuizzes([]);
-      }
-    } finally {
       setIsLoadingQuizzes(false);
     }
   }, [heritageId]);
@@ -3,6 +3,7 @@ import {
   HeritageResponse,
   HeritageData,
   HeritageWithId,
+  HeritageWithQuizzes,
   QuizData,
   QuizUpdateData,
 } from "../types";
@@ -23,7 +24,7 @@ const handleApiResponse = async (response: Response, errorMessage: string) => {
 
 // 画像一覧取得
 export const fetchImagesAPI = async (): Promise<ImageData[]> => {
-  const response = await fetch(`${BACKEND_URL}/image/all`);
+  const response = await fetch(`${BACKEND_URL}/image/all?unpaginated=true`);
   await handleApiResponse(response, "画像一覧の取得に失敗しました");
   return await response.json();
 };
@@ -90,7 +91,7 @@ export const updateHeritageAPI = async (
 };
 
 export const fetchAllHeritagesAPI = async (): Promise<HeritageWithId[]> => {
-  const response = await fetch(`${BACKEND_URL}/heritage/all`);
+  const response = await fetch(`${BACKEND_URL}/heritage/all?unpaginated=true`);
   await handleApiResponse(response, "世界遺産データの取得に失敗しました");
   const data: HeritageWithId[] = await response.json();
   return data;
@@ -105,6 +106,20 @@ export const fetchHeritageDetailAPI = async (
   return data;
 };
 
+// 世界遺産をクイズ付きで取得 (1リクエストで取得する)
+export const fetchHeritageBundleAPI = async (params: {
+  imageId?: number;
+  heritageIds?: number[];
+}): Promise<HeritageWithQuizzes[]> => {
+  const query = new URLSearchParams();
+  if (params.imageId !== undefined) query.append("image_id", String(params.imageId));
+  params.heritageIds?.forEach((id) => query.append("heritage_ids", String(id)));
+  const response = await fetch(`${BACKEND_URL}/heritage/bundle?${query}`);
+  await handleApiResponse(response, "世界遺産データの取得に失敗しました");
+  const data: { content: HeritageWithQuizzes[] } = await response.json();
+  return data.content;
+};
+
 export const updateSingleHeritageAPI = async (
   heritageId: number,
   data: Omit<HeritageData, "id">
@@ -34,7 +34,7 @@ const App: React.FC = () => {
   // バックエンドからアップロード済み画像一覧を取得する関数
   const fetchImages = async () => {
     try {
-      const response = await fetch(`${BACKEND_URL}/image/all`);
+      const response = await fetch(`${BACKEND_URL}/image/all?unpaginated=true`);
       if (response.ok) {
         const data = await response.json();
         setImages(data);
@@ -3,6 +3,7 @@ export interface ImageData {
   id: number;
   filename: string;
   timestamp: string;
+  variants?: Record<string, string>; // 幅ごとの派生画像 (サムネイル) のパス
 }
 
 export interface HeritageData {
@@ -41,4 +42,8 @@ export interface QuizData extends QuizItem {
   heritage_id: number;
 }
 
+export interface HeritageWithQuizzes extends HeritageWithId {
+  quizzes: QuizData[];
+}
+
 export type QuizUpdateData = Omit<QuizData, "id" | "heritage_id">;